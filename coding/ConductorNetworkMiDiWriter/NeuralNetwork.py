@@ -6,18 +6,24 @@ import numpy as np
 import itertools
 import sys
 import time
-import nnfs
-from nnfs.datasets import spiral_data
-from nnfs.datasets import sine_data
-import matplotlib.pyplot as plt
 import math
-import pickle
+import json
+import struct
 import copy
 import os.path
-import socketClient
-import dill
+import hashlib
+import threading
+import predictionLog
+import captureStore
+import instrument
 
-nnfs.init()
+log = instrument.getLogger(__name__)
+
+#Only NumPy is imported up front so the real-time prediction process starts fast
+#nnfs (example datasets: from nnfs.datasets import spiral_data), dill (old model files), pickle and inspect are imported where they are used
+
+#nnfs.init() used to seed NumPy here - new models still start from the same weights
+np.random.seed(0)
 
 #Use Model.set_parameters .get_parameters to set weights and biases of layers - takes uses a 1-D list
 #Use model.save_parameters .load_parameters to save and load weigths and biases to a file
@@ -32,10 +38,11 @@ class Layer_Dense:
     #Layer initialization with random weights and biases of 0
     # n_inputs is number of inputs to layer
     # n_neurons is number of neurons in layer 
-    def __init__(self, n_inputs, n_neurons, weight_regularizer_l1=0, weight_regularizer_l2=0, bias_regularizer_l1=0, bias_regularizer_l2=0):
+    # weights / biases: start from these arrays instead of random weights (used by Model.load)
+    def __init__(self, n_inputs, n_neurons, weight_regularizer_l1=0, weight_regularizer_l2=0, bias_regularizer_l1=0, bias_regularizer_l2=0, weights=None, biases=None):
         #inputs dot neurons
-        self.weights = 0.01 * np.random.randn(n_inputs, n_neurons) 
-        self.biases = np.zeros((1, n_neurons))
+        self.weights = 0.01 * np.random.randn(n_inputs, n_neurons) if weights is None else weights
+        self.biases = np.zeros((1, n_neurons)) if biases is None else biases
         self.weight_regularizer_l1 = weight_regularizer_l1
         self.weight_regularizer_l2 = weight_regularizer_l2
         self.bias_regularizer_l1 = bias_regularizer_l1
@@ -44,12 +51,12 @@ class Layer_Dense:
     #Forward Pass
     def forward(self, inputs, training):
         self.inputs = inputs
-        self.output = np.dot(inputs, self.weights) + self.biases
+        self.output = inputs @ self.weights + self.biases    #@ runs in the model's dtype (nnfs.init() replaced np.dot with a float64 round trip)
         
     #Backward Pass
     def backward(self, dvalues):
         #Gradients on parameters
-        self.dweights = np.dot(self.inputs.T, dvalues)
+        self.dweights = self.inputs.T @ dvalues
         self.dbiases = np.sum(dvalues, axis=0, keepdims=True)
         
         #Gradients on regularization
@@ -74,7 +81,7 @@ class Layer_Dense:
             self.dbiases += 2 * self.bias_regularizer_l2 * self.biases    
         
         #Gradient on values
-        self.dinputs = np.dot(dvalues, self.weights.T)
+        self.dinputs = dvalues @ self.weights.T
         
     #retreive layer parameters
     def get_parameters(self):
@@ -102,7 +109,7 @@ class Layer_Dropout:
             return
         
         #Generate and save scaled mask
-        self.binary_mask = np.random.binomial(1, self.rate, size=inputs.shape) / self.rate
+        self.binary_mask = (np.random.binomial(1, self.rate, size=inputs.shape) / self.rate).astype(inputs.dtype)
 
         #Apply mask to output values
         self.output = inputs * self.binary_mask
@@ -159,18 +166,9 @@ class Activation_Softmax:
         
     #Backward Pass
     def backward(self, dvalues):
-        #create unitialized array
-        self.dinputs = np.empty_like(dvalues)
-        
-        #Enumerate outputs and gradients
-        for index, (single_output, single_dvalues) in enumerate(zip(self.output, dvalues)):
-            
-            #flatten output array
-            single_output = single_output.resahpe(-1,1)
-            #calculate Jacopbin matric of the output
-            jacobin_matrix = np.daigflat(single_output) - np.dot(single_output, single_output.T)
-            #calculate sample-wise gradient and add to array of sample gradients
-            self.dinputs[index] = np.dot(jacobin_matrix, single_dvalues)
+        #Jacobian of softmax times dvalues for every sample at once: J = diag(s) - s s^T, so J d = s * (d - sum(d * s))
+        #No per-sample Jacobian is built
+        self.dinputs = self.output * (dvalues - np.sum(dvalues * self.output, axis=1, keepdims=True))
             
     #Calculate predictions for outputs
     def predictions(self, outputs):
@@ -546,7 +544,7 @@ class Loss_CategoricalCrossEntropy(Loss):
             y_true = np.eye(labels)[y_true]
         
         #calculate gradient
-        self.dinputs = y_true / dvalues
+        self.dinputs = -y_true / dvalues
         
         #normalize gradient
         self.dinputs = self.dinputs / samples
@@ -701,6 +699,93 @@ class Accuracy_Categorical(Accuracy):
         return predictions == y        
 
 
+#Inference plan - the forward pass for prediction only, built from the model's layers
+class InferencePlan:
+    #Dropout is folded away (it is the identity when not training), Dense + ReLU run as one step and every step writes into an
+    #output buffer that is preallocated once per batch size. Nothing is stored on the layers, so training state is left alone.
+    #Weights are read from the layers on every run, so the plan follows training and set_parameters() without a rebuild.
+    #Not thread safe - the buffers are shared between calls (ModelServer serializes predict() with its lock)
+    def __init__(self, layers, dtype, *, max_batch_sizes=8):
+        self.dtype = dtype
+        self.max_batch_sizes = max_batch_sizes
+        self.buffers = {}         #batch size -> one output array per step
+        self.steps = []           #(kind, layer, relu)
+        self.supported = True     #False if a layer type has no compiled step - predict() then uses forward()
+
+        for layer in layers:
+            if isinstance(layer, (Layer_Dropout, Activation_Linear)):
+                continue
+            if isinstance(layer, Activation_ReLu) and self.steps and self.steps[-1][0] == 'dense' and not self.steps[-1][2]:
+                self.steps[-1] = ('dense', self.steps[-1][1], True)    #Fuse into the previous Dense step
+            elif isinstance(layer, Layer_Dense):
+                self.steps.append(('dense', layer, False))
+            elif isinstance(layer, Activation_ReLu):
+                self.steps.append(('relu', layer, False))
+            elif isinstance(layer, Activation_Softmax):
+                self.steps.append(('softmax', layer, False))
+            elif isinstance(layer, Activation_Sigmoid):
+                self.steps.append(('sigmoid', layer, False))
+            else:
+                self.supported = False
+
+    def _get_buffers(self, batch_rows, n_inputs):
+        buffers = self.buffers.get(batch_rows)
+        if buffers is None:
+            if len(self.buffers) >= self.max_batch_sizes:
+                self.buffers.pop(next(iter(self.buffers)))    #Drop the oldest batch size
+            buffers = []
+            width = n_inputs
+            for kind, layer, relu in self.steps:
+                if kind == 'dense':
+                    width = layer.weights.shape[1]
+                #Step output and a column for per-sample reductions (softmax max and sum)
+                buffers.append((np.empty((batch_rows, width), dtype=self.dtype), np.empty((batch_rows, 1), dtype=self.dtype)))
+            self.buffers[batch_rows] = buffers
+        return buffers
+
+    def run(self, X):
+        #Returns a view of the last buffer - it is overwritten by the next run with the same batch size
+        x = X
+        for (kind, layer, relu), (out, column) in zip(self.steps, self._get_buffers(len(X), X.shape[1])):
+            if kind == 'dense':
+                np.matmul(x, layer.weights, out=out)
+                np.add(out, layer.biases, out=out)
+                if relu:
+                    np.maximum(out, 0, out=out)
+            elif kind == 'relu':
+                np.maximum(x, 0, out=out)
+            elif kind == 'softmax':
+                #ufunc reduce into a preallocated column - np.max/np.sum with keepdims cost several times more for one sample
+                np.maximum.reduce(x, axis=1, out=column, keepdims=True)
+                np.subtract(x, column, out=out)
+                np.exp(out, out=out)
+                np.add.reduce(out, axis=1, out=column, keepdims=True)
+                np.divide(out, column, out=out)
+            elif kind == 'sigmoid':
+                np.negative(x, out=out)
+                np.exp(out, out=out)
+                np.add(out, 1, out=out)
+                np.reciprocal(out, out=out)
+            x = out
+        return x
+
+
+#Model file format (Model.save / Model.load):
+# 8 byte magic, uint32 length of the JSON header, JSON header (layer topology, dtype, array offsets and shapes),
+# then the raw weight and bias arrays, each starting on a 64 byte boundary so the file can be memory mapped
+# Optimizer state (iterations, current learning rate and each layer's momentum / cache arrays) is saved too, so training resumes where it stopped
+MODEL_MAGIC = b'CNDMODL1'
+MODEL_ALIGN = 64
+
+#Classes Model.load may create from a model file
+MODEL_CLASSES = {cls.__name__: cls for cls in [
+    Layer_Dense, Layer_Dropout, Activation_ReLu, Activation_Softmax, Activation_Sigmoid, Activation_Linear,
+    Optimizer_SGD, Optimizer_AdaGrad, Optimizer_RMSProp, Optimizer_Adam,
+    Loss_CategoricalCrossEntropy, Loss_BinaryCrossentropy, Loss_MeanSquaredError, Loss_MeanAbsoluteError,
+    Accuracy_Regression, Accuracy_Categorical,
+]}
+
+
 #Model Class
 class Model:
     def __init__(self):
@@ -722,7 +807,8 @@ class Model:
             self.accuracy = accuracy
      
     #Finalize the model
-    def finalize(self):
+    # dtype: float type used for weights, optimizer caches, inputs and gradients (kept from the saved model if not given, float32 by default)
+    def finalize(self, *, dtype=None):
         #create and set the input layer
         self.input_layer = Layer_Input()
         
@@ -764,12 +850,35 @@ class Model:
         if isinstance(self.layers[-1], Activation_Softmax) and isinstance(self.loss, Loss_CategoricalCrossEntropy):
             #Create an object of combined activation and loss functions
             self.softmax_classifier_output = Activation_Softmax_Loss_CategoricalCrossEntropy()
+
+        #dtype policy
+        if dtype is not None:
+            self.set_dtype(dtype)
+        else:
+            self.set_dtype(getattr(self, 'dtype', np.float32))
+
+    #Casts weights, biases and optimizer caches so the whole model runs in one float type
+    def set_dtype(self, dtype):
+        self.dtype = np.dtype(dtype)
+        for layer in self.trainable_layers:
+            for property in ['weights', 'biases', 'weight_momentums', 'bias_momentums', 'weight_cache', 'bias_cache']:
+                if hasattr(layer, property):
+                    setattr(layer, property, getattr(layer, property).astype(self.dtype, copy=False))
+
+        #Compiled forward pass for predict()
+        self.inference_plan = InferencePlan(self.layers, self.dtype)
                 
     #Train the model
-    def train(self, X, y, *, epochs=1, batch_size = None,print_every=1, validation_data=None):
+    # shuffle: new random sample order every epoch (only with batch_size set)
+    # accumulation_steps: average the gradients of this many batches before each optimizer update (effective batch = batch_size * accumulation_steps)
+    # early_stopping_patience: stop after this many epochs without a lower validation loss and keep the best parameters (needs validation_data)
+    def train(self, X, y, *, epochs=1, batch_size = None,print_every=1, validation_data=None, shuffle=True, accumulation_steps=1, early_stopping_patience=None, seed=None):
         
         #initilizae accuracy object
         self.accuracy.init(y)
+
+        rng = np.random.default_rng(seed)
+        history = {'loss': [], 'accuracy': [], 'val_loss': [], 'val_accuracy': []}
         
         #Default value if batch size is not being set
         train_steps = 1
@@ -794,6 +903,11 @@ class Model:
 
                 if validation_steps * batch_size < len(X_val):
                     validation_steps += 1
+
+        #Early stopping state
+        best_loss = np.inf
+        best_parameters = None
+        epochs_without_improvement = 0
         
         #Main training loop
         for epoch in range(1, epochs+1):
@@ -803,12 +917,26 @@ class Model:
             #Reset accumulated values in loss and accuracy
             self.loss.new_pass()
             self.accuracy.new_pass()
+
+            #Reshuffle the sample order every epoch
+            order = None
+            if shuffle and batch_size is not None:
+                order = rng.permutation(len(X))
+
+            #Summed gradients per trainable layer while accumulating
+            accumulated = None
+            accumulated_count = 0
             
             #iterate over steps
             for step in range(train_steps):
                 if batch_size is None:
                     batch_X = X
                     batch_y = y
+
+                elif order is not None:
+                    batch_index = order[step * batch_size:(step+1) * batch_size]
+                    batch_X = X[batch_index]
+                    batch_y = y[batch_index]
                 
                 else:
                     batch_X = X[step * batch_size:(step+1) * batch_size]
@@ -827,12 +955,33 @@ class Model:
                 
                 #backward pass
                 self.backward(output, batch_y)
+
+                #Gradient accumulation - only update every accumulation_steps batches (and at the end of the epoch)
+                #No continue for the batches in between, so every step still reaches the print_every progress block below
+                update = True
+                if accumulation_steps > 1:
+                    if accumulated is None:
+                        accumulated = [[layer.dweights.copy(), layer.dbiases.copy()] for layer in self.trainable_layers]
+                    else:
+                        for gradients, layer in zip(accumulated, self.trainable_layers):
+                            gradients[0] += layer.dweights
+                            gradients[1] += layer.dbiases
+                    accumulated_count += 1
+                    update = accumulated_count >= accumulation_steps or step == train_steps - 1
+
+                    if update:
+                        for gradients, layer in zip(accumulated, self.trainable_layers):
+                            layer.dweights = gradients[0] / accumulated_count
+                            layer.dbiases = gradients[1] / accumulated_count
+                        accumulated = None
+                        accumulated_count = 0
                 
                 #Optimize
-                self.optimizer.pre_update_params()
-                for layer in self.trainable_layers:
-                    self.optimizer.update_params(layer)
-                self.optimizer.post_update_params()
+                if update:
+                    self.optimizer.pre_update_params()
+                    for layer in self.trainable_layers:
+                        self.optimizer.update_params(layer)
+                    self.optimizer.post_update_params()
                 
                 # if not step % print_every or step == train_steps - 1:
                 #     print(f'Step: {step}, ' + 
@@ -845,6 +994,8 @@ class Model:
             epoch_data_loss, epoch_regularization_loss = self.loss.calculate_accumulated(include_regularization=True)
             epoch_loss = epoch_data_loss + epoch_regularization_loss
             epoch_accuracy = self.accuracy.calculate_accumulated()
+            history['loss'].append(epoch_loss)
+            history['accuracy'].append(epoch_accuracy)
             
             print(f'training, ' + 
                         f'acc: {epoch_accuracy:.3f}, ' + 
@@ -855,9 +1006,31 @@ class Model:
             #If there is validation data
             if validation_data is not None:
                 #evaluate the model
-                self.evaluate(*validation_data, batch_size=batch_size)
+                validation_loss, validation_accuracy = self.evaluate(*validation_data, batch_size=batch_size)
+                history['val_loss'].append(validation_loss)
+                history['val_accuracy'].append(validation_accuracy)
+
+                if early_stopping_patience is not None:
+                    if validation_loss < best_loss:
+                        best_loss = validation_loss
+                        best_parameters = copy.deepcopy(self.get_parameters())
+                        epochs_without_improvement = 0
+                    else:
+                        epochs_without_improvement += 1
+                        if epochs_without_improvement >= early_stopping_patience:
+                            print(f'Early stopping at epoch {epoch}, best validation loss: {best_loss:.3f}')
+                            break
+
+        #Keep the weights from the best validation epoch
+        if best_parameters is not None:
+            self.set_parameters(best_parameters)
+
+        return history
                   
     def forward(self, X, training):
+        #Inputs are cast once to the model's dtype so every layer stays in it
+        X = np.asarray(X, dtype=self.dtype)
+
         #Call forward method on the input layer
         self.input_layer.forward(X, training)
         
@@ -877,7 +1050,7 @@ class Model:
             self.softmax_classifier_output.backward(output,y)
 
             #Can do two layers at once
-            self.layers[-1].dinputs = self.softmax_classifier_output.dinputs
+            self.layers[-1].dinputs = self.softmax_classifier_output.dinputs.astype(self.dtype, copy=False)
             
             #call backward method going through
             for layer in reversed(self.layers[:-1]):
@@ -887,6 +1060,7 @@ class Model:
    
         #Fist call backward method on the loss to set dinputs propety used in back propagation
         self.loss.backward(output, y)
+        self.loss.dinputs = self.loss.dinputs.astype(self.dtype, copy=False)    #Targets may be float64 - keep gradients in the model's dtype
 
         #Call backward method going through all the objects in reverse order passing dinputs through
         for layer in reversed(self.layers):
@@ -933,8 +1107,10 @@ class Model:
         
         #Print summary
         print(f'validation, ' + 
-                f'acc: {accuracy:.3f}, ' + 
-                f'loss: {loss:.3f}')
+                f'acc: {validation_accuracy:.3f}, ' + 
+                f'loss: {validation_loss:.3f}')
+
+        return validation_loss, validation_accuracy
         
     #Retrieves and returns parameters of trainable layers
     def get_parameters(self):
@@ -954,17 +1130,79 @@ class Model:
             
     #Saves parameters to a file
     def save_parameters(self, path):
+        import pickle
+
         #Open a file in binary write mode
         with open(path, 'wb') as f:
             pickle.dump(self.get_parameters(), f)
             
     def load_parameters(self, path):
+        import pickle
+
         #Open file in binary read mode
         with open(path, 'rb') as f:
             self.set_parameters(pickle.load(f))
             
-    #Save the model
+    #Save the model - weight-only: the layer topology as a small JSON header plus the raw weight arrays (see MODEL_MAGIC)
+    #Loss and accuracy are saved by class name. The optimizer is saved with its settings, its iterations / current learning rate and
+    #every layer's momentum and cache arrays, so a loaded model keeps training with the decayed learning rate and warm moments
     def save(self, path):
+        import inspect
+
+        topology = {
+            'dtype': self.dtype.name,
+            'layers': [],
+            'loss': type(self.loss).__name__ if getattr(self, 'loss', None) is not None else None,
+            'accuracy': type(self.accuracy).__name__ if getattr(self, 'accuracy', None) is not None else None,
+            'optimizer': None,
+            'arrays': {},
+        }
+        arrays = []
+        offset = 0
+
+        for i, layer in enumerate(self.layers):
+            description = {'type': type(layer).__name__}
+            if isinstance(layer, Layer_Dense):
+                description['n_inputs'], description['n_neurons'] = layer.weights.shape
+                for property in ['weight_regularizer_l1', 'weight_regularizer_l2', 'bias_regularizer_l1', 'bias_regularizer_l2']:
+                    description[property] = getattr(layer, property)
+                #Optimizer state only exists once the layer has been trained
+                for property in ['weights', 'biases', 'weight_momentums', 'bias_momentums', 'weight_cache', 'bias_cache']:
+                    if not hasattr(layer, property):
+                        continue
+                    array = np.ascontiguousarray(getattr(layer, property), dtype=self.dtype)
+                    topology['arrays'][f'{i}.{property}'] = {'offset': offset, 'shape': array.shape}
+                    arrays.append(array)
+                    offset += -(-array.nbytes // MODEL_ALIGN) * MODEL_ALIGN
+            elif isinstance(layer, Layer_Dropout):
+                description['rate'] = 1 - layer.rate    #Stored inverted on the layer
+            topology['layers'].append(description)
+
+        optimizer = getattr(self, 'optimizer', None)
+        if optimizer is not None:
+            #Constructor arguments are stored on the optimizer under the same names
+            settings = inspect.signature(type(optimizer).__init__).parameters
+            topology['optimizer'] = {'type': type(optimizer).__name__}
+            topology['optimizer'].update({name: getattr(optimizer, name) for name in settings if name != 'self' and hasattr(optimizer, name)})
+            topology['optimizerState'] = {'iterations': int(optimizer.iterations), 'current_learning_rate': float(optimizer.current_learning_rate)}
+
+        header = json.dumps(topology).encode()
+        dataStart = -(-(len(MODEL_MAGIC) + 4 + len(header)) // MODEL_ALIGN) * MODEL_ALIGN
+
+        #Write next to the file and swap it in so a running ModelServer never reads half a model
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            f.write(MODEL_MAGIC + struct.pack('<I', len(header)) + header)
+            f.write(bytes(dataStart - f.tell()))
+            for array in arrays:
+                f.write(array.data)
+                f.write(bytes(-array.nbytes % MODEL_ALIGN))
+        os.replace(tmpPath, path)
+
+    #Save the model in the old dill format (whole model object, read by older versions of The Conductor)
+    def save_dill(self, path):
+        import dill
+
         model = copy.deepcopy(self)
         
         #reset accumulated values in loss and accuracy objects
@@ -973,6 +1211,7 @@ class Model:
 
         #remove data in input layer and reset gradients
         model.input_layer.__dict__.pop('output', None)
+        model.__dict__.pop('inference_plan', None)    #Rebuilt on load - no need to save its buffers
         model.loss.__dict__.pop('dinputs', None)
         
         #For each layer remove inputs, outputs and dinputs
@@ -985,174 +1224,246 @@ class Model:
             dill.dump(model, f)
             
     #loads and returns a model
+    # mmap: map the weights from the file (copy on write) instead of reading them into memory
     @staticmethod
-    def load(path):
+    def load(path, *, mmap=False):
+        with open(path, 'rb') as f:
+            if f.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+                return Model.load_dill(path)     #Older model.model files
+
+            headerLength, = struct.unpack('<I', f.read(4))
+            topology = json.loads(f.read(headerLength))
+            dataStart = -(-(len(MODEL_MAGIC) + 4 + headerLength) // MODEL_ALIGN) * MODEL_ALIGN
+            if mmap:
+                data = np.memmap(path, dtype=np.uint8, mode='c', offset=dataStart)
+            else:
+                f.seek(dataStart)
+                data = np.frombuffer(bytearray(f.read()), dtype=np.uint8)   #One read, writable for training
+
+        dtype = np.dtype(topology['dtype'])
+
+        def getArray(name):
+            description = topology['arrays'][name]
+            count = int(np.prod(description['shape']))
+            return data[description['offset']:description['offset'] + count * dtype.itemsize].view(dtype).reshape(description['shape'])
+
+        #Rebuild the model from the topology - only classes in MODEL_CLASSES can be created, nothing is unpickled
+        model = Model()
+        for i, description in enumerate(topology['layers']):
+            settings = dict(description)
+            layerClass = MODEL_CLASSES[settings.pop('type')]
+            if layerClass is Layer_Dense:
+                settings['weights'] = getArray(f'{i}.weights')
+                settings['biases'] = getArray(f'{i}.biases')
+            layer = layerClass(**settings)
+            for property in ['weight_momentums', 'bias_momentums', 'weight_cache', 'bias_cache']:
+                if f'{i}.{property}' in topology['arrays']:
+                    setattr(layer, property, getArray(f'{i}.{property}'))
+            model.add(layer)
+
+        optimizer = None
+        if topology['optimizer'] is not None:
+            settings = dict(topology['optimizer'])
+            optimizer = MODEL_CLASSES[settings.pop('type')](**settings)
+            #Files saved before the optimizer state was kept start the optimizer fresh
+            for name, value in topology.get('optimizerState', {}).items():
+                setattr(optimizer, name, value)
+        model.loss = None
+        model.set(
+            loss=MODEL_CLASSES[topology['loss']]() if topology['loss'] is not None else None,
+            optimizer=optimizer,
+            accuracy=MODEL_CLASSES[topology['accuracy']]() if topology['accuracy'] is not None else None
+        )
+        model.finalize(dtype=dtype)
+            
+        return model
+
+    #loads a model saved with save_dill (or by older versions of The Conductor)
+    @staticmethod
+    def load_dill(path):
+        import dill
+
         with open(path, 'rb') as f:
             model = dill.load(f)
+
+        #Models saved before the dtype policy run in the dtype their weights were stored in
+        if not hasattr(model, 'dtype'):
+            model.dtype = model.trainable_layers[0].weights.dtype if model.trainable_layers else np.dtype(np.float32)
             
         return model
     
     # Predicts on the samples
     def predict(self, X, *, batch_size=None):
         
-        #Default value if batch size is not being used
-        prediction_steps = 1
+        X = np.asarray(X, dtype=self.dtype)
+
+        #Models loaded from older files have no plan yet
+        if getattr(self, 'inference_plan', None) is None:
+            self.inference_plan = InferencePlan(self.layers, self.dtype)
         
-        #calculate number of steps
-        if batch_size is not None:
-            prediction_steps = len(X) //batch_size
-            
-            if prediction_steps * batch_size < len(X):
-                prediction_steps += 1
+        #If batch size is not set predict in one step
+        if batch_size is None:
+            batch_size = max(len(X), 1)
                 
-        #Model outputs
-        output = []
+        #One step - copy the plan's buffer out so the next call can't overwrite the result
+        if batch_size >= len(X) and self.inference_plan.supported:
+            return self.inference_plan.run(X).copy()
+
+        #Model outputs - each batch is written into its rows
+        output = None
         
         #Iterate over steps
-        for step in range(prediction_steps):
-            #If batch size is not set train using one step
-            if batch_size is None:
-                batch_X = X
-                
-            else: 
-                batch_X = X[step*batch_size:(step+1)*batch_size]
+        for start in range(0, max(len(X), 1), batch_size):
+            batch_X = X[start:start + batch_size]
 
             #Forward pass
-            batch_output = self.forward(batch_X, training=False)
-            
-            #Append batch prediction to the list of predictions
-            output.append(batch_output)
+            if self.inference_plan.supported:
+                batch_output = self.inference_plan.run(batch_X)
+            else:
+                batch_output = self.forward(batch_X, training=False)
+
+            if output is None:
+                output = np.empty((len(X), batch_output.shape[1]), dtype=batch_output.dtype)
+            output[start:start + len(batch_X)] = batch_output
             
-            return np.vstack(output)
+        return output
+
+
+#Model serving - keeps one model per file in memory for real-time prediction
+class ModelServer:
+    #Loads a saved model once and reloads it only when the file changes (eg. after trainOrientation rewrites it)
+    #predict() never touches the disk; refresh() does the change check and is rate limited by checkInterval
+    def __init__(self, path, *, checkInterval=1.0, checkHash=True):
+        self.path = path
+        self.checkInterval = checkInterval    #Seconds between file change checks
+        self.checkHash = checkHash            #Confirm a changed mtime with a content hash before reloading
+        self.model = None
+        self.fileStamp = None                 #(mtime_ns, size) of the loaded file
+        self.fileHash = None
+        self.lastCheck = 0
+        self.loadCount = 0
+        self.lastLatencyMs = 0                #Time spent in the last predict() call
+        self.lock = threading.Lock()
+
+    def _hashFile(self):
+        with open(self.path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def refresh(self, *, force=False):
+        #Returns True if the model was (re)loaded
+        now = time.monotonic()
+        if not force and self.model is not None and now - self.lastCheck < self.checkInterval:
+            return False
+        self.lastCheck = now
+
+        stat = os.stat(self.path)
+        fileStamp = (stat.st_mtime_ns, stat.st_size)
+        if not force and fileStamp == self.fileStamp:
+            return False
+
+        fileHash = self._hashFile() if self.checkHash else None
+        if not force and self.model is not None and fileHash is not None and fileHash == self.fileHash:
+            #File was touched but not changed
+            self.fileStamp = fileStamp
+            return False
+
+        model = Model.load(self.path)
+        with self.lock:
+            self.model = model
+            self.fileStamp = fileStamp
+            self.fileHash = fileHash
+            self.loadCount += 1
+        log.info('Model loaded from %s (load %d)', self.path, self.loadCount)
+        return True
+
+    def predict(self, sample):
+        #In memory prediction - no disk I/O
+        with self.lock:
+            startNs = time.perf_counter_ns()
+            confidences = self.model.predict(sample)
+            endNs = time.perf_counter_ns()
+            self.lastLatencyMs = (endNs - startNs) / 1e6
+        instrument.record('NeuralNetwork.modelPredict', startNs, endNs)
+        return confidences
+
+    def predictions(self, confidences):
+        return self.model.output_layer_activation.predictions(confidences)
+
+modelServers = {}   #One ModelServer per model path
+
+def getModelServer(path):
+    #Returns the in-memory model for path, loading it the first time and reloading it when the file changes
+    server = modelServers.get(path)
+    if server is None:
+        server = modelServers[path] = ModelServer(path)
+    server.refresh()
+    return server
+
+
+#Training data - one capture store per label, loaded into a single preallocated array
+class Dataset:
+    #Memory-maps each label's capture store (captureStore.py) and copies it straight into its shuffled position in one preallocated array
+    #Older .npy and .csv captures are converted into a store the first time they are read, so text is parsed only once
+    def __init__(self, dataPathList, *, numFeatures=None, shuffle=True, seed=None):
+        self.rng = np.random.default_rng(seed)
+        sources = []
+        for path in dataPathList:
+            basePath = os.path.splitext(path)[0]
+            if not captureStore.exists(basePath):
+                print(f'No training data at: {path}')
+                continue
+            store = captureStore.getCaptureStore(basePath)
+            if numFeatures is None:
+                numFeatures = store.numFeatures
+            elif store.numFeatures != numFeatures:
+                raise ValueError(f'{store.path} has {store.numFeatures} features per sample, expected {numFeatures}')
+            sources.append((store.data, store.truth))    #Zero-copy views of the memory map
+            print(f'{store.path}: {store.count} samples')
+
+        total = sum(data.shape[0] for data, _ in sources)
+        self.X = np.empty([total, numFeatures if numFeatures is not None else 0])
+        self.y = np.empty([total,], dtype=int)
+
+        #One permutation for the whole set - each label is scattered straight to its shuffled rows
+        order = self.rng.permutation(total) if shuffle else np.arange(total)
+        start = 0
+        for data, truth in sources:
+            rows = order[start:start + data.shape[0]]
+            self.X[rows] = data
+            self.y[rows] = truth
+            start += data.shape[0]
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def shuffle(self):
+        order = self.rng.permutation(len(self))
+        self.X = self.X[order]
+        self.y = self.y[order]
+
+    def batches(self, batchSize=None):
+        #Yields (X, y) mini-batches as views of the loaded arrays - nothing is copied
+        if batchSize is None:
+            batchSize = len(self)
+        for start in range(0, len(self), batchSize):
+            yield self.X[start:start + batchSize], self.y[start:start + batchSize]
 
 
 def getAccDataBinary(dataPathList, truthPathList, packetSize, numSensors):
+    #truthPathList is kept for existing callers - the truths are stored with the data
     print()
-    # print("**######################################**")    print("getAccDataBinary")
-    dataArr = np.empty([1, 3 * packetSize * numSensors])
-    dataArr[0,0] = 99.
-    truthArr = np.empty([1,])
-    truthArr[0] = 99
-
-    for path in dataPathList:
-        # print("****")
-        print(f'data path: {path}')
-        if os.path.exists(path):
-            print("****")
-            print(path)
-            tmpArr = np.load(path,allow_pickle=False)
-
-            if dataArr[0,0] == 99.:
-                dataArr = tmpArr
-                print(f'dataArr shape: {dataArr.shape}')
-                print(f'dataArr from file: {dataArr}')
-            else:
-                #print(f'tmpArr shape: {tmpArr.shape}')
-                #print(f'tmpArr from file: {tmpArr}')
-                dataArr = np.append(dataArr, tmpArr,axis=0)
-                print(f'dataArr shape: {dataArr.shape}')
-                print(f'dataArr from file: {dataArr}')
-
-    for path in truthPathList:
-        print(f'Truth Patch in NN: {path}')
-        if os.path.exists(path):
-            print("****")
-            print(path)
-            tmpArr = np.load(path,allow_pickle=False)
-            
-            if truthArr[0] == 99:
-                truthArr = tmpArr
-            else:
-                print(f'tmpArr shape: {tmpArr.shape}')
-                print(f'tmpArr: {tmpArr}')
-                truthArr = np.append(truthArr, tmpArr,axis=0)
-
-    #Get random index
-    dataIndex = np.arange(0 , dataArr.shape[0])
-    np.random.shuffle(dataIndex)
-
-    #print(f'dataArr shape: {dataArr.shape}')
-    #print(f'dataArr from file: {dataArr}')
-    #print(f'truthArr shape: {truthArr.shape}')
-    #print(f'truthArr from file: {truthArr}')
-    # print(f'dataIndex shape: {dataIndex.shape}')
-    # print(f'dataIndex: {dataIndex}')
-
-    dataTmp = dataArr.copy()
-    truthTmp = truthArr.copy()
-    for i in range(dataArr.shape[0]):
-        dataArr[dataIndex[i]] = dataTmp[i]
-        truthArr[dataIndex[i]] = truthTmp[i]
-
-    print(f'dataArr shape: {dataArr.shape}')
-    print(f'dataArr from file: {dataArr}')
-    print(f'truthArr shape: {truthArr.shape}')
-    print(f'truthArr randomized: {truthArr}')
-    print(f'dataIndex shape: {dataIndex.shape}')
-    print(f'dataIndex from file: {dataIndex}')
-
-    return dataArr, truthArr
+    print("getAccDataBinary")
+    dataset = Dataset(dataPathList, numFeatures=3 * packetSize * numSensors)
+    print(f'dataArr shape: {dataset.X.shape}')
+    print(f'truthArr shape: {dataset.y.shape}')
+    return dataset.X, dataset.y
 
 def getAccDataCSV(dataPathList, truthPathList):
-    # print()
-    # print("**######################################**")
-    # print("Text Data")
-    dataArr = np.empty([1,30])
-    dataArr[0,0] = 99.
-    truthArr = np.empty([1,1])
-    truthArr[0,0] = 99.
-    print(f'truthArr init: {truthArr}')
-    print(f'dataArr init: {truthArr}')
-    for path in dataPathList:
-        if os.path.exists(path):
-            # print("****")
-            # print(path)
-            tmpArr = np.loadtxt(path,dtype=float, delimiter=',', ndmin = 2)
-
-            if dataArr[0,0] == 99.:
-                dataArr = tmpArr
-            else:
-                #print(f'tmpArr shape: {tmpArr.shape}')
-                #print(f'tmpArr from file: {tmpArr}')
-                dataArr = np.append(dataArr, tmpArr,axis=0)
-            
-        
-    for path in truthPathList:
-        if os.path.exists(path):
-            # print("****")
-            # print(path)
-            tmpArr = np.loadtxt(path,dtype=int, delimiter=',', ndmin = 2)
-            
-            if truthArr[0,0] == 99.:
-                truthArr = tmpArr
-            else:
-                # print(f'tmpArr shape: {tmpArr.shape}')
-                # print(f'tmpArr: {tmpArr}')
-                truthArr = np.append(truthArr, tmpArr,axis=0)
-
-    #Get random index
-    dataIndex = np.arange(0 , dataArr.shape[0])
-    np.random.shuffle(dataIndex)
-
-    #print(f'dataArr shape: {dataArr.shape}')
-    #print(f'dataArr from file: {dataArr}')
-    #print(f'truthArr shape: {truthArr.shape}')
-    #print(f'truthArr from file: {truthArr}')
-    # print(f'dataIndex: {dataIndex.shape}')
-    # print(f'truthArr from file: {dataIndex}')
-
-    dataTmp = dataArr.copy()
-    truthTmp = truthArr.copy()
-    for i in range(dataArr.shape[0]):
-        dataArr[dataIndex[i]] = dataTmp[i]
-        truthArr[dataIndex[i]] = truthTmp[i]
-
-    #print(f'dataArr shape: {dataArr.shape}')
-    #print(f'dataArr from file: {dataArr}')
-    #print(f'truthArr shape: {truthArr.shape}')
-    #print(f'truthArr from file: {truthArr}')
-
-    return dataArr, truthArr       
+    #CSV captures are converted to the binary capture store on first read, then loaded like getAccDataBinary
+    dataset = Dataset(dataPathList)
+    print(f'dataArr shape: {dataset.X.shape}')
+    print(f'truthArr shape: {dataset.y.shape}')
+    return dataset.X, dataset.y       
 
 
 def convertTruthCSV(truthPathList):
@@ -1179,36 +1490,29 @@ def convertPickletoDill():
     print(f'model: {model}')
 
     #Open a file and dump the model data
-    with open("data/AccModel01Dill", 'wb') as f:
-        dill.dump(model, f)
+    model.save_dill("data/AccModel01Dill")
+
+def convertDilltoWeights(path, newPath=None):
+    #Rewrites a dill model.model file in the weight-only format (Model.save). The original is kept as path + '.dill'
+    model = Model.load_dill(path)
+    model.finalize(dtype=model.dtype)
+    if newPath is None:
+        os.replace(path, path + '.dill')
+        newPath = path
+    model.save(newPath)
+    print(f'Converted {path} to the weight-only format at {newPath}')
 
 def realTimePrediction(packetData, pathPreface):
      #Create Dataset
-    predictionStartMs = int(time.time() * 1000)
-    predictions = []
-    model = Model.load(pathPreface + "/model.model")
-    #print(f'model: {model}')
-    
-    confidences = model.predict(packetData)
-    
-    confidencesPath = pathPreface + "/confidences.npy"
-    #Write Confidences to binary
-    if os.path.exists(confidencesPath):
-        tmpArr = np.load(confidencesPath,allow_pickle=False)
-        #print(f'confidences from file: {tmpArr}')
-        tmpArr = np.append(tmpArr,confidences, axis=0)
-        np.save(confidencesPath, tmpArr, allow_pickle=False)
-        #print(f'confidences shape (Binary): {tmpArr.shape}')
-        #print(f'dataPacket saved (Binary): {tmpArr}')   
-    else: 
-        np.save(confidencesPath, confidences, allow_pickle=False)
-        #print(f'dataPacket shape (Binary): {trainingData.shape}')
-        #print(f'dataPacket saved (Binary): {trainingData}')
-
+    predictionStartNs = instrument.now()
+    modelServer = getModelServer(pathPreface + "/model.model")    #Loaded once, reloaded only when the file changes
+    #print(f'model: {modelServer.model}')
+    
+    confidences = modelServer.predict(packetData)
+    
     #print(f'Confidences: {confidences}') 
 
-    predictionsPath = pathPreface + "/predictions.npy"
-    predictions = model.output_layer_activation.predictions(confidences)
+    predictions = modelServer.predictions(confidences)
     #print(f'Current Prediction: {predictions}')
     #print(f'Current Prediction: {predictions[0]}')
 
@@ -1222,36 +1526,46 @@ def realTimePrediction(packetData, pathPreface):
     if confidences[0, predList[0]] < 0.9:  #default to no movement unless 90% confident
         predList[0] = 0
 
-    #print(f'Current Prediction: {predictions}')
-    #Write predictions to binary
-    if os.path.exists(predictionsPath):
-        tmpArr = np.load(predictionsPath,allow_pickle=False)## Gets caughtup here
-        #print(f'Predictions from file shape: {tmpArr.shape()}')
-        #print(f'Predictions from file: {tmpArr}')
-        tmpArr = np.append(tmpArr,predList, axis=0)
-        np.save(predictionsPath, tmpArr, allow_pickle=False)
-        #print(f'dataPacket shape (Binary): {tmpArr.shape}')
-        #print(f'dataPacket saved (Binary): {tmpArr}')   
-    else: 
-        np.save(predictionsPath, predList, allow_pickle=False)
-        #print(f'dataPacket shape (Binary): {predList.shape}')
-        #print(f'dataPacket saved (Binary): {predList}')
-
-    predictionStopMS = int(time.time() * 1000)
-    predictionTimeMS = predictionStopMS - predictionStartMs
-
-
-    print(f'Time to predict: {predictionTimeMS}')
-    print('*******************************************')
-    print(f'prediction final: {predList[0]}') 
-    print(f'prediction final: {predList[0]}') 
-    print(f'prediction final: {predList[0]}') 
-    print('*******************************************')
+    #Append to the prediction log (written in the background, read back with predictionLog.readPredictionLog)
+    predictionLog.getPredictionLog(pathPreface + "/predictions.log", confidences.shape[1]).append(confidences[0], predList[0])
+
+    instrument.record('NeuralNetwork.realTimePrediction', predictionStartNs)
+    log.debug('prediction final: %s (model: %.3f ms)', predList[0], modelServer.lastLatencyMs)
 
     #print(f'packet after prediction: {packetData}')
 
     return predList
 
+def batchPrediction(packetBatch, pathPreface, *, threshold=0.9):
+    #realTimePrediction for several inputs at once (eg. one row per glove in asyncClient) - one model call for the whole batch
+    #Returns (predictions, confidences); a row defaults to 0 (no movement) unless its prediction is at least threshold confident
+    modelServer = getModelServer(pathPreface + "/model.model")
+    confidences = modelServer.predict(packetBatch)
+    predictions = np.asarray(modelServer.predictions(confidences))
+    predictions = np.where(confidences[np.arange(predictions.shape[0]), predictions] < threshold, 0, predictions)
+    return predictions, confidences
+
+def createOrientationModel(numFeatures, numGestures, *, dtype=None):
+    #The hand position classifier trained by trainOrientation (dtype: see Model.finalize)
+    model = Model()   #Instanstiate the model
+
+    #Add layers
+    #Input is 3 axis * numSensors * packetSize features
+    model.add(Layer_Dense(numFeatures,300, weight_regularizer_l2=5e-4, bias_regularizer_l2=5e-4))
+    model.add(Activation_ReLu())
+    model.add(Layer_Dropout(0.1))
+    model.add(Layer_Dense(300,numGestures))
+    model.add(Activation_Softmax())
+    
+    model.set(
+        loss=Loss_CategoricalCrossEntropy(),
+        optimizer=Optimizer_Adam(learning_rate=0.05, decay=5e-5),
+        accuracy=Accuracy_Categorical()
+    )
+    
+    model.finalize(dtype=dtype)
+    return model
+
 def trainOrientation(pathPreface, pathList, packetSize, numSensors, numGestures):
     #Create Dataset
     #TODO: Create data and validation arrays
@@ -1283,7 +1597,9 @@ def trainOrientation(pathPreface, pathList, packetSize, numSensors, numGestures)
     print(f'data array for model: {X}') 
     #y = y.reshape(y.shape[0])  #reshape truth data only if truth data is formatted as 2-D
     EPOCHS = 100
-    BATCH_SIZE = 1
+    BATCH_SIZE = 32         #Batch size 1 was ~12x slower per epoch and less accurate (python benchmarks.py batchSize)
+    VALIDATION_SPLIT = 0.1  #Share of the (already shuffled) samples held back for early stopping
+    PATIENCE = 10           #Epochs without a better validation loss before training stops
     
     modelOk = 0
     if os.path.exists(pathPreface +  "/model.model"):     #Use the existing model if it exists
@@ -1299,32 +1615,27 @@ def trainOrientation(pathPreface, pathList, packetSize, numSensors, numGestures)
 
     if modelOk == 0:   
         print('Creating a new model')                                 #Or create a new one
-        model = Model()   #Instanstiate the model
-
-        #Add layers
-        #Input is 15 features (3 Axis * 5 samples)
-        model.add(Layer_Dense(3*packetSize * numSensors,300, weight_regularizer_l2=5e-4, bias_regularizer_l2=5e-4))
-        model.add(Activation_ReLu())
-        model.add(Layer_Dropout(0.1))
-        model.add(Layer_Dense(300,numGestures))
-        model.add(Activation_Softmax())
-        
-        model.set(
-            loss=Loss_CategoricalCrossEntropy(),
-            optimizer=Optimizer_Adam(learning_rate=0.05, decay=5e-5),
-            accuracy=Accuracy_Categorical()
-        )
-        
-        model.finalize()
+        model = createOrientationModel(3*packetSize * numSensors, numGestures)
     
+    validation_data = None
+    validationCount = int(len(X) * VALIDATION_SPLIT)
+    #Hold back VALIDATION_SPLIT of the samples for early stopping - with too few samples (under one per gesture) train on everything for EPOCHS
+    if validationCount >= numGestures:
+        validation_data = (X[:validationCount], y[:validationCount])
+        X, y = X[validationCount:], y[validationCount:]
+
     #model.train(X,y, validation_data=(X_test, y_test),epochs=EPOCHS, batch_size=BATCH_SIZE, print_every=5)
-    model.train(X,y, epochs=EPOCHS, batch_size=BATCH_SIZE, print_every=1000)
+    model.train(X,y, epochs=EPOCHS, batch_size=BATCH_SIZE, print_every=1000, validation_data=validation_data, early_stopping_patience=PATIENCE)
     
     #parameters = model.get_parameters()
     #print(f'parameters: {parameters}')
     
     model.save(pathPreface + "/model.model")
 
+    #Make a running prediction loop pick up the new weights straight away
+    if pathPreface + "/model.model" in modelServers:
+        modelServers[pathPreface + "/model.model"].refresh(force=True)
+
 def createTestModel():
     model = Model()   #Instanstiate the model
         
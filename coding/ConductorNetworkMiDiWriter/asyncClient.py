@@ -0,0 +1,274 @@
+"""
+Description:
+This Python script defines an asyncio client that runs several Conductor gloves from one process. socketClient.GetData is tied to one
+host / port and blocks on its socket, so every extra glove used to need its own process. Here each glove is a Device with its own connection,
+framing (frame size follows its numSensors and ToF setting), reconnect backoff and sample queue, all running as tasks on one event loop.
+A tick loop collects the newest input window of every glove that has new samples and predicts them all with one batched model call.
+
+Classes and Methods:
+- Device: One glove.
+    - __init__(): Initializes the device with parameters:
+        - host / port: Address of the glove (or a fakeConductor.FakeConductor).
+        - name: Label used in stats and logs (defaults to host:port).
+        - numSensors / packetSize: Shape of the model input for this glove.
+        - ToFEnable: Ask for the ToF byte (0x0F prompt) instead of accelerometers only (0xFF prompt).
+        - queueSize: Samples held between ticks. When it is full the oldest sample is dropped.
+        - connectTimeout / readTimeout: Seconds before a connect or a frame read is given up and the connection is reopened.
+        - backoffStart / backoffMax: Reconnect backoff in seconds, doubled after each failed attempt.
+    - run(): Coroutine that connects, prompts and queues frames until stop() (reconnecting when the connection drops).
+    - takeWindow(): Shifts every queued sample into the device's input window. Returns (window, ToFByte, receivedNs) or None.
+    - stop(): Ends run() and closes the connection.
+- ConductorClient: Runs the devices and the tick loop.
+    - __init__(): Initializes the client with parameters:
+        - devices: List of Device.
+        - predict: Callable taking an (n, features) batch and returning n predictions (one model call per tick).
+        - dispatch: Callable taking (device, prediction, ToFByte), eg. the device's MiDiWriter.getPredictions.
+        - tickInterval: Seconds between ticks.
+    - run(): Coroutine that runs every device and the tick loop until stop() or for duration seconds.
+    - stop(): Stops the tick loop and every device.
+    - stats(): Per device counters, batch sizes and the sample-to-dispatch latency.
+
+Functions:
+- forModel(): Builds a ConductorClient that predicts with the model in pathPreface (NeuralNetwork.batchPrediction) and hands each glove's
+    predictions to its own writer.
+
+Note: Run this file directly to stream from three local fakeConductor servers for a few seconds and print the stats.
+All devices in one ConductorClient share one model, so they need the same numSensors and packetSize.
+"""
+
+import asyncio
+import collections
+import socket
+import struct
+import time
+
+import numpy as np
+
+import instrument
+import pipeline
+import sensorStream
+
+log = instrument.getLogger(__name__)
+
+
+class Device:
+
+    def __init__(self, host, port, *, name=None, numSensors=4, packetSize=1, ToFEnable=False, queueSize=8, connectTimeout=2.0, readTimeout=1.0, backoffStart=0.1, backoffMax=5.0):
+        self.host = host
+        self.port = port
+        self.name = name if name is not None else f'{host}:{port}'
+        self.numSensors = numSensors
+        self.packetSize = packetSize
+        self.ToFEnable = ToFEnable
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.backoffStart = backoffStart
+        self.backoffMax = backoffMax
+        self.samples = collections.deque(maxlen=queueSize)   #(receivedNs, frame) - appending to a full deque drops the oldest
+        self.window = np.zeros([self.packetSize * self.numSensors * 3])    #Oldest sample first, like the rolled packetData in socketClient
+        self.filled = 0          #Samples in the window (predictions start once it holds a full packet)
+        self.running = False
+        self.connected = False
+        self.writer = None
+        self.sampleCount = 0     #Samples received
+        self.dropCount = 0       #Samples dropped because the queue was full
+        self.reconnectCount = 0  #Connections made after the first one
+
+    def frameSize(self, ToFEnable=None):
+        if ToFEnable is None:
+            ToFEnable = self.ToFEnable
+        return self.numSensors * 3 + (1 if ToFEnable else 0)
+
+    async def _connect(self):
+        #Keeps trying with exponential backoff until it works or stop() is called
+        backoff = self.backoffStart
+        while self.running:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.connectTimeout)
+                sock = writer.get_extra_info('socket')
+                if sock is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)   #One byte prompts
+                self.writer = writer
+                self.connected = True
+                return reader
+            except (OSError, asyncio.TimeoutError) as err:
+                log.warning("%s: TCP/IP Socket Error: %r. Retrying in %.2fs", self.name, err, backoff)
+                instrument.count('asyncClient.connectError')
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.backoffMax)
+        return None
+
+    def _close(self):
+        self.connected = False
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def run(self):
+        self.running = True
+        firstConnect = True
+        while self.running:
+            reader = await self._connect()
+            if reader is None:
+                break
+            if not firstConnect:
+                self.reconnectCount += 1
+            firstConnect = False
+
+            #stop() sets self.writer to None and closes it - this local keeps working until the closed connection raises, caught below
+            writer = self.writer
+            try:
+                while self.running:
+                    ToFEnable = self.ToFEnable   #Read once so the prompt and the frame size agree
+                    writer.write(struct.pack("=B", sensorStream.PROMPT_ACC_TOF if ToFEnable else sensorStream.PROMPT_ACC))
+                    frame = await asyncio.wait_for(reader.readexactly(self.frameSize(ToFEnable)), self.readTimeout)
+                    if len(self.samples) == self.samples.maxlen:
+                        self.dropCount += 1
+                    self.samples.append((time.perf_counter_ns(), frame))
+                    self.sampleCount += 1
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as err:
+                if self.running:
+                    log.warning("%s: Connection lost: %r. Reconnecting", self.name, err)
+                    instrument.count('asyncClient.connectionLost')
+            finally:
+                self._close()
+
+    def stop(self):
+        self.running = False
+        self._close()
+
+    def takeWindow(self):
+        #Returns (window, ToFByte, receivedNs) of the newest sample, or None if nothing new arrived or the packet isn't full yet
+        if not self.samples:
+            return None
+        sampleSize = self.numSensors * 3
+        while self.samples:
+            receivedNs, frame = self.samples.popleft()
+            acc, ToF = sensorStream.decodeFrames(frame, self.numSensors)
+            self.window[:-sampleSize] = self.window[sampleSize:]
+            self.window[-sampleSize:] = acc.reshape(-1)
+            self.filled = min(self.filled + 1, self.packetSize)
+        if self.filled < self.packetSize:
+            return None
+        return self.window, int(ToF[0]), receivedNs
+
+
+class ConductorClient:
+
+    def __init__(self, devices, predict, dispatch=None, *, tickInterval=0.01):
+        if len({(device.numSensors, device.packetSize) for device in devices}) > 1:
+            raise ValueError('All devices in one ConductorClient share a model - numSensors and packetSize must match')
+        self.devices = devices
+        self.predict = predict
+        self.dispatch = dispatch
+        self.tickInterval = tickInterval
+        self.batch = np.zeros([len(devices), devices[0].packetSize * devices[0].numSensors * 3]) if devices else None
+        self.running = False
+        self.tickCount = 0
+        self.batchCount = 0       #Ticks that made a model call
+        self.batchSizes = collections.Counter()   #Rows per model call
+        self.latency = pipeline.LatencyStats()    #Newest sample received -> dispatched
+        self.inference = pipeline.LatencyStats()  #One batched model call
+
+    async def run(self, duration=None):
+        self.running = True
+        tasks = [asyncio.create_task(device.run()) for device in self.devices]
+        try:
+            await self._tickLoop(duration)
+        finally:
+            self.stop()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        self.running = False
+        for device in self.devices:
+            device.stop()
+
+    async def _tickLoop(self, duration):
+        loop = asyncio.get_running_loop()
+        startTime = nextTick = loop.time()
+        while self.running and (duration is None or loop.time() - startTime < duration):
+            nextTick += self.tickInterval
+            await asyncio.sleep(max(0, nextTick - loop.time()))
+            self.tick()
+
+    def tick(self):
+        #Gathers every device with a new full window into one batch and predicts it with a single model call
+        self.tickCount += 1
+        ready = []
+        for device in self.devices:
+            taken = device.takeWindow()
+            if taken is not None:
+                self.batch[len(ready)] = taken[0]
+                ready.append((device, taken[1], taken[2]))
+        if not ready:
+            return
+
+        startNs = time.perf_counter_ns()
+        predictions = self.predict(self.batch[:len(ready)])
+        self.inference.add(time.perf_counter_ns() - startNs)
+        self.batchCount += 1
+        self.batchSizes[len(ready)] += 1
+
+        for (device, ToFByte, receivedNs), prediction in zip(ready, predictions):
+            if self.dispatch is not None:
+                self.dispatch(device, int(prediction), ToFByte)
+            self.latency.add(time.perf_counter_ns() - receivedNs)
+
+    def stats(self):
+        return {
+            'ticks': self.tickCount,
+            'batches': self.batchCount,
+            'batchSizes': dict(sorted(self.batchSizes.items())),
+            'inference': self.inference.summary(),
+            'sampleToDispatch': self.latency.summary(),
+            'devices': {device.name: {'samples': device.sampleCount, 'dropped': device.dropCount, 'reconnects': device.reconnectCount,
+                                      'connected': device.connected} for device in self.devices},
+        }
+
+
+def forModel(devices, pathPreface, writers, *, tickInterval=0.01):
+    #writers: one MiDiWriter / OSCWriter per device, in the same order
+    import NeuralNetwork
+
+    writerFor = {device.name: writer for device, writer in zip(devices, writers)}
+
+    def predict(batch):
+        return NeuralNetwork.batchPrediction(batch, pathPreface)[0]
+
+    def dispatch(device, prediction, ToFByte):
+        writer = writerFor[device.name]
+        if writer.ToFEnable and 0 < ToFByte < 128:    #Valid ToF data
+            writer.ToFByte = ToFByte
+        writer.getPredictions(prediction)
+        device.ToFEnable = bool(writer.ToFEnable)    #Takes effect on the device's next prompt
+
+    return ConductorClient(devices, predict, dispatch, tickInterval=tickInterval)
+
+
+def main():
+    import fakeConductor
+
+    servers = [fakeConductor.FakeConductor(numSensors=4, seed=i) for i in range(3)]
+    devices = [Device(server.host, server.start(), name=f'glove{i}', numSensors=4) for i, server in enumerate(servers)]
+    received = collections.Counter()
+
+    def predict(batch):
+        return np.argmax(batch[:, :5], axis=1)   #Stand-in for a model - see forModel()
+
+    def dispatch(device, prediction, ToFByte):
+        received[device.name] += 1
+
+    client = ConductorClient(devices, predict, dispatch)
+    asyncio.run(client.run(duration=3))
+    for server in servers:
+        server.stop()
+
+    stats = client.stats()
+    print(f"{stats['ticks']} ticks, {stats['batches']} batched model calls, rows per call: {stats['batchSizes']}")
+    for name, deviceStats in stats['devices'].items():
+        print(f"{name}: {deviceStats['samples']} samples, {deviceStats['dropped']} dropped, {received[name]} predictions dispatched")
+    print(f"sample-to-dispatch p50 {stats['sampleToDispatch']['p50Ms']:.3f} ms, p99 {stats['sampleToDispatch']['p99Ms']:.3f} ms")
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,1298 @@
+"""
+Description:
+This Python script holds micro-benchmarks for the real-time path of The Conductor. Each benchmark runs against local stand-ins
+for the ESP32 so the numbers can be compared between versions without a glove connected.
+
+Functions:
+- benchFrameReader(): Byte-at-a-time sock.recv(1) against sensorStream.FrameReader (recv_into on a preallocated buffer).
+    Reports time, recv calls (syscalls) and bytes allocated per sample.
+- benchSoftmaxBackward(): Checks Activation_Softmax.backward against a numerical gradient for the MSE, binary and categorical
+    cross-entropy losses, then times it against the per-sample Jacobian loop it replaced.
+- benchDtype(): float32 against float64 models - training time, test accuracy, realTimePrediction latency per sample and
+    batch inference time.
+- benchInferencePlan(): Model.predict through the compiled InferencePlan against the generic forward() chain, for one sample
+    (real-time) and one large offline batch (checked against forward()).
+- benchModelFormat(): Load time and file size of the weight-only model format (Model.save) against the old dill format.
+- benchImportTime(): python -X importtime totals for the real-time modules and which heavy libraries (nnfs, matplotlib, dill, scipy,
+    pythonosc) each one pulls in. Pass a git revision to compare with it, eg. python benchmarks.py importTime:HEAD~1
+- benchPipeline(): Predictions per second and sample-to-MIDI latency of the old one-after-another loop against pipeline.Pipeline (BLOCK
+    and DROP_OLDEST) with a fakeConductor sensor server replying after latencyMs and a stand-in MIDI writer taking dispatchMs per prediction.
+- benchAsyncClient(): asyncClient.ConductorClient against numDevices fakeConductor servers (each dropped once halfway): samples per glove,
+    reconnects, rows per batched model call, and the model time per tick batched against one call per glove.
+- benchConditions(): The old per-control rescan of the last threshold predictions against the shared gestureWindow.GestureWindow
+    running counts, for several control counts and thresholds, and checks both make the same hold decisions.
+- benchPredictionHistory(): The old list + garbageMan() prediction history against predictionRing.PredictionRing: time per appended
+    prediction with a hold check on a window of the history, and peak memory.
+- benchInstrument(): Per sample cost of the old print() timing and banners in realTimePrediction vs instrument.record() and a disabled
+    log.debug(), with instrumentation off and in summary mode.
+- benchEndToEnd(): The whole chain GetData.receiveBytes -> processData -> realTimePrediction -> MiDiWriter.getPredictions -> MidiPlayer.play_beat
+    against a fakeConductor replaying trained hand positions, with a capturing MidiOut in place of rtmidi. Reports p50/p95/p99 and
+    throughput per stage, and the time from the first sample of a new hand position (or the decision to turn a control on) to the first
+    MIDI message it causes.
+- benchMidiClock(): Tempo drift and message timing of the old sleep-after-every-message loop against midiClock.MidiClock's absolute
+    deadlines, at 60, 120, 180 and 240 BPM at once into capturing MidiOuts, for 10 minutes by default (python benchmarks.py midiClock:1
+    for one minute, midiClock:10:90,150 for other tempos).
+- benchDispatcher(): The old thread per control per beat against midiDispatcher.MidiDispatcher's single thread and deadline heap, for
+    1, 4, 16 and 64 controls: how late each message is sent against its deadline, and CPU time per beat.
+- benchPlayLoop(): The old MiDiWriter.play_loop (refreshMidi sleeping 30 ms and rebuilding every control on every pass) against the
+    event-driven one: CPU use while idle and while playing, refreshMidi time, and the time from a control turning on to its first MIDI message.
+- benchBuildMidi(): MidiBuilder.build_midi with and without its LRU cache for controls switching between a handful of rate / waveform /
+    range settings: time per build, cache hits and misses, and checks cached and fresh messages are the same.
+- benchMidiMessages(): The old list of 3-element lists (a MIDIControlChange object per value) against buildMidi's packed (N, 3) uint8
+    message arrays for each rate of a CC waveform: build time, time to queue a beat on the dispatcher, and memory per beat.
+- benchBatchSize(): Model.train wall-clock time and held-out accuracy for batch sizes 1, 16, 64 and 256 on a synthetic gesture dataset.
+
+Usage:
+    python benchmarks.py                 Runs every benchmark
+    python benchmarks.py frameReader     Runs only the named benchmark(s)
+    python benchmarks.py name:arg        Passes arg to the benchmark
+    python benchmarks.py endToEnd --report=report.json     Also writes the results as JSON (with the git revision)
+    python benchmarks.py --compare old.json new.json       Prints every number in both reports with the new / old ratio
+"""
+
+import collections
+import contextlib
+import io
+import json
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+import fakeConductor
+import sensorStream
+
+
+def _loopbackPair(numSensors):
+    #Minimal stand-in server for allocation counts: answers every prompt with a prebuilt frame so the
+    #server thread itself allocates nothing while the client is being measured
+    frame = fakeConductor.FakeConductor(numSensors=numSensors, seed=0).nextFrame()
+    listener = socket.create_server(("127.0.0.1", 0))
+    client = socket.create_connection(listener.getsockname())
+    server, _ = listener.accept()
+    listener.close()
+    for sock in (client, server):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def serve():
+        prompt = bytearray(1)
+        try:
+            while server.recv_into(prompt, 1):
+                server.sendall(frame)
+        except OSError:
+            pass
+        server.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return client, thread
+
+
+def benchFrameReader(samples=5000, numSensors=4):
+    print()
+    print('benchFrameReader()')
+    prompt = struct.pack("=B", 0xFF)
+    frameSize = numSensors * 3
+
+    def legacyRead(sock):
+        #The old receiveBytes loop: one recv syscall and one bytes object per byte
+        y = []
+        a = 0
+        while a < frameSize:
+            y.append(sock.recv(1))
+            a += 1
+        return y, frameSize
+
+    reader = sensorStream.FrameReader(numSensors)
+
+    def frameRead(sock):
+        callsBefore = reader.recvCalls
+        view = reader.readFrame(sock, frameSize)
+        return view, reader.recvCalls - callsBefore
+
+    results = {}
+    for name, readSample in (('recv(1) loop', legacyRead), ('FrameReader', frameRead)):
+        sock, serverThread = _loopbackPair(numSensors)
+        recvCalls = 0
+        allocBytes = 0
+        tracemalloc.start()
+        startNs = time.perf_counter_ns()
+        for i in range(samples):
+            sock.sendall(prompt)
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            y, calls = readSample(sock)
+            allocBytes += tracemalloc.get_traced_memory()[1] - before
+            recvCalls += calls
+        stopNs = time.perf_counter_ns()
+        tracemalloc.stop()
+        sock.close()
+        serverThread.join()
+
+        results[name] = {
+            'usPerSample': (stopNs - startNs) / samples / 1000,
+            'recvPerSample': recvCalls / samples,
+            'allocBytesPerSample': allocBytes / samples,
+        }
+        print(f"{name:>14}: {results[name]['usPerSample']:8.1f} us/sample, "
+              f"{results[name]['recvPerSample']:5.2f} recv calls/sample, "
+              f"{results[name]['allocBytesPerSample']:7.1f} bytes allocated/sample")
+
+    print('(time includes the tracemalloc overhead - compare the two rows, not absolute values)')
+    return results
+
+
+def benchSoftmaxBackward(samples=256, numGestures=5, epsilon=1e-6, tolerance=1e-6):
+    import NeuralNetwork
+
+    print()
+    print('benchSoftmaxBackward()')
+    rng = np.random.default_rng(0)
+    inputs = rng.normal(size=(samples, numGestures))
+    labels = rng.integers(0, numGestures, size=samples)
+    oneHot = np.eye(numGestures)[labels]
+    softmax = NeuralNetwork.Activation_Softmax()
+
+    def lossValue(loss, y, logits):
+        softmax.forward(logits, training=False)
+        return np.mean(loss.forward(softmax.output, y))
+
+    #Gradient check - central differences on every input against the analytic backward pass
+    maxErrors = {}
+    for name, loss, y in (('MSE', NeuralNetwork.Loss_MeanSquaredError(), oneHot),
+                          ('binary cross-entropy', NeuralNetwork.Loss_BinaryCrossentropy(), oneHot),
+                          ('categorical cross-entropy', NeuralNetwork.Loss_CategoricalCrossEntropy(), labels)):
+        softmax.forward(inputs, training=True)
+        loss.backward(softmax.output, y)
+        softmax.backward(loss.dinputs)
+        analytic = softmax.dinputs
+
+        numeric = np.empty_like(inputs)
+        shifted = inputs.copy()
+        for index in np.ndindex(inputs.shape):
+            shifted[index] = inputs[index] + epsilon
+            lossUp = lossValue(loss, y, shifted)
+            shifted[index] = inputs[index] - epsilon
+            lossDown = lossValue(loss, y, shifted)
+            shifted[index] = inputs[index]
+            numeric[index] = (lossUp - lossDown) / (2 * epsilon)
+
+        maxErrors[name] = np.max(np.abs(analytic - numeric))
+        print(f'{name:>26}: max gradient error {maxErrors[name]:.2e} ({"ok" if maxErrors[name] < tolerance else "FAILED"})')
+
+    #Timing against the old per-sample Jacobian loop (with its typos fixed)
+    def jacobianLoop(output, dvalues):
+        dinputs = np.empty_like(dvalues)
+        for index, (single_output, single_dvalues) in enumerate(zip(output, dvalues)):
+            single_output = single_output.reshape(-1, 1)
+            jacobian_matrix = np.diagflat(single_output) - single_output @ single_output.T
+            dinputs[index] = jacobian_matrix @ single_dvalues
+        return dinputs
+
+    softmax.forward(inputs, training=True)
+    dvalues = rng.normal(size=inputs.shape)
+    repeats = 100
+    startNs = time.perf_counter_ns()
+    for i in range(repeats):
+        loopResult = jacobianLoop(softmax.output, dvalues)
+    loopUs = (time.perf_counter_ns() - startNs) / repeats / 1000
+    startNs = time.perf_counter_ns()
+    for i in range(repeats):
+        softmax.backward(dvalues)
+    vectorUs = (time.perf_counter_ns() - startNs) / repeats / 1000
+    print(f'batch of {samples}: Jacobian loop {loopUs:.1f} us, vectorized {vectorUs:.1f} us '
+          f'(results match: {np.allclose(loopResult, softmax.dinputs)})')
+
+    return {'maxErrors': maxErrors, 'loopUs': loopUs, 'vectorUs': vectorUs}
+
+
+def benchInferencePlan(repeats=20000, batch=100000, numGestures=5, numSensors=4):
+    import NeuralNetwork
+
+    print()
+    print('benchInferencePlan()')
+    X, _ = fakeConductor.syntheticGestures(batch, numGestures, numSensors, seed=0)
+    model = NeuralNetwork.createOrientationModel(numSensors * 3, numGestures)
+    sample = X[:1]
+
+    def forwardChain(x):
+        #The old predict(): generic forward pass, stores inputs/outputs on every layer, dropout copies
+        return model.forward(x, training=False).copy()
+
+    results = {}
+    for name, predict in (('forward() chain', forwardChain), ('InferencePlan', model.predict)):
+        predict(sample)
+        startNs = time.perf_counter_ns()
+        for i in range(repeats):
+            predict(sample)
+        singleUs = (time.perf_counter_ns() - startNs) / repeats / 1000
+
+        startNs = time.perf_counter_ns()
+        output = predict(X)
+        batchMs = (time.perf_counter_ns() - startNs) / 1e6
+        results[name] = {'singleUs': singleUs, 'batchMs': batchMs, 'output': output}
+        print(f'{name:>16}: 1 sample {singleUs:6.2f} us, batch of {batch} {batchMs:7.2f} ms')
+
+    batched = model.predict(X, batch_size=4096)   #Stacks every batch, not just the first one
+    print(f"batched predict matches forward(): {np.allclose(batched, results['forward() chain']['output'], atol=1e-6)} "
+          f"({batched.shape[0]} rows)")
+    return results
+
+
+def benchModelFormat(repeats=200, numGestures=5, numSensors=4):
+    import NeuralNetwork
+
+    print()
+    print('benchModelFormat()')
+    X, y = fakeConductor.syntheticGestures(1000, numGestures, numSensors, seed=0)
+    model = NeuralNetwork.createOrientationModel(numSensors * 3, numGestures)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(X, y, epochs=2, batch_size=32)   #So the optimizer caches exist, as in a real model.model
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpPath:
+        for name, save, load in (('dill', model.save_dill, NeuralNetwork.Model.load_dill),
+                                 ('weight-only', model.save, NeuralNetwork.Model.load)):
+            path = tmpPath + '/' + name + '.model'
+            save(path)
+            load(path)
+            startNs = time.perf_counter_ns()
+            for i in range(repeats):
+                loaded = load(path)
+            loadMs = (time.perf_counter_ns() - startNs) / repeats / 1e6
+            results[name] = {
+                'loadMs': loadMs,
+                'bytes': os.path.getsize(path),
+                'matches': bool(np.allclose(loaded.predict(X), model.predict(X))),
+            }
+            print(f"{name:>12}: load {loadMs:6.2f} ms, file {results[name]['bytes'] / 1024:6.1f} KiB, "
+                  f"predictions match: {results[name]['matches']}")
+
+    return results
+
+
+def _importTimes(module, cwd, repeats):
+    #Runs python -X importtime in a fresh interpreter, returns (best total us, set of top level packages imported) or None if the import fails
+    best = None
+    packages = set()
+    for i in range(repeats):
+        run = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd, capture_output=True, text=True)
+        if run.returncode != 0:
+            return None
+        total = 0
+        for line in run.stderr.splitlines():
+            match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)', line)
+            if match is None:
+                continue
+            if len(match.group(3)) == 1:    #Top level import - its cumulative time includes everything below it
+                total += int(match.group(2))
+            packages.add(match.group(4).split('.')[0])
+        best = total if best is None else min(best, total)
+    return best, packages
+
+
+def benchImportTime(baseline=None, modules=('NeuralNetwork', 'sensorStream', 'socketClient', 'socketClientUx', 'midiWriter', 'ux'), repeats=5):
+    print()
+    print('benchImportTime()')
+    heavy = ('nnfs', 'matplotlib', 'dill', 'scipy', 'pythonosc')
+    here = os.path.dirname(os.path.abspath(__file__))
+    trees = {'current': here}
+
+    with tempfile.TemporaryDirectory() as tmpPath:
+        if baseline is not None:
+            #Export this folder as it was at the baseline revision
+            archive = subprocess.run(['git', 'archive', baseline, '.'], cwd=here, capture_output=True, check=True).stdout
+            subprocess.run(['tar', '-x', '-C', tmpPath], input=archive, check=True)
+            trees = {baseline: tmpPath, 'current': here}
+
+        results = {}
+        for module in modules:
+            results[module] = {}
+            for name, cwd in trees.items():
+                times = _importTimes(module, cwd, repeats)
+                results[module][name] = times
+                if times is None:
+                    print(f'{module:>16} [{name}]: import failed (missing dependency?)')
+                else:
+                    print(f'{module:>16} [{name}]: {times[0] / 1000:7.1f} ms, heavy imports: {", ".join(sorted(set(heavy) & times[1])) or "none"}')
+
+    return results
+
+
+def benchBatchSize(samples=2000, epochs=20, batchSizes=(1, 16, 64, 256), numGestures=5, numSensors=4):
+    import NeuralNetwork
+
+    print()
+    print('benchBatchSize()')
+    X, y = fakeConductor.syntheticGestures(samples, numGestures, numSensors, noise=0.6, seed=0)
+    testCount = samples // 5
+    X_test, y_test = X[:testCount], y[:testCount]
+    X_train, y_train = X[testCount:], y[testCount:]
+
+    results = {}
+    for batchSize in batchSizes:
+        model = NeuralNetwork.createOrientationModel(numSensors * 3, numGestures)
+        with contextlib.redirect_stdout(io.StringIO()):   #Model.train prints every epoch
+            startNs = time.perf_counter_ns()
+            model.train(X_train, y_train, epochs=epochs, batch_size=batchSize, seed=0)
+            stopNs = time.perf_counter_ns()
+            _, accuracy = model.evaluate(X_test, y_test)
+
+        results[batchSize] = {
+            'seconds': (stopNs - startNs) / 1e9,
+            'accuracy': accuracy,
+        }
+        print(f"batch size {batchSize:>4}: {results[batchSize]['seconds']:7.2f} s for {epochs} epochs, "
+              f"test accuracy {results[batchSize]['accuracy']:.3f}")
+
+    return results
+
+
+def benchDtype(samples=2000, epochs=20, predictions=2000, batch=4096, numGestures=5, numSensors=4):
+    import NeuralNetwork
+
+    print()
+    print('benchDtype()')
+    X, y = fakeConductor.syntheticGestures(samples, numGestures, numSensors, noise=0.6, seed=0)
+    testCount = samples // 5
+    X_test, y_test = X[:testCount], y[:testCount]
+    X_train, y_train = X[testCount:], y[testCount:]
+
+    results = {}
+    models = {}
+    for dtype in (np.float64, np.float32):
+        name = np.dtype(dtype).name
+        np.random.seed(0)   #Same initial weights for both
+        model = models[name] = NeuralNetwork.createOrientationModel(numSensors * 3, numGestures, dtype=dtype)
+        with contextlib.redirect_stdout(io.StringIO()):
+            startNs = time.perf_counter_ns()
+            model.train(X_train, y_train, epochs=epochs, batch_size=32, seed=0)
+            trainSeconds = (time.perf_counter_ns() - startNs) / 1e9
+            _, accuracy = model.evaluate(X_test, y_test)
+        results[name] = {
+            'trainSeconds': trainSeconds,
+            'accuracy': accuracy,
+            'weightBytes': sum(layer.weights.nbytes + layer.biases.nbytes for layer in model.trainable_layers),
+        }
+
+    with tempfile.TemporaryDirectory() as tmpPath:
+        #realTimePrediction latency - the two models take turns so drift in machine load hits both equally
+        pathPrefaces = {}
+        for name, model in models.items():
+            pathPrefaces[name] = tmpPath + '/' + name
+            os.makedirs(pathPrefaces[name])
+            model.save(pathPrefaces[name] + "/model.model")
+        latencies = {name: np.empty(predictions) for name in models}
+        predicted = {name: np.empty(predictions, dtype=int) for name in models}
+        with contextlib.redirect_stdout(io.StringIO()):   #realTimePrediction prints every prediction
+            for i in range(predictions):
+                sample = X_test[i % testCount:i % testCount + 1]
+                for name in models:
+                    startNs = time.perf_counter_ns()
+                    predicted[name][i] = NeuralNetwork.realTimePrediction(sample, pathPrefaces[name])[0]
+                    latencies[name][i] = (time.perf_counter_ns() - startNs) / 1000
+
+    #Batch inference throughput - where the smaller weights and activations matter
+    X_batch = np.resize(X_test, (batch, X_test.shape[1]))
+    for name, model in models.items():
+        model.predict(X_batch)
+        startNs = time.perf_counter_ns()
+        for i in range(20):
+            model.predict(X_batch)
+        results[name]['batchUs'] = (time.perf_counter_ns() - startNs) / 20 / 1000
+        results[name]['predictUsP50'] = float(np.percentile(latencies[name], 50))
+        results[name]['predictions'] = predicted[name]
+        print(f"{name}: train {results[name]['trainSeconds']:5.2f} s, test accuracy {results[name]['accuracy']:.3f}, "
+              f"realTimePrediction p50 {results[name]['predictUsP50']:6.1f} us, "
+              f"batch of {batch} {results[name]['batchUs'] / 1000:6.2f} ms, "
+              f"weights {results[name]['weightBytes'] / 1024:.1f} KiB")
+
+    agreement = np.mean(predicted['float32'] == predicted['float64'])
+    print(f'float32 and float64 real-time predictions agree on {agreement * 100:.1f}% of samples')
+    return results
+
+
+def benchPipeline(seconds=3, latencyMs=2.0, dispatchMs=1.0, numGestures=5, numSensors=4):
+    import NeuralNetwork
+    import pipeline
+
+    print()
+    print('benchPipeline()')
+    seconds = float(seconds)
+    latency = float(latencyMs) / 1000
+    dispatchSeconds = float(dispatchMs) / 1000
+    model = NeuralNetwork.createOrientationModel(numSensors * 3, numGestures)
+    frames, labels = fakeConductor.syntheticFrames(1000, numGestures, numSensors, seed=0)
+
+    def predict(NNInput):
+        return int(np.argmax(model.predict(NNInput)))
+
+    def dispatch(prediction, ToFByte):
+        time.sleep(dispatchSeconds)     #Stand-in for MiDiWriter.getPredictions
+
+    results = {}
+    for name in ('sequential', pipeline.BLOCK, pipeline.DROP_OLDEST):
+        server = fakeConductor.FakeConductor(numSensors=numSensors, seed=0, frames=frames, labels=labels, latency=latency)
+        server.start()
+        sock = socket.create_connection((server.host, server.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = sensorStream.FrameReader(numSensors)
+
+        def source():
+            #Prompt and wait for the reply like GetData.receiveBytes without streaming
+            sock.sendall(bytes([sensorStream.PROMPT_ACC]))
+            return reader.readFrame(sock, numSensors * 3)
+
+        if name == 'sequential':
+            #The old socketLoop: receive, decode, predict and dispatch one after another
+            endToEnd = pipeline.LatencyStats()
+            stopAt = time.perf_counter() + seconds
+            while time.perf_counter() < stopAt:
+                frame = source()
+                receivedNs = time.perf_counter_ns()
+                acc, ToF = sensorStream.decodeFrames(frame, numSensors)
+                dispatch(predict(acc.reshape(1, -1)), int(ToF[0]))
+                endToEnd.add(time.perf_counter_ns() - receivedNs)
+            summary = endToEnd.summary()
+            dropped = 0
+        else:
+            runner = pipeline.Pipeline(source, predict, dispatch, numSensors=numSensors, policy=name)
+            runner.start()
+            time.sleep(seconds)
+            runner.stop()
+            stats = runner.stats()
+            summary = stats['latency']['endToEnd']
+            dropped = stats['inferenceQueue']['dropped'] + stats['dispatchQueue']['dropped']
+            if name == pipeline.DROP_OLDEST:
+                with contextlib.redirect_stdout(io.StringIO()) as table:
+                    runner.printStats()
+        sock.close()
+        server.stop()
+
+        results[name] = dict(summary, perSecond=summary['count'] / seconds, dropped=dropped)
+        print(f"{name:>10}: {results[name]['perSecond']:7.1f} predictions/s dispatched, dropped {dropped:6d}, "
+              f"sample-to-MIDI p50 {summary['p50Ms']:6.3f} ms, p95 {summary['p95Ms']:6.3f} ms, p99 {summary['p99Ms']:6.3f} ms")
+
+    print(f'{pipeline.DROP_OLDEST} stages (sensor round trip {latencyMs} ms, dispatch stand-in {dispatchMs} ms):')
+    print(table.getvalue(), end='')
+    return results
+
+
+def benchAsyncClient(seconds=3, numDevices=4, numGestures=5, numSensors=4):
+    import asyncio
+    import NeuralNetwork
+    import asyncClient
+
+    print()
+    print('benchAsyncClient()')
+    seconds = float(seconds)
+    numDevices = int(numDevices)
+    model = NeuralNetwork.createOrientationModel(numSensors * 3, numGestures)
+    servers = [fakeConductor.FakeConductor(numSensors=numSensors, seed=i) for i in range(numDevices)]
+    devices = [asyncClient.Device(server.host, server.start(), name=f'glove{i}', numSensors=numSensors) for i, server in enumerate(servers)]
+    batches = []
+
+    def predict(batch):
+        batches.append(batch.copy())
+        return np.argmax(model.predict(batch), axis=1)
+
+    client = asyncClient.ConductorClient(devices, predict)
+
+    async def dropHalfway():
+        #Every glove loses its connection once - each device has to reconnect on its own
+        await asyncio.sleep(seconds / 2)
+        for server in servers:
+            server.dropClients()
+
+    async def run():
+        await asyncio.gather(client.run(duration=seconds), dropHalfway())
+
+    with contextlib.redirect_stdout(io.StringIO()):    #Reconnect messages
+        asyncio.run(run())
+    for server in servers:
+        server.stop()
+
+    #Same inputs, one model call per glove instead of one per tick
+    startNs = time.perf_counter_ns()
+    for batch in batches:
+        for row in range(batch.shape[0]):
+            model.predict(batch[row:row + 1])
+    perDeviceUs = (time.perf_counter_ns() - startNs) / len(batches) / 1000
+    startNs = time.perf_counter_ns()
+    for batch in batches:
+        model.predict(batch)
+    batchedUs = (time.perf_counter_ns() - startNs) / len(batches) / 1000
+
+    stats = client.stats()
+    for name, deviceStats in stats['devices'].items():
+        print(f"{name}: {deviceStats['samples']:6d} samples, {deviceStats['dropped']:6d} dropped between ticks, {deviceStats['reconnects']} reconnects")
+    print(f"{stats['ticks']} ticks, rows per model call: {stats['batchSizes']}")
+    print(f'model time per tick: batched {batchedUs:.1f} us, one call per glove {perDeviceUs:.1f} us')
+    print(f"sample-to-dispatch p50 {stats['sampleToDispatch']['p50Ms']:.3f} ms, p99 {stats['sampleToDispatch']['p99Ms']:.3f} ms")
+    return dict(stats, batchedUs=batchedUs, perDeviceUs=perDeviceUs)
+
+
+def benchConditions(samples=2000, controls=(1, 8, 32), thresholds=(5, 50, 200), numGestures=5):
+    import gestureWindow
+
+    print()
+    print('benchConditions()')
+    samples = int(samples)
+
+    def legacyThreshold(predictions, gesture, threshold, startIdx):
+        #The old MidiControl.gestureThreshold scan
+        lenPred = len(predictions)
+        if lenPred < threshold:
+            return -1
+        loopIdx = lenPred - (startIdx + threshold)
+        noisebudget = int(threshold / 10)
+        noiseCount = 0
+        for i in range(loopIdx, lenPred):
+            if predictions[i] != gesture:
+                noiseCount += 1
+                if noiseCount >= noisebudget:
+                    return -1
+        return 0
+
+    #Noisy held gestures, like the model output while playing
+    rng = np.random.default_rng(0)
+    held = np.repeat(rng.integers(0, numGestures, samples // 100 + 1), 100)[:samples]
+    stream = np.where(rng.random(samples) < 0.05, rng.integers(0, numGestures, samples), held).tolist()
+
+    results = {}
+    for numControls in controls:
+        for threshold in thresholds:
+            #Each control checks the hold condition of its own gesture on every prediction (MiDiWriter.conductor)
+            gestures = [i % numGestures for i in range(numControls)]
+            predictions = []
+            startNs = time.perf_counter_ns()
+            legacy = []
+            for prediction in stream:
+                predictions.append(prediction)
+                legacy.append([legacyThreshold(predictions, gesture, threshold, 0) == 0 for gesture in gestures])
+            legacyNs = time.perf_counter_ns() - startNs
+
+            window = gestureWindow.GestureWindow(max(thresholds))
+            startNs = time.perf_counter_ns()
+            counted = []
+            for prediction in stream:
+                window.append(prediction)
+                counted.append([window.held(gesture, threshold) for gesture in gestures])
+            windowNs = time.perf_counter_ns() - startNs
+
+            name = f'{numControls} controls, threshold {threshold}'
+            results[name] = {'legacyUsPerSample': legacyNs / samples / 1000, 'windowUsPerSample': windowNs / samples / 1000,
+                             'sameDecisions': legacy == counted}
+            print(f"{name:>28}: scan {results[name]['legacyUsPerSample']:8.2f} us/sample, GestureWindow "
+                  f"{results[name]['windowUsPerSample']:6.2f} us/sample, same decisions: {results[name]['sameDecisions']}")
+    return results
+
+
+def benchPredictionHistory(samples=200000, memorySize=1000, memorySizeMin=100, threshold=50):
+    import predictionRing
+
+    print()
+    print('benchPredictionHistory()')
+    samples, memorySize, memorySizeMin, threshold = int(samples), int(memorySize), int(memorySizeMin), int(threshold)
+    #Gestures held for 200 predictions, so most hold checks have to look at the whole window
+    stream = np.repeat(np.random.default_rng(0).integers(0, 5, samples // 200 + 1), 200)[:samples].tolist()
+
+    def listHistory(timings):
+        #The old MiDiWriter history: append to a list, rebuild it in garbageMan() past memorySize, rescan the last threshold items
+        predictions = []
+        held = 0
+        for prediction in stream:
+            startNs = time.perf_counter_ns()
+            predictions.append(prediction)
+            held += all(p == prediction for p in predictions[-threshold:])
+            length = len(predictions)
+            if length > memorySize:
+                predictions = [predictions[i] for i in range(length - memorySizeMin, length)]
+            timings.append(time.perf_counter_ns() - startNs)
+        return held
+
+    def ringHistory(timings):
+        ring = predictionRing.PredictionRing(memorySize)
+        held = 0
+        for prediction in stream:
+            startNs = time.perf_counter_ns()
+            ring.append(prediction)
+            held += not np.count_nonzero(ring.window(threshold) != prediction)
+            timings.append(time.perf_counter_ns() - startNs)
+        return held
+
+    results = {}
+    for name, history in (('list + garbageMan', listHistory), ('PredictionRing', ringHistory)):
+        timings = []
+        held = history(timings)
+        timings = np.array(timings)
+        tracemalloc.start()
+        history(collections.deque(maxlen=1))    #Second run for the memory peak, without keeping the timings
+        peakBytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {'usPerSample': timings.mean() / 1000, 'p99Us': np.percentile(timings, 99) / 1000, 'maxUs': timings.max() / 1000,
+                         'peakBytes': peakBytes, 'held': held}
+        print(f"{name:>18}: {results[name]['usPerSample']:6.2f} us/sample (append + hold check on {threshold}), "
+              f"p99 {results[name]['p99Us']:6.2f} us, max {results[name]['maxUs']:7.2f} us, peak {peakBytes / 1024:7.1f} KiB, {held} holds")
+    return results
+
+
+def benchInstrument(repeats=100000):
+    import instrument
+
+    print()
+    print('benchInstrument()')
+    repeats = int(repeats)
+    prediction, modelMs = 2, 0.123
+    log = instrument.getLogger('benchInstrument')
+
+    def printed():
+        #What realTimePrediction printed per sample before instrument.py (into a StringIO here - a terminal is slower still)
+        startMs = int(time.time() * 1000)
+        predictionTimeMS = int(time.time() * 1000) - startMs
+        print(f'Time to predict: {predictionTimeMS:.3f} ms (model: {modelMs:.3f} ms)')
+        print('*******************************************')
+        print(f'prediction final: {prediction}')
+        print(f'prediction final: {prediction}')
+        print(f'prediction final: {prediction}')
+        print('*******************************************')
+
+    def instrumented():
+        startNs = instrument.now()
+        instrument.record('benchInstrument', startNs)
+        log.debug('prediction final: %s (model: %.3f ms)', prediction, modelMs)
+
+    results = {}
+    level, mode = instrument.level, instrument.mode
+    instrument.setLevel(instrument.INFO)
+    for name, call, newMode in (('print', printed, instrument.OFF), ('instrument off', instrumented, instrument.OFF),
+                                ('instrument summary', instrumented, instrument.SUMMARY)):
+        instrument.configure(newMode)
+        with contextlib.redirect_stdout(io.StringIO()):
+            startNs = time.perf_counter_ns()
+            for i in range(repeats):
+                call()
+            stopNs = time.perf_counter_ns()
+        results[name] = {'nsPerSample': (stopNs - startNs) / repeats}
+        print(f"{name:>18}: {results[name]['nsPerSample']:8.0f} ns/sample")
+    instrument.stages.pop('benchInstrument', None)
+    instrument.configure(mode, path=instrument.tracePath or 'trace.json')
+    instrument.setLevel(level)
+    return results
+
+
+class CapturingMidiOut:
+    #Stands in for rtmidi.MidiOut - records (perf_counter_ns, message) instead of sending to a port
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, message):
+        self.messages.append((time.perf_counter_ns(), list(message)))
+
+    def get_ports(self):
+        return ['CapturingMidiOut']
+
+    def open_port(self, port=0, name=None):
+        pass
+
+    def is_port_open(self):
+        return True
+
+    def close_port(self):
+        pass
+
+
+class SilentMidiIn:
+    #Stands in for rtmidi.MidiIn - no keyboard plugged in, so the arpeggiator holds no notes
+    def get_message(self):
+        return None
+
+    def get_ports(self):
+        return []
+
+    def open_port(self, port=0, name=None):
+        pass
+
+    def close_port(self):
+        pass
+
+
+def benchEndToEnd(seconds=10, rate=100, bpm=240, threshold=5, numGestures=3, numSensors=4):
+    import NeuralNetwork
+    import pipeline
+    import predictionLog
+    import socketClient
+
+    print()
+    print('benchEndToEnd()')
+    try:
+        import midiWriter
+    except ImportError as err:
+        print(f'midiWriter needs python-rtmidi and its MIDI system library: {err}')
+        return None
+    seconds, rate, bpm, threshold = float(seconds), float(rate), float(bpm), int(threshold)
+
+    #The model is trained on the same hand positions the fake glove replays, each held for half a second
+    X, y = fakeConductor.syntheticGestures(3000, numGestures, numSensors, seed=0)
+    frames, labels = fakeConductor.syntheticFrames(int(seconds * rate) + 1, numGestures, numSensors, seed=0, hold=int(rate / 2))
+    labelOf = {frame.tobytes(): label for frame, label in zip(frames, labels)}
+    model = NeuralNetwork.createOrientationModel(numSensors * 3, numGestures)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(X, y, epochs=10, batch_size=32, seed=0)
+
+    stages = {stage: pipeline.LatencyStats() for stage in ('receive', 'processData', 'realTimePrediction', 'getPredictions')}
+    movementToMidi = pipeline.LatencyStats()    #First sample of hand position 1 received -> first MIDI message of the control it turns on
+    decisionToMidi = pipeline.LatencyStats()    #getPredictions turned the control on -> first MIDI message
+    decisions = []      #(first sample of the hand position received, control turned on)
+    midiOut = CapturingMidiOut()
+    sampleCount = 0
+
+    with tempfile.TemporaryDirectory() as pathPreface:
+        model.save(pathPreface + "/model.model")
+        server = fakeConductor.FakeConductor(numSensors=numSensors, seed=0, frames=frames, labels=labels, rate=rate)
+        server.start()
+        with contextlib.redirect_stdout(io.StringIO()):    #Every stage prints on every sample
+            writer = midiWriter.MiDiWriter(bpm=bpm, midiOut=midiOut, midiIn=SilentMidiIn())
+            #Hold control: on while the last threshold predictions are hand position 1, a CC sine wave on channel 0
+            control = writer.MidiControl(controlLabel='bench', midiOut=midiOut, gestureWindow=writer.gestureWindow, conditionType=0,
+                                         conditionData=[[1, threshold], [0, threshold]], channel=0, controlNum=0, rate='q', waveform='sine',
+                                         minimum=0, maximum=127, controlType=0, bpm=bpm)
+            writer.controlList.append(control)
+            writer.writerON = 1
+            data = socketClient.GetData(host=server.host, port=server.port, numSensors=numSensors, packetSize=1, pathPreface=pathPreface,
+                                        getTraining=False, writer=writer, streaming=True)
+
+            lastLabel = None
+            movedNs = None
+            wasOn = False
+            stopAt = time.perf_counter() + seconds
+            while time.perf_counter() < stopAt:
+                startNs = time.perf_counter_ns()
+                frame = data.receiveBytes()
+                receivedNs = time.perf_counter_ns()
+                if isinstance(frame, int) or len(frame) == 0:
+                    continue
+                label = labelOf.get(bytes(frame))
+                data.processData(frame, 0)
+                decodedNs = time.perf_counter_ns()
+                prediction = NeuralNetwork.realTimePrediction(data.packetData, pathPreface)[0]
+                predictedNs = time.perf_counter_ns()
+                writer.getPredictions(prediction)
+                writtenNs = time.perf_counter_ns()
+                sampleCount += 1
+
+                stages['receive'].add(receivedNs - startNs)
+                stages['processData'].add(decodedNs - receivedNs)
+                stages['realTimePrediction'].add(predictedNs - decodedNs)
+                stages['getPredictions'].add(writtenNs - predictedNs)
+
+                if label == 1 and lastLabel != 1:
+                    movedNs = receivedNs
+                isOn = control.startFlag == 1
+                if isOn and not wasOn:
+                    decisions.append((movedNs, writtenNs))
+                wasOn = isOn
+                lastLabel = label
+
+            time.sleep(60 / bpm)   #Let the last beat start
+            writer.writerON = 0
+            data.stopStream()
+        server.stop()
+        log = predictionLog.openLogs.pop(pathPreface + "/predictions.log", None)
+        if log is not None:
+            log.close()
+    time.sleep(60 / bpm)    #play_loop finishes its beat and stops
+
+    sentNs = np.array([sent for sent, message in midiOut.messages], dtype=np.int64)
+    for movedNs, onNs in decisions:
+        first = np.searchsorted(sentNs, onNs)
+        if first == sentNs.shape[0]:
+            continue
+        decisionToMidi.add(int(sentNs[first]) - onNs)
+        if movedNs is not None:
+            movementToMidi.add(int(sentNs[first]) - movedNs)
+
+    results = {'seconds': seconds, 'rate': rate, 'bpm': bpm, 'threshold': threshold, 'samples': sampleCount,
+               'samplesPerSecond': sampleCount / seconds, 'midiMessages': len(midiOut.messages), 'stages': {}}
+    print(f'{sampleCount / seconds:.1f} samples/s through the chain (glove replaying {rate:.0f} samples/s), {len(midiOut.messages)} MIDI messages sent')
+    for stage, stats in stages.items():
+        summary = stats.summary()
+        if summary['count']:
+            summary['throughputPerSecond'] = 1000 / summary['meanMs']    #Most samples per second this stage alone could handle
+        results['stages'][stage] = summary
+    for name, stats in (('decisionToMidi', decisionToMidi), ('movementToMidi', movementToMidi)):
+        results[name] = stats.summary()
+    for name, summary in list(results['stages'].items()) + [('decisionToMidi', results['decisionToMidi']), ('movementToMidi', results['movementToMidi'])]:
+        if summary['count']:
+            print(f"{name:>18}: p50 {summary['p50Ms']:8.3f} ms, p95 {summary['p95Ms']:8.3f} ms, p99 {summary['p99Ms']:8.3f} ms"
+                  + (f", {summary['throughputPerSecond']:9.0f}/s" if 'throughputPerSecond' in summary else f' ({summary["count"]} times)'))
+    print(f'(movementToMidi includes the {threshold} predictions the Hold condition needs: {threshold / rate * 1000:.0f} ms at {rate:.0f} samples/s)')
+    return results
+
+
+def benchMidiClock(minutes=10, bpms=(60, 120, 180, 240), messagesPerBeat=24, workMs=5):
+    import midiClock
+
+    print()
+    print('benchMidiClock()')
+    seconds = float(minutes) * 60
+    messagesPerBeat, workMs = int(messagesPerBeat), float(workMs)
+    if isinstance(bpms, str):
+        bpms = [float(bpm) for bpm in bpms.split(',')]
+
+    def legacyLoop(midiOut, bpm, stopAt):
+        #The old timing: play_beat sent a message, then slept BPM_millis / (n - 1), and the loop did its work between beats
+        message = [0xB0, 1, 64]
+        while time.perf_counter() < stopAt:
+            for i in range(messagesPerBeat):
+                midiOut.send_message(message)
+                time.sleep((60 / bpm) / (messagesPerBeat - 1))
+            time.sleep(workMs / 1000)    #refreshMidi, starting the player threads...
+
+    def clockLoop(midiOut, bpm, stopAt, clock):
+        #MidiClock: message i of beat b at beatDeadline(b) + i * beat / n, same work between beats
+        message = [0xB0, 1, 64]
+        sliceNs = 60e9 / bpm / messagesPerBeat
+        clock.start()
+        beat = None
+        while time.perf_counter() < stopAt:
+            beat, beatStartNs = clock.nextBeat(None if beat is None else beat + 1)
+            for i in range(messagesPerBeat):
+                clock.waitUntil(beatStartNs + round(i * sliceNs))
+                midiOut.send_message(message)
+            time.sleep(workMs / 1000)
+
+    #Every loop runs at the same time, like controls sharing a process, and is checked against the ideal grid from its first message
+    runs = []
+    stopAt = time.perf_counter() + seconds
+    for bpm in bpms:
+        for name in ('sleep loop', 'MidiClock'):
+            midiOut = CapturingMidiOut()
+            clock = midiClock.MidiClock(bpm)
+            args = (midiOut, bpm, stopAt) if name == 'sleep loop' else (midiOut, bpm, stopAt, clock)
+            thread = threading.Thread(target=legacyLoop if name == 'sleep loop' else clockLoop, args=args, daemon=True)
+            runs.append((bpm, name, midiOut, clock, thread))
+    for run in runs:
+        run[4].start()
+    for run in runs:
+        run[4].join()
+
+    results = {}
+    for bpm, name, midiOut, clock, thread in runs:
+        sentNs = np.array([sent for sent, message in midiOut.messages], dtype=np.int64)
+        index = np.arange(sentNs.shape[0])
+        beatNs = 60e9 / bpm
+        idealNs = sentNs[0] + (index // messagesPerBeat) * beatNs + (index % messagesPerBeat) * beatNs / messagesPerBeat
+        latenessMs = (sentNs - idealNs) / 1e6
+        beats = sentNs.shape[0] // messagesPerBeat
+        key = f'{bpm:g} bpm {name}'
+        results[key] = {
+            'beats': beats,
+            'expectedBeats': seconds * bpm / 60,
+            'driftMs': float(latenessMs[(beats - 1) * messagesPerBeat]),     #First message of the last full beat against the grid
+            'p50LatenessMs': float(np.percentile(np.abs(latenessMs), 50)),
+            'p99LatenessMs': float(np.percentile(np.abs(latenessMs), 99)),
+            'maxLatenessMs': float(np.abs(latenessMs).max()),
+        }
+        if name == 'MidiClock':
+            results[key]['clock'] = clock.stats()
+        print(f"{key:>20}: {beats} beats (expected {results[key]['expectedBeats']:.0f}), drift {results[key]['driftMs']:9.2f} ms, "
+              f"|lateness| p50 {results[key]['p50LatenessMs']:7.3f} ms, p99 {results[key]['p99LatenessMs']:8.3f} ms")
+    return results
+
+
+def benchDispatcher(seconds=5, controls=(1, 4, 16, 64), bpm=120, messagesPerBeat=24):
+    import midiClock
+    from midiDispatcher import MidiDispatcher
+    from midiPlayer import MidiPlayer
+
+    print()
+    print('benchDispatcher()')
+    seconds, bpm, messagesPerBeat = float(seconds), float(bpm), int(messagesPerBeat)
+    if isinstance(controls, str):
+        controls = [int(n) for n in controls.split(',')]
+    timeSlice = 60000 / bpm / messagesPerBeat    #ms, like Metronome.getTimeTick
+
+    def threadPerControl(players, beatData, clock, beatStarts):
+        #The old play_loop: one thread per control per beat, each waiting for its own deadlines, then join them all
+        beat = None
+        stopAt = time.perf_counter() + seconds
+        while time.perf_counter() < stopAt:
+            beat, beatStartNs = clock.nextBeat(None if beat is None else beat + 1)
+            beatStarts.append(beatStartNs)
+            threads = [threading.Thread(target=player.play_beat, args=(data, 1, beatStartNs)) for player, data in zip(players, beatData)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+    def dispatched(players, beatData, clock, beatStarts):
+        #play_loop now: queue every control's messages on the dispatcher, wait for it to go idle
+        beat = None
+        stopAt = time.perf_counter() + seconds
+        while time.perf_counter() < stopAt:
+            beat, beatStartNs = clock.nextBeat(None if beat is None else beat + 1)
+            beatStarts.append(beatStartNs)
+            for player, data in zip(players, beatData):
+                player.schedule_beat(data, 1, beatStartNs)
+            players[0].dispatcher.waitIdle()
+
+    results = {}
+    for n in controls:
+        #Control c sends [CC, c, i] as message i, so every captured message can be matched with its deadline
+        beatData = [[[0xB0 | (c % 16), c % 128, i] for i in range(messagesPerBeat)] for c in range(n)]
+        for name, loop in (('thread per control', threadPerControl), ('MidiDispatcher', dispatched)):
+            midiOut = CapturingMidiOut()
+            clock = midiClock.MidiClock(bpm)
+            dispatcher = MidiDispatcher(midiOut, clock) if loop is dispatched else None
+            players = [MidiPlayer(midiOut, timeSlice, data, clock=clock, dispatcher=dispatcher) for data in beatData]
+            if dispatcher is not None:
+                dispatcher.start()
+            clock.start()
+            beatStarts = []
+            threadsBefore = threading.active_count()
+            cpuStart = time.process_time()
+            loop(players, beatData, clock, beatStarts)
+            cpuMs = (time.process_time() - cpuStart) * 1000
+            if dispatcher is not None:
+                dispatcher.stop()
+
+            perBeat = n * messagesPerBeat
+            beats = len(midiOut.messages) // perBeat
+            sentNs = np.array([sent for sent, message in midiOut.messages[:beats * perBeat]], dtype=np.int64)
+            index = np.array([message[2] for sent, message in midiOut.messages[:beats * perBeat]])
+            deadlineNs = np.repeat(np.array(beatStarts[:beats], dtype=np.int64), perBeat) + np.round(index * timeSlice * 1e6).astype(np.int64)
+            latenessMs = (sentNs - deadlineNs) / 1e6
+            key = f'{n} controls {name}'
+            results[key] = {
+                'beats': beats,
+                'messages': int(sentNs.shape[0]),
+                'p50LatenessMs': float(np.percentile(latenessMs, 50)),
+                'p99LatenessMs': float(np.percentile(latenessMs, 99)),
+                'maxLatenessMs': float(latenessMs.max()),
+                'cpuMsPerBeat': cpuMs / max(beats, 1),
+                'threadsPerBeat': n if dispatcher is None else 0,
+            }
+            assert threading.active_count() <= threadsBefore
+            print(f"{key:>30}: {beats} beats, lateness p50 {results[key]['p50LatenessMs']:7.3f} ms, p99 {results[key]['p99LatenessMs']:7.3f} ms, "
+                  f"max {results[key]['maxLatenessMs']:7.3f} ms, CPU {results[key]['cpuMsPerBeat']:6.2f} ms / beat")
+    return results
+
+
+def benchPlayLoop(seconds=5, bpm=120, turnOns=10):
+    print()
+    print('benchPlayLoop()')
+    try:
+        import midiWriter
+    except ImportError as err:
+        print(f'midiWriter needs python-rtmidi and its MIDI system library: {err}')
+        return None
+    seconds, bpm, turnOns = float(seconds), float(bpm), int(turnOns)
+
+    def legacyLoop(writer):
+        #The old play_loop: refreshMidi (with its 30 ms sleep) rebuilt every control's MIDI on every pass, and the loop went
+        #straight round again when nothing was playing
+        writer.metro.clock.start()
+        writer.dispatcher.start()
+        beat = None
+        while writer.metro.startFlag:
+            time.sleep(0.03)
+            for control in writer.controlList:
+                control.midiKey = None
+            refreshStartNs = time.perf_counter_ns()
+            writer.refreshMidi()
+            refreshes.append(time.perf_counter_ns() - refreshStartNs)
+            writer.metro.startFlag = writer.writerON
+            if writer.writerON:
+                writer.update_playControl()
+                if not any(writer.playControl):
+                    beat = None
+                else:
+                    beat, beatStartNs = writer.metro.clock.nextBeat(None if beat is None else beat + 1, onTick=True)
+                    for i, midi_player in enumerate(writer.midi_players):
+                        midi_player.schedule_beat(writer.midi_data_list[i], writer.playControl[i], beatStartNs)
+                    writer.dispatcher.waitIdle()
+        writer.dispatcher.stop()
+
+    results = {}
+    for name in ('old loop', 'event-driven'):
+        midiOut = CapturingMidiOut()
+        refreshes = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            writer = midiWriter.MiDiWriter(bpm=bpm, midiOut=midiOut, midiIn=SilentMidiIn())
+            control = writer.MidiControl(controlLabel='bench', midiOut=midiOut, gestureWindow=writer.gestureWindow, conditionType=0,
+                                         channel=0, controlNum=0, rate='q', waveform='sine', minimum=0, maximum=127, controlType=0, bpm=bpm)
+            writer.controlList.append(control)
+        if name == 'event-driven':
+            plainRefresh = writer.refreshMidi
+            def timedRefresh():
+                refreshStartNs = time.perf_counter_ns()
+                changed = plainRefresh()
+                refreshes.append(time.perf_counter_ns() - refreshStartNs)
+                return changed
+            writer.refreshMidi = timedRefresh
+        writer.writerON = 1
+        writer.metro.startFlag = True
+        writer.metro.doneFlag = 1
+        thread = threading.Thread(target=legacyLoop, args=(writer,), daemon=True) if name == 'old loop' else threading.Thread(target=writer.play_loop, daemon=True)
+        thread.start()
+        time.sleep(0.2)
+
+        #Idle: a control is set up but off - the loop should cost next to nothing
+        refreshes.clear()
+        cpuStart, wallStart = time.process_time(), time.perf_counter()
+        time.sleep(seconds)
+        idleCpu = (time.process_time() - cpuStart) / (time.perf_counter() - wallStart)
+        idleRefreshes = len(refreshes) / seconds
+
+        #Turning the control on (what conductor() does) -> its first MIDI message, then a few beats of playing
+        turnOnMs = []
+        playingCpu = []
+        for _ in range(turnOns):
+            sent = len(midiOut.messages)
+            onNs = time.perf_counter_ns()
+            control.startFlag = 1
+            writer.wakeUp.set()
+            giveUpAt = time.perf_counter() + 2 * 60 / bpm
+            while len(midiOut.messages) == sent and time.perf_counter() < giveUpAt:
+                time.sleep(0.0005)
+            if len(midiOut.messages) == sent:
+                raise RuntimeError(f'{name}: the control was turned on but nothing was played')
+            turnOnMs.append((midiOut.messages[sent][0] - onNs) / 1e6)
+            refreshes.clear()
+            cpuStart, wallStart = time.process_time(), time.perf_counter()
+            time.sleep(2 * 60 / bpm)
+            playingCpu.append((time.process_time() - cpuStart) / (time.perf_counter() - wallStart))
+            control.startFlag = 0
+            writer.wakeUp.set()
+            time.sleep(0.1)
+        refreshMs = np.array(refreshes) / 1e6 if refreshes else np.zeros(1)
+        writer.writerON = 0
+        writer.wakeUp.set()
+        thread.join(timeout=5)
+
+        results[name] = {
+            'idleCpuPercent': 100 * idleCpu,
+            'idleRefreshesPerSecond': idleRefreshes,
+            'playingCpuPercent': 100 * float(np.mean(playingCpu)),
+            'refreshP50Ms': float(np.percentile(refreshMs, 50)),
+            'turnOnToMidiP50Ms': float(np.percentile(turnOnMs, 50)),
+            'turnOnToMidiMaxMs': float(np.max(turnOnMs)),
+        }
+        print(f"{name:>14}: idle CPU {results[name]['idleCpuPercent']:5.1f}% ({idleRefreshes:6.1f} refreshes/s), playing CPU "
+              f"{results[name]['playingCpuPercent']:5.1f}%, refreshMidi p50 {results[name]['refreshP50Ms']:6.3f} ms, "
+              f"turn on -> MIDI p50 {results[name]['turnOnToMidiP50Ms']:6.2f} ms, max {results[name]['turnOnToMidiMaxMs']:6.2f} ms")
+    return results
+
+
+def benchBuildMidi(builds=5000, controls=4, seed=0):
+    print()
+    print('benchBuildMidi()')
+    try:
+        import buildMidi
+    except ImportError as err:
+        print(f'buildMidi needs python-rtmidi: {err}')
+        return None
+    builds, controls = int(builds), int(controls)
+
+    #What refreshMidi sees when the ToF sensor moves a control between rates (changeRate) and the UX changes waveform / range:
+    #the same few settings again and again, on several controls at once
+    rng = np.random.default_rng(int(seed))
+    settings = [(rate, shape, low, high) for rate in 'whqes' for shape in ('sine', 'saw', 'square') for low, high in ((0, 127), (20, 100))]
+    builders = [buildMidi.MidiBuilder(dataType=0, ch=i, midiCCNum=75) for i in range(controls)]
+    sequence = [(builders[rng.integers(controls)], settings[rng.integers(len(settings))]) for _ in range(builds)]
+
+    results = {}
+    buildMidi.clearCache()
+    for name in ('uncached', 'LRU cache'):
+        timesNs = []
+        for builder, (rate, shape, low, high) in sequence:
+            builder.rate, builder.shape, builder.min_val, builder.max_val = rate, shape, low, high
+            startNs = time.perf_counter_ns()
+            midi_array = builder.build_midi_uncached() if name == 'uncached' else builder.build_midi()
+            timesNs.append(time.perf_counter_ns() - startNs)
+        timesUs = np.array(timesNs) / 1000
+        results[name] = {'meanUs': float(timesUs.mean()), 'p50Us': float(np.percentile(timesUs, 50)), 'p99Us': float(np.percentile(timesUs, 99))}
+        print(f"{name:>10}: mean {results[name]['meanUs']:8.1f} us, p50 {results[name]['p50Us']:8.1f} us, p99 {results[name]['p99Us']:8.1f} us per build_midi")
+    results['cache'] = buildMidi.cacheInfo()
+    results['cache']['hitRate'] = results['cache']['hits'] / max(results['cache']['hits'] + results['cache']['misses'], 1)
+    print(f"cache: {results['cache']['hits']} hits, {results['cache']['misses']} misses ({100 * results['cache']['hitRate']:.1f}%), "
+          f"{results['cache']['size']} of {results['cache']['maxSize']} entries")
+
+    #Cached and freshly built messages must be the same
+    for builder, (rate, shape, low, high) in sequence[:200]:
+        builder.rate, builder.shape, builder.min_val, builder.max_val = rate, shape, low, high
+        assert np.array_equal(builder.build_midi(), builder.build_midi_uncached())
+    return results
+
+
+def benchMidiMessages(repeats=200, rates='whqes'):
+    print()
+    print('benchMidiMessages()')
+    try:
+        import buildMidi
+        from midiDispatcher import MidiDispatcher, beatOffsets
+    except ImportError as err:
+        print(f'buildMidi needs python-rtmidi: {err}')
+        return None
+    repeats = int(repeats)
+
+    def listBuild(builder):
+        #The old build_midi for CC data: a MIDIControlChange object and a 3-element list per value
+        waveform = builder.modulation_shape()
+        waveform = builder.convert_range(waveform, -1.0, 1.0, 0, 127)
+        waveform = builder.convert_range(waveform, 0, 127, builder.min_val, builder.max_val)
+        midi_array = []
+        for _ in range(builder.multiply_rate(builder.rate)):
+            for value in waveform:
+                midiCC = builder.MIDIControlChange(channel=builder.ch, control_number=builder.midiCCnum, control_value=value)
+                midi_array.append(midiCC.get_midi_cc())
+        return midi_array
+
+    def listSchedule(dispatcher, midi_data, timeSlice, startNs):
+        #The old scheduleBeat loop: deadline worked out per message in Python
+        with dispatcher.condition:
+            for i, msg in enumerate(midi_data):
+                if msg[2] == -1:
+                    continue
+                heapq.heappush(dispatcher.queue, (startNs + round(i * timeSlice * 1e6), next(dispatcher.sequence), msg))
+
+    import heapq
+    results = {}
+    dispatcher = MidiDispatcher(CapturingMidiOut())    #Not started - only the queueing is timed
+    for rate in rates:
+        builder = buildMidi.MidiBuilder(dataType=0, shape='sine', ch=0, rate=rate, midiCCNum=75)
+        packed = builder.build_midi_uncached()
+        assert np.array_equal(packed, np.array(listBuild(builder), dtype=np.uint8))
+        timeSlice = 500 / len(packed)
+        offsetsNs = beatOffsets(len(packed), timeSlice)
+
+        messages = listBuild(builder)
+        listBytes = sys.getsizeof(messages) + sum(sys.getsizeof(msg) for msg in messages)    #Small ints are shared, so the lists are the cost
+
+        timings = {'listBuildUs': [], 'arrayBuildUs': [], 'listScheduleUs': [], 'arrayScheduleUs': []}
+        for _ in range(repeats):
+            for key, run in (('listBuildUs', lambda: listBuild(builder)), ('arrayBuildUs', builder.build_midi_uncached),
+                             ('listScheduleUs', lambda: listSchedule(dispatcher, messages, timeSlice, 0)),
+                             ('arrayScheduleUs', lambda: dispatcher.scheduleBeat(packed, timeSlice, 0, 1, offsetsNs))):
+                if key == 'listScheduleUs':
+                    messages = packed.tolist()
+                startNs = time.perf_counter_ns()
+                run()
+                timings[key].append((time.perf_counter_ns() - startNs) / 1000)
+                dispatcher.queue.clear()
+        results[rate] = {key: float(np.median(values)) for key, values in timings.items()}
+        results[rate].update({'messages': len(packed), 'listBytes': listBytes, 'arrayBytes': packed.nbytes + offsetsNs.nbytes})
+        print(f"rate {rate} ({len(packed):4d} messages): build {results[rate]['listBuildUs']:7.1f} -> {results[rate]['arrayBuildUs']:6.1f} us, "
+              f"schedule {results[rate]['listScheduleUs']:7.1f} -> {results[rate]['arrayScheduleUs']:7.1f} us, "
+              f"memory {listBytes / 1024:7.1f} -> {results[rate]['arrayBytes'] / 1024:5.1f} KiB")
+    return results
+
+
+def _jsonable(value):
+    #Benchmark results as plain JSON types
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(_jsonable(item) for item in value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def writeReport(path, results):
+    #Machine readable results (see compareReports) - one file per run, eg. python benchmarks.py endToEnd --report=report.json
+    here = os.path.dirname(os.path.abspath(__file__))
+    revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True, text=True).stdout.strip()
+    report = {
+        'revision': revision or None,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': sys.platform,
+        'benchmarks': _jsonable(results),
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Report written to {path}')
+
+
+def _numbers(value, prefix=''):
+    #Flattens a report into {'benchmark.key.key': number}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _numbers(item, f'{prefix}.{key}' if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compareReports(oldPath, newPath):
+    #Prints every number both reports have, with new / old
+    reports = []
+    for path in (oldPath, newPath):
+        with open(path) as f:
+            reports.append(json.load(f))
+    old, new = (dict(_numbers(report['benchmarks'])) for report in reports)
+    print(f"{oldPath} ({reports[0]['revision']}) -> {newPath} ({reports[1]['revision']})")
+    for key in old:
+        if key in new:
+            ratio = f'{new[key] / old[key]:6.2f}x' if old[key] else '      '
+            print(f'{key:>60}: {old[key]:12.4g} -> {new[key]:12.4g} {ratio}')
+
+
+BENCHMARKS = {
+    'frameReader': benchFrameReader,
+    'softmaxBackward': benchSoftmaxBackward,
+    'inferencePlan': benchInferencePlan,
+    'modelFormat': benchModelFormat,
+    'batchSize': benchBatchSize,
+    'dtype': benchDtype,
+    'importTime': benchImportTime,
+    'pipeline': benchPipeline,
+    'asyncClient': benchAsyncClient,
+    'instrument': benchInstrument,
+    'conditions': benchConditions,
+    'predictionHistory': benchPredictionHistory,
+    'endToEnd': benchEndToEnd,
+    'midiClock': benchMidiClock,
+    'dispatcher': benchDispatcher,
+    'playLoop': benchPlayLoop,
+    'buildMidi': benchBuildMidi,
+    'midiMessages': benchMidiMessages,
+}
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--compare']:
+        compareReports(args[1], args[2])
+        return
+    reportPath = None
+    names = []
+    for arg in args:
+        if arg.startswith('--report='):
+            reportPath = arg[len('--report='):]
+        else:
+            names.append(arg)
+
+    results = {}
+    for name in names or list(BENCHMARKS):
+        name, *params = name.split(':')
+        results[name] = BENCHMARKS[name](*params)
+    if reportPath is not None:
+        writeReport(reportPath, results)
+
+
+if __name__ == "__main__": main()
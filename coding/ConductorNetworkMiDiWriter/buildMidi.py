@@ -31,7 +31,16 @@ Functions/Methods:
 - convert_range(): Converts the range of values from one scale to another.
 - generate_deltaTof_array(): Generates an array of delta time of flight based on threshold and new/old time of flight values.
 - multiply_rate(): Converts the rate of notes to numeric values for calculations.
-- build_midi(): Constructs MIDI messages based on specified data types and parameters.
+- build_midi(): Constructs MIDI messages based on specified data types and parameters, as a packed uint8 array of shape (N, 3) - one
+    [status, data1, data2] row per message. Note, CC and empty results are kept in a bounded LRU cache keyed on everything they are
+    built from (cache_key()), so a control switching back to parameters it (or another control) used recently gets the same array back
+    without regenerating the waveform. The arrays are read-only, so controls and players share them without copies.
+    ToF data (dataType 2) is never cached: it is the change since the previous build.
+- build_midi_uncached(): Builds the messages without the cache, in one vectorized step from the waveform / notes (no per-message objects).
+- cache_key(): The cache key of the current parameters, or None if they are not cached.
+- cacheInfo(): Hits, misses, size and maximum size of the build cache.
+- clearCache(): Empties the build cache and resets its counters. setCacheSize() changes its size (0 turns caching off).
+- messageArray(): Packs a status byte (or column) and two data columns into a read-only (N, 3) uint8 message array.
 - MIDIControlChange: Inner class to create MIDI control change messages.
     - get_midi_cc(): Returns MIDI control change messages.
 - MIDINoteMessage: Inner class to create MIDI note messages.
@@ -40,11 +49,60 @@ Functions/Methods:
 Note: The script also includes commented-out code demonstrating the usage of MidiBuilder for different types of MIDI data construction.
 """
 
+from collections import OrderedDict
+import threading
 import numpy as np
-from scipy import signal
 from rtmidi.midiconstants import CONTROL_CHANGE
-import matplotlib.pylab as plt
 import time
+import instrument
+
+
+#NumPy versions of scipy.signal.sawtooth and square (width/duty 0.5) so the real-time path doesn't import SciPy
+def sawtooth(t):
+    return np.mod(t, 2 * np.pi) / np.pi - 1
+
+def square(t):
+    return np.where(np.mod(t, 2 * np.pi) < np.pi, 1.0, -1.0)
+
+
+#Built message lists by cache_key(), least recently used first - shared by every MidiBuilder (controls with the same settings share entries)
+cache = OrderedDict()
+cacheSize = 128
+cacheCounts = {'hits': 0, 'misses': 0}
+cacheLock = threading.Lock()
+
+
+def messageArray(status, data1, data2):
+    #Data bytes are clipped to the MIDI range 0-127
+    data1 = np.asarray(data1)
+    messages = np.empty((data1.shape[0], 3), dtype=np.uint8)
+    messages[:, 0] = status
+    messages[:, 1] = np.clip(data1, 0, 127)
+    messages[:, 2] = np.clip(data2, 0, 127)
+    messages.flags.writeable = False
+    return messages
+
+
+EMPTY = messageArray(0, np.zeros(0), 0)
+
+
+def cacheInfo():
+    with cacheLock:
+        return {'hits': cacheCounts['hits'], 'misses': cacheCounts['misses'], 'size': len(cache), 'maxSize': cacheSize}
+
+
+def clearCache():
+    with cacheLock:
+        cache.clear()
+        cacheCounts['hits'] = cacheCounts['misses'] = 0
+
+
+def setCacheSize(size):
+    global cacheSize
+    with cacheLock:
+        cacheSize = size
+        while len(cache) > max(cacheSize, 0):
+            cache.popitem(last=False)
 
 
 class Rate:
@@ -87,9 +145,9 @@ class MidiBuilder:
         if self.shape == 'sine' or 0:  # 'sine'
             y = sig_invert * np.sin(2 * self.multiply_rate(self.rate) * np.pi * x)
         elif self.shape == 'saw' or 1:  # 'saw'
-            y = sig_invert * signal.sawtooth(2 * self.multiply_rate(self.rate) * np.pi * x)
+            y = sig_invert * sawtooth(2 * self.multiply_rate(self.rate) * np.pi * x)
         elif self.shape == 'square' or 2:  # 'square'
-            y = sig_invert * signal.square(2 * self.multiply_rate(self.rate) * np.pi * x)
+            y = sig_invert * square(2 * self.multiply_rate(self.rate) * np.pi * x)
         # else:
         #     #print("That wave is not supported")
 
@@ -130,49 +188,60 @@ class MidiBuilder:
         else:
             return 1  # Default value for an unknown note value
 
-    def build_midi(self):
-        midi_array = []
-
-        if self.midiMessage is None:
-            midi_array =  []
+    def cache_key(self):
+        #Everything build_midi() reads for note, CC and empty data (the arpeggiator's order and octave are already in the notes)
+        if self.dataType in [2, '2']:
+            return None
+        notes = self.midiMessage
+        if notes is not None and not isinstance(notes, int):
+            notes = tuple(notes)
+        return (str(self.dataType), self.shape, self.rate, bool(self.signal_invert), self.min_val, self.max_val, self.ch,
+                self.midiCCnum, self.velocity, notes)
 
+    def build_midi(self):
+        key = self.cache_key() if cacheSize > 0 else None
+        if key is None:
+            return self.build_midi_uncached()
+        with cacheLock:
+            midi_array = cache.get(key)
+            if midi_array is not None:
+                cache.move_to_end(key)
+                cacheCounts['hits'] += 1
+        if midi_array is not None:
+            instrument.count('buildMidi.cacheHit')
+            return midi_array
+        midi_array = self.build_midi_uncached()
+        with cacheLock:
+            cacheCounts['misses'] += 1
+            cache[key] = midi_array
+            while len(cache) > cacheSize:
+                cache.popitem(last=False)
+        instrument.count('buildMidi.cacheMiss')
+        return midi_array
+
+    def build_midi_uncached(self):
         if self.dataType in [1, '1']:  # MIDI note data
-            if isinstance(self.midiMessage, int):
-                for _ in range(self.multiply_rate(self.rate)):
-                    note = int(self.midiMessage)
-                    note_on = self.MIDINoteMessage(ch=self.ch, note=note, velocity=self.velocity)
-                    midi_array.append(note_on.get_midi())
-
-                    note_off = self.MIDINoteMessage(ch=self.ch, note=note, velocity=0)
-                    midi_array.append(note_off.get_midi())
-            else:
-                for _ in range(self.multiply_rate(self.rate)):
-                    for note in self.midiMessage:
-                        note_on = self.MIDINoteMessage(ch=self.ch, note=note, velocity=self.velocity)
-                        midi_array.append(note_on.get_midi())
-
-                        note_off = self.MIDINoteMessage(ch=self.ch, note=note, velocity=0)
-                        midi_array.append(note_off.get_midi())
+            #Every note on, then off, rate times - the notes in the order given
+            notes = np.atleast_1d(np.asarray(self.midiMessage, dtype=np.int64))
+            if notes.size == 0:
+                return EMPTY
+            notes = np.tile(np.repeat(notes, 2), self.multiply_rate(self.rate))
+            velocities = np.tile([int(self.velocity), 0], notes.shape[0] // 2)
+            return messageArray(int(self.ch) + 0x90, notes, velocities)
 
         elif self.dataType in [0, '0']:  # MIDI control change data
             waveform = self.modulation_shape()
             waveform = self.convert_range(waveform, -1.0, 1.0, 0, 127)
             waveform = self.convert_range(waveform, 0, 127, self.min_val, self.max_val)
-            for _ in range(self.multiply_rate(self.rate)):
-                for value in waveform:
-                    midiCC = self.MIDIControlChange(channel=self.ch, control_number=self.midiCCnum, control_value=value)
-                    midi_array.append(midiCC.get_midi_cc())
+            values = np.tile(np.asarray(waveform, dtype=np.float64).reshape(-1), self.multiply_rate(self.rate)).astype(np.int64)
+            return messageArray(CONTROL_CHANGE | int(self.ch), np.full(values.shape[0], int(self.midiCCnum)), values)
 
         elif self.dataType in [2, '2']:  # MIDI control Tof data
-            tof_delta_array = self.generate_deltaTof_array()
-            for value in tof_delta_array:
-                midiCC = self.MIDIControlChange(control_number=self.midiCCnum, channel=self.ch, control_value=value)
-                midi_array.append(midiCC. get_midi_cc())
-                
-        elif self.dataType in [3, '3']:
-            midi_array = []
-
-        return midi_array  # Moved the return statement outside the if-elif-else block
+            values = np.asarray(self.generate_deltaTof_array(), dtype=np.int64)
+            values = values[values >= 0]    #-1 is "no reading" - play_beat skipped those messages
+            return messageArray(CONTROL_CHANGE | int(self.ch), np.full(values.shape[0], int(self.midiCCnum)), values)
+
+        return EMPTY  # dataType 3 and unknown types have no messages
 
 
     class MIDIControlChange:
@@ -0,0 +1,194 @@
+"""
+Description:
+This Python script defines a CaptureStore class that holds the training samples captured for one label (hand position) in a single
+append-only, memory-mapped file. Capturing a sample writes one record in place instead of loading, appending to and re-saving the whole
+.npy and .csv files, so capture speed no longer depends on how much data the label already has.
+
+File layout (<basePath>.cap):
+- Header (64 bytes): magic b'CNDCAP01', uint32 version, uint32 numFeatures, uint64 count (records written), uint64 capacity (records allocated)
+- Records: capacity * (float64[numFeatures] data, int64 truth). Only the first count records are valid.
+The file is preallocated and doubles in size when it fills up. count is updated after the record is written so a crash never exposes a
+half written sample.
+
+Existing captures (<basePath>.npy and <basePath>_truth.npy from older versions, or <basePath>.csv and <basePath>_truth.csv) are imported
+into the store the first time it is created. After that the store is the cache - edits to the .csv files are not picked up.
+
+Classes and Methods:
+- CaptureStore: One label's capture file.
+    - __init__(): Opens or creates the store with parameters:
+        - basePath: Path of the label without an extension (pathPreface + '/' + labelPath).
+        - numFeatures: Features per sample (3 * numSensors * packetSize). Only needed when the store is created.
+        - initialCapacity: Records allocated when the store is created.
+    - append(): Appends one sample or a batch of samples with their truth labels.
+    - data / truth: Read-only NumPy views of the valid records (no copy).
+    - exportCSV(): Writes <basePath>.csv and <basePath>_truth.csv in the old human readable format.
+    - close(): Flushes and closes the memory map.
+
+Functions:
+- exists(): True if a store (or older .npy / .csv captures that can be imported) exists for basePath.
+- getCaptureStore(): Returns the open store for basePath, opening it once per process.
+
+Note: Run this file with a folder to export every store in it to CSV:
+    python captureStore.py data/test
+"""
+
+import atexit
+import glob
+import os.path
+import sys
+
+import numpy as np
+
+
+MAGIC = b'CNDCAP01'
+VERSION = 1
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('numFeatures', '<u4'), ('count', '<u8'), ('capacity', '<u8')])
+
+
+def recordDtype(numFeatures):
+    return np.dtype([('data', '<f8', (numFeatures,)), ('truth', '<i8')])
+
+
+def exists(basePath):
+    return any(os.path.exists(basePath + ext) for ext in ('.cap', '.npy', '.csv'))
+
+
+class CaptureStore:
+
+    def __init__(self, basePath, numFeatures=None, *, initialCapacity=1024):
+        self.basePath = basePath
+        self.path = basePath + '.cap'
+        self.header = None
+        self.records = None
+
+        if not os.path.exists(self.path):
+            legacyData = legacyTruth = None
+            if os.path.exists(basePath + '.npy'):
+                #Older capture - import it so no samples are lost
+                legacyData = np.load(basePath + '.npy', allow_pickle=False)
+                legacyData = legacyData.reshape(legacyData.shape[0], -1)
+                legacyTruth = np.load(basePath + '_truth.npy', allow_pickle=False).reshape(-1)
+                numFeatures = legacyData.shape[1]
+                print(f'Importing {legacyData.shape[0]} samples from {basePath}.npy into {self.path}')
+            elif os.path.exists(basePath + '.csv'):
+                #Text capture - parsed once, every later read uses the binary store
+                legacyData = np.loadtxt(basePath + '.csv', dtype=float, delimiter=',', ndmin=2)
+                legacyTruth = np.loadtxt(basePath + '_truth.csv', dtype=int, delimiter=',', ndmin=1)
+                numFeatures = legacyData.shape[1]
+                print(f'Importing {legacyData.shape[0]} samples from {basePath}.csv into {self.path}')
+            if numFeatures is None:
+                raise FileNotFoundError(f'No capture store at {self.path}')
+            self._create(numFeatures, max(initialCapacity, 0 if legacyData is None else legacyData.shape[0]))
+            if legacyData is not None:
+                self.append(legacyData, legacyTruth)
+        else:
+            self._open()
+            if numFeatures is not None and numFeatures != self.numFeatures:
+                raise ValueError(f'{self.path} holds {self.numFeatures} features per sample, not {numFeatures}')
+
+    def _create(self, numFeatures, capacity):
+        capacity = max(capacity, 1)
+        with open(self.path, 'wb') as f:
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header['magic'] = MAGIC
+            header['version'] = VERSION
+            header['numFeatures'] = numFeatures
+            header['capacity'] = capacity
+            f.write(header.tobytes().ljust(HEADER_SIZE, b'\0'))
+            f.truncate(HEADER_SIZE + capacity * recordDtype(numFeatures).itemsize)
+        self._open()
+
+    def _open(self):
+        self.header = np.memmap(self.path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        if self.header['magic'][0] != MAGIC or self.header['version'][0] != VERSION:
+            raise ValueError(f'{self.path} is not a capture store (version {VERSION})')
+        self.numFeatures = int(self.header['numFeatures'][0])
+        self.dtype = recordDtype(self.numFeatures)
+        self.records = np.memmap(self.path, dtype=self.dtype, mode='r+', offset=HEADER_SIZE, shape=(self.capacity,))
+
+    @property
+    def count(self):
+        return int(self.header['count'][0])
+
+    @property
+    def capacity(self):
+        return int(self.header['capacity'][0])
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, needed):
+        #Double the file until needed records fit, then map it again
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self.records.flush()
+        self.records = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self.header['capacity'] = capacity
+        self.records = np.memmap(self.path, dtype=self.dtype, mode='r+', offset=HEADER_SIZE, shape=(capacity,))
+
+    def append(self, data, truth):
+        data = np.asarray(data, dtype=np.float64).reshape(-1, self.numFeatures)
+        truth = np.broadcast_to(np.asarray(truth, dtype=np.int64).reshape(-1), (data.shape[0],))
+        count = self.count
+        if count + data.shape[0] > self.capacity:
+            self._grow(count + data.shape[0])
+        self.records['data'][count:count + data.shape[0]] = data
+        self.records['truth'][count:count + data.shape[0]] = truth
+        self.header['count'] = count + data.shape[0]   #Written last - the samples are only visible once they are complete
+
+    @property
+    def data(self):
+        view = self.records['data'][:self.count]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def truth(self):
+        view = self.records['truth'][:self.count]
+        view.flags.writeable = False
+        return view
+
+    def exportCSV(self):
+        #Same format writetoCSV used to append to on every sample
+        np.savetxt(self.basePath + '.csv', self.data, fmt="%f", delimiter=",")
+        np.savetxt(self.basePath + '_truth.csv', self.truth, fmt="%d", delimiter=",")
+        print(f'Exported {self.count} samples to {self.basePath}.csv')
+
+    def flush(self):
+        if self.records is not None:
+            self.records.flush()
+            self.header.flush()
+
+    def close(self):
+        self.flush()
+        self.records = None
+        self.header = None
+
+
+openStores = {}   #One CaptureStore per label, kept open between samples
+
+def getCaptureStore(basePath, numFeatures=None):
+    store = openStores.get(basePath)
+    if store is None or store.records is None:
+        store = openStores[basePath] = CaptureStore(basePath, numFeatures)
+    elif numFeatures is not None and numFeatures != store.numFeatures:
+        raise ValueError(f'{store.path} holds {store.numFeatures} features per sample, not {numFeatures}')
+    return store
+
+@atexit.register
+def closeAll():
+    for store in openStores.values():
+        store.close()
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'data/test'
+    for path in sorted(glob.glob(os.path.join(folder, '*.cap'))):
+        getCaptureStore(path[:-len('.cap')]).exportCSV()
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,250 @@
+"""
+Description:
+This Python script defines a FakeConductor class, a local stand-in for the ESP32 running ConductorTinyS3/src/main.cpp. It speaks the same
+byte protocol over TCP so the socket clients can be exercised without a glove:
+    - 0xFF: reply with numSensors * 3 signed accelerometer bytes (X, Y, Z per sensor)
+    - 0x0F: same as 0xFF plus one ToF byte at the end
+    - 0x22: reply with numSensors * 3 bytes starting 0xFF 0x0F (ready for text), then read the 50 byte network message
+
+Samples are random bytes by default, or a recording replayed in a loop (captureFrames() for captured training data, syntheticFrames() for
+generated hand positions). Each client replays from the start of the recording, and with a seed the jitter and packet loss are the same on
+every run, so load tests are repeatable at rates far above the real hardware.
+
+Classes and Methods:
+- FakeConductor: Threaded TCP server, one thread per connected client.
+    - __init__(): Initializes the server with parameters:
+        - host / port: Address to listen on (port 0 picks a free port, read it back from self.port after start()).
+        - numSensors: Number of accelerometers in each sample.
+        - seed: Seed for the random samples, jitter and packet loss.
+        - frames: (n, numSensors * 3) int8 samples to replay, or None for random samples.
+        - labels: Hand position of each replayed sample (kept for checking predictions, not sent).
+        - rate: Samples per second answered per client, or None to answer every prompt immediately.
+        - latency: Fixed delay in seconds before each reply (WiFi round trip).
+        - jitter: Extra delay added to each reply, uniform between 0 and jitter seconds.
+        - loss: Probability that a prompt gets no reply (like a missed WiFi packet - the client has to time out and prompt again).
+    - start(): Binds the socket and starts accepting clients.
+    - stop(): Closes the server and every client connection.
+    - dropClients(): Closes every client connection but keeps listening.
+    - nextFrame(): Builds the bytes for one sample.
+
+Functions:
+- syntheticGestures(): Builds a labelled hand position dataset (one tilt per class plus sensor noise) scaled to +-1 like prepTraining().
+- syntheticFrames(): syntheticGestures() as int8 frames to replay, each hand position held for a number of samples.
+- captureFrames(): Loads a captured label (capture store or older .npy) as int8 frames to replay.
+
+Note: Run this file directly to start a server on port 8080 and stream a few samples from it with sensorStream.SensorStream:
+    python fakeConductor.py [rate] [jitter] [loss] [capture basePath]
+"""
+
+import os.path
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+def syntheticGestures(samples=1000, numGestures=5, numSensors=4, *, noise=0.15, seed=None, hold=1):
+    #Each hand position is a fixed gravity direction per sensor - samples are that direction plus noise, like a held pose
+    #hold: consecutive samples with the same hand position (1 = every sample drawn independently)
+    rng = np.random.default_rng(seed)
+    directions = rng.normal(size=(numGestures, numSensors, 3))
+    directions /= np.linalg.norm(directions, axis=2, keepdims=True)
+    y = np.repeat(rng.integers(0, numGestures, size=-(-samples // hold)), hold)[:samples]
+    X = directions[y] + rng.normal(scale=noise, size=(samples, numSensors, 3))
+    X = np.clip(np.round(X * 64), -127, 127) / 127     #Quantize like the ESP32's signed bytes, then scale to +-1
+    return X.reshape(samples, numSensors * 3), y
+
+
+def toFrames(X, numSensors):
+    #+-1 scaled samples (prepTraining / syntheticGestures) back to the signed bytes the ESP32 sends
+    return np.clip(np.round(np.asarray(X).reshape(-1, numSensors * 3) * 127), -127, 127).astype(np.int8)
+
+
+def syntheticFrames(samples=1000, numGestures=5, numSensors=4, *, noise=0.15, seed=None, hold=50):
+    #Returns (frames, labels) - hold=50 keeps each hand position for a second at 50 samples per second
+    X, y = syntheticGestures(samples, numGestures, numSensors, noise=noise, seed=seed, hold=hold)
+    return toFrames(X, numSensors), y
+
+
+def captureFrames(basePath, numSensors=4):
+    #Returns (frames, labels) for one captured label. Captures hold packets of packetSize samples - they are replayed one sample at a time
+    #Read only: unlike captureStore.getCaptureStore an older .npy capture is not converted
+    if os.path.exists(basePath + '.cap'):
+        import captureStore
+        store = captureStore.CaptureStore(basePath)
+        X, y = np.array(store.data), np.array(store.truth)
+        store.close()
+    else:
+        X = np.load(basePath + '.npy', allow_pickle=False)
+        y = np.load(basePath + '_truth.npy', allow_pickle=False).reshape(-1)
+    X = X.reshape(X.shape[0], -1)
+    packetSize = X.shape[1] // (numSensors * 3)
+    return toFrames(X, numSensors), np.repeat(y, packetSize)
+
+
+class FakeConductor:
+
+    def __init__(self, *, host="127.0.0.1", port=0, numSensors=4, seed=None, frames=None, labels=None, rate=None, latency=0.0, jitter=0.0, loss=0.0):
+        self.host = host
+        self.port = port
+        self.numSensors = numSensors
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.frames = None if frames is None else np.ascontiguousarray(frames, dtype=np.int8).reshape(-1, numSensors * 3)
+        self.labels = labels
+        self.rate = rate
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.server = None
+        self.thread = None
+        self.running = False
+        self.clients = []
+        self.lock = threading.Lock()
+        self.connectionCount = 0   #Clients accepted since start()
+        self.promptCount = 0       #Sample prompts answered
+        self.lostCount = 0         #Sample prompts ignored (packet loss)
+        self.textMessages = []     #Network messages received after a 0x22 prompt
+
+    def start(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.host, self.port))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self._acceptLoop, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.server is not None:
+            try:
+                self.server.shutdown(socket.SHUT_RDWR)   #Wakes the blocking accept()
+            except OSError:
+                pass
+            self.server.close()
+        self.dropClients()
+        if self.thread is not None:
+            self.thread.join()
+
+    def dropClients(self):
+        #Closes every client connection but keeps listening (simulates a WiFi drop)
+        with self.lock:
+            clients = self.clients
+            self.clients = []
+        for conn in clients:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def nextFrame(self, ToFEnable=False, index=None, rng=None):
+        #index: position in the replayed frames (wraps around), ignored when there is nothing to replay
+        if rng is None:
+            rng = self.rng
+        if self.frames is not None and index is not None:
+            frame = self.frames[index % self.frames.shape[0]].tobytes()
+        else:
+            frame = rng.integers(-127, 128, size=self.numSensors * 3).astype(np.int8).tobytes()
+        if ToFEnable:
+            frame += struct.pack("=B", int(rng.integers(0, 126)))
+        return frame
+
+    def _acceptLoop(self):
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.clients.append(conn)
+                self.connectionCount += 1
+                clientIndex = self.connectionCount
+            threading.Thread(target=self._serveClient, args=(conn, clientIndex), daemon=True).start()
+
+    def _recvExact(self, conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _serveClient(self, conn, clientIndex):
+        rxIdx = 1   #Same as main.cpp: 1 byte prompts until 0x22, then one 50 byte text message
+        rng = np.random.default_rng(None if self.seed is None else [self.seed, clientIndex])   #Same jitter / loss for the nth client every run
+        frameIndex = 0      #Replay position - every client starts at the beginning of the recording
+        period = None if not self.rate else 1 / self.rate
+        nextReply = time.perf_counter()
+        try:
+            while self.running:
+                rx = self._recvExact(conn, rxIdx)
+                if rx is None:
+                    break
+                if rxIdx != 1:
+                    self.textMessages.append(rx)
+                    rxIdx = 1
+                    continue
+
+                byteCode = rx[0]
+                if byteCode == 0xFF or byteCode == 0x0F:
+                    if self.loss and rng.random() < self.loss:
+                        self.lostCount += 1
+                        continue
+                    delay = self.latency + (rng.uniform(0, self.jitter) if self.jitter else 0)
+                    if period is not None:
+                        #Pace replies on a fixed schedule; a client that prompts late doesn't get a burst to catch up
+                        nextReply = max(nextReply + period, time.perf_counter())
+                        delay += nextReply - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    conn.sendall(self.nextFrame(byteCode == 0x0F, frameIndex, rng))
+                    frameIndex += 1
+                    self.promptCount += 1
+                elif byteCode == 0x22:
+                    conn.sendall(bytes([0xFF, 0x0F]) + bytes(self.numSensors * 3 - 2))
+                    rxIdx = 50
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                if conn in self.clients:
+                    self.clients.remove(conn)
+            conn.close()
+
+
+def main():
+    import sensorStream
+
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    jitter = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    loss = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    if len(sys.argv) > 4:
+        frames, labels = captureFrames(sys.argv[4], numSensors=4)
+    else:
+        frames, labels = syntheticFrames(1000, numSensors=4, seed=0)
+
+    server = FakeConductor(port=8080, numSensors=4, seed=0, frames=frames, labels=labels, rate=rate, jitter=jitter, loss=loss)
+    server.start()
+    print(f'Fake Conductor listening on {server.host}:{server.port}, replaying {frames.shape[0]} samples')
+
+    stream = sensorStream.SensorStream(host=server.host, port=server.port, numSensors=4)
+    stream.start()
+    startMS = int(time.time() * 1000)
+    for i in range(100):
+        stream.getSample(timeout=1)
+    stopMS = int(time.time() * 1000)
+    print(f'100 samples in ms: {stopMS - startMS}, reconnects: {stream.reconnectCount}, prompts lost: {server.lostCount}')
+    stream.stop()
+    server.stop()
+
+
+if __name__ == "__main__": main()
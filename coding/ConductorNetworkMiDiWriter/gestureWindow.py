@@ -0,0 +1,76 @@
+"""
+Description:
+This Python script defines the sliding window of predictions that MiDiWriter's controls check their gesture conditions against.
+MidiControl.gestureThreshold used to rescan the last threshold predictions in Python for every control on every prediction
+(gestureTransition scanned twice), O(controls x threshold) per sample. The window keeps a running count per gesture instead, so
+each hold or transition check is O(1) whatever the threshold, and one window is shared by every control of a MiDiWriter.
+
+How it works: for each gesture seen so far a ring buffer holds the running count of that gesture (how many of the first t predictions
+were that gesture) for the last capacity + 1 values of t. The number of times a gesture appears in any stretch of the window
+is the difference of two running counts. Appending a prediction updates one running count per gesture (a handful of classes).
+
+Classes and Methods:
+- GestureWindow: Sliding window of the most recent predictions.
+    - __init__(): Initializes the window with parameters:
+        - capacity: Most predictions kept. Conditions can look back at most this far (threshold + startIdx).
+    - append(): Adds the newest prediction.
+    - count(): How many of length predictions, ending startIdx predictions before the newest, were gesture.
+    - held(): The MidiControl.gestureThreshold condition - gesture held for threshold predictions, within the noise budget.
+        The threshold predictions checked are the ones ending startIdx predictions before the newest. The old scan checked the last
+        startIdx + threshold predictions against a budget for threshold, so gestureTransition's second check (startIdx = threshold1)
+        also counted the first gesture's predictions as noise and a transition between two different gestures could never pass.
+        For the same reason the check now fails until threshold + startIdx predictions have arrived (the old scan only waited for
+        threshold and wrapped round to the newest predictions before that). With startIdx 0 both give the same decisions.
+    - clear(): Forgets every prediction.
+"""
+
+
+class GestureWindow:
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.total = 0                 #Predictions appended since the window was created / cleared
+        self.runningCounts = {}        #gesture -> ring of running counts, slot t % (capacity + 1) holds the count among the first t predictions
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, prediction):
+        prediction = int(prediction)
+        slots = self.capacity + 1
+        slot = self.total % slots
+        nextSlot = (self.total + 1) % slots
+        for gesture, counts in self.runningCounts.items():
+            counts[nextSlot] = counts[slot] + (gesture == prediction)
+        if prediction not in self.runningCounts:
+            #First time this gesture is seen - every earlier running count is 0
+            counts = self.runningCounts[prediction] = [0] * slots
+            counts[nextSlot] = 1
+        self.total += 1
+
+    def count(self, gesture, length, startIdx=0):
+        #startIdx counts back from the newest prediction (0 = the window ends with the newest one)
+        counts = self.runningCounts.get(gesture)
+        if counts is None:
+            return 0
+        slots = self.capacity + 1
+        end = self.total - startIdx
+        return counts[end % slots] - counts[(end - length) % slots]
+
+    def held(self, gesture, threshold, startIdx=0):
+        #Checks the threshold predictions ending startIdx before the newest (not the last startIdx + threshold - see the docstring)
+        #Same noise rule as the old scan in MidiControl.gestureThreshold: not enough predictions yet fails, and the condition fails once
+        #the other gestures (noise) reach the budget of one in ten (int(threshold / 10)) - the first one fails when that is 0
+        #count() is inlined - this runs for every control on every prediction
+        end = self.total - startIdx
+        start = end - threshold
+        if start < 0 or threshold + startIdx > self.capacity:
+            return False
+        counts = self.runningCounts.get(gesture)
+        slots = self.capacity + 1
+        noiseCount = threshold - (counts[end % slots] - counts[start % slots] if counts is not None else 0)
+        return noiseCount < (int(threshold / 10) or 1)    #All one in ten errors (for 90% neural network accuracy)
+
+    def clear(self):
+        self.total = 0
+        self.runningCounts = {}
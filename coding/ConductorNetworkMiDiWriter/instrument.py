@@ -0,0 +1,297 @@
+"""
+Description:
+This Python script defines the instrumentation used on the real-time path (socketClient, NeuralNetwork, midiWriter, midiPlayer). It replaces
+the old int(time.time() * 1000) timings that were printed on every sample, and the raw bytes / arrays / banners that every hot-path
+function printed, which cost more than the work they described.
+
+- Spans: startNs = instrument.now() ... instrument.record('stage', startNs). Monotonic perf_counter_ns, kept in a histogram per stage.
+- Counters: instrument.count('name') for things that are counted rather than timed (eg. samples dropped).
+    Call them through the module (instrument.record, not from instrument import record) so configure() takes effect.
+- Logging: log = instrument.getLogger(__name__), then log.debug() / info() / warning() / error() with %-style arguments.
+
+Instrumentation modes (configure(), or the CONDUCTOR_INSTRUMENT environment variable):
+- OFF: record() and count() are replaced by a function that does nothing (the default).
+- SUMMARY: Histograms and counters are kept in memory and printed at exit (or with printSummary()).
+- TRACE: SUMMARY, and every span is also written to a Chrome trace event file (open it in chrome://tracing or ui.perfetto.dev).
+    CONDUCTOR_INSTRUMENT=trace:path.json sets the file (default trace.json).
+
+Log levels (setLevel(), or CONDUCTOR_LOG=debug / info / warning / error / off): Logger methods below the level are replaced by the same
+do-nothing function, so a disabled log.debug() costs one call and never formats its message. Arguments are still evaluated - guard
+anything expensive to build with if log.debugOn:.
+
+Classes and Methods:
+- Histogram: Latency histogram with log-linear buckets (4 per power of two, so each bucket is within 25% of its neighbours).
+    - add(): Records one value in ns.
+    - percentile(): Approximate percentile in ns (middle of the bucket, clamped to the exact min / max).
+    - summary(): count, mean, p50, p95, p99 and max in ms.
+- Logger: Leveled print() for one module.
+    - debug() / info() / warning() / error(): Print the message if the level is enabled.
+- span: Context manager timing its block with record() (for code that is not called per sample).
+
+Functions:
+- configure(): Sets the instrumentation mode (and the trace file for TRACE).
+- now(): perf_counter_ns().
+- record(): Adds now() - startNs to the named stage (and writes a trace event in TRACE mode).
+- count(): Adds n to the named counter.
+- summary(): Returns {'stages': {name: Histogram.summary()}, 'counters': {name: n}}.
+- printSummary(): Prints summary() as a table.
+- reset(): Clears the histograms and counters.
+- getLogger(): Returns the Logger for a module name.
+- setLevel(): Sets the log level of every Logger.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+OFF = 'off'
+SUMMARY = 'summary'
+TRACE = 'trace'
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+SILENT = 100
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'off': SILENT}
+
+BUCKETS = 256    #Covers every int64 ns value
+
+
+def _bucket(ns):
+    #0-7 ns get a bucket each, after that 4 buckets per power of two
+    bits = ns.bit_length()
+    if bits <= 3:
+        return ns
+    return (bits - 2) * 4 + ((ns >> (bits - 3)) & 3)
+
+
+def _bucketRange(index):
+    #[low, high) of the values in a bucket
+    if index < 8:
+        return index, index + 1
+    octave, sub = divmod(index, 4)    #octave = bit_length - 2
+    shift = octave - 1
+    return (4 + sub) << shift, (5 + sub) << shift
+
+
+class Histogram:
+
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.totalNs = 0
+        self.minNs = None
+        self.maxNs = 0
+
+    def add(self, ns):
+        if ns < 0:
+            ns = 0
+        self.buckets[_bucket(ns)] += 1
+        self.count += 1
+        self.totalNs += ns
+        if self.minNs is None or ns < self.minNs:
+            self.minNs = ns
+        if ns > self.maxNs:
+            self.maxNs = ns
+
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        rank = q / 100 * (self.count - 1)
+        seen = 0
+        for index, bucketCount in enumerate(self.buckets):
+            seen += bucketCount
+            if seen > rank:
+                low, high = _bucketRange(index)
+                return min(max((low + high) / 2, self.minNs), self.maxNs)
+        return self.maxNs
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'meanMs': self.totalNs / self.count / 1e6,
+            'p50Ms': self.percentile(50) / 1e6,
+            'p95Ms': self.percentile(95) / 1e6,
+            'p99Ms': self.percentile(99) / 1e6,
+            'maxMs': self.maxNs / 1e6,
+        }
+
+
+#Instrumentation state - one set of histograms and counters per process
+mode = OFF
+stages = {}       #name -> Histogram
+counters = {}     #name -> int
+lock = threading.Lock()
+tracePath = None
+_traceFile = None
+_traceEvents = []
+_pid = os.getpid()
+
+now = time.perf_counter_ns
+
+
+def _off(*args, **kwargs):
+    #Stands in for record(), count() and disabled Logger methods
+    return None
+
+
+def _record(name, startNs, endNs=None):
+    if endNs is None:
+        endNs = time.perf_counter_ns()
+    with lock:
+        histogram = stages.get(name)
+        if histogram is None:
+            histogram = stages[name] = Histogram()
+        histogram.add(endNs - startNs)
+        if mode == TRACE:
+            _traceEvents.append({'name': name, 'ph': 'X', 'ts': startNs / 1000, 'dur': (endNs - startNs) / 1000,
+                                 'pid': _pid, 'tid': threading.get_ident()})
+            if len(_traceEvents) >= 4096:
+                _flushTrace()
+
+
+def _count(name, n=1):
+    with lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+record = _off
+count = _off
+
+
+def _flushTrace():
+    #Called with the lock held. The file is a JSON array that is closed at exit - trace viewers also accept it unclosed
+    global _traceFile
+    if not _traceEvents:
+        return
+    if _traceFile is None:
+        _traceFile = open(tracePath, 'w')
+        _traceFile.write('[\n')
+    for event in _traceEvents:
+        _traceFile.write(json.dumps(event) + ',\n')
+    _traceFile.flush()
+    _traceEvents.clear()
+
+
+def configure(newMode=OFF, *, path='trace.json'):
+    global mode, record, count, tracePath
+    if newMode not in (OFF, SUMMARY, TRACE):
+        raise ValueError(f'Unknown instrumentation mode {newMode!r} - use instrument.OFF, SUMMARY or TRACE')
+    with lock:
+        if mode == TRACE and newMode != TRACE:
+            _closeTrace()
+        if newMode == TRACE and path != tracePath:
+            _closeTrace()
+            tracePath = path
+        mode = newMode
+        record = _off if newMode == OFF else _record
+        count = _off if newMode == OFF else _count
+
+
+def _closeTrace():
+    global _traceFile
+    _flushTrace()
+    if _traceFile is not None:
+        #Counters go in as one counter event at the end
+        _traceFile.write(json.dumps({'name': 'counters', 'ph': 'C', 'ts': time.perf_counter_ns() / 1000, 'pid': _pid,
+                                     'args': dict(counters)}) + '\n]\n')
+        _traceFile.close()
+        _traceFile = None
+
+
+class span:
+    #with instrument.span('name'): ... - for code that runs once in a while, the per-sample path uses now() / record()
+    __slots__ = ('name', 'startNs')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.startNs = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.startNs)
+        return False
+
+
+def summary():
+    with lock:
+        return {'stages': {name: histogram.summary() for name, histogram in sorted(stages.items())}, 'counters': dict(sorted(counters.items()))}
+
+
+def printSummary():
+    report = summary()
+    if not report['stages'] and not report['counters']:
+        return
+    print()
+    print(f"{'stage':>34} {'count':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in report['stages'].items():
+        if stats['count']:
+            print(f"{name:>34} {stats['count']:9d} {stats['meanMs']:9.3f} {stats['p50Ms']:9.3f} {stats['p95Ms']:9.3f} {stats['p99Ms']:9.3f} {stats['maxMs']:9.3f}")
+    for name, n in report['counters'].items():
+        print(f'{name:>34} {n:9d}')
+
+
+def reset():
+    with lock:
+        stages.clear()
+        counters.clear()
+
+
+def _atExit():
+    if mode != OFF:
+        printSummary()
+    with lock:
+        _closeTrace()
+
+atexit.register(_atExit)
+
+
+#Leveled logging
+level = INFO
+loggers = {}    #One Logger per module name
+
+
+class Logger:
+
+    def __init__(self, name):
+        self.name = name
+        self._apply()
+
+    def _apply(self):
+        #Disabled levels are bound to _off so the hot path pays for one call and no formatting
+        self.debugOn = level <= DEBUG
+        self.debug = self._print if level <= DEBUG else _off
+        self.info = self._print if level <= INFO else _off
+        self.warning = self._print if level <= WARNING else _off
+        self.error = self._print if level <= ERROR else _off
+
+    def _print(self, message, *args):
+        print(message % args if args else message)
+
+
+def getLogger(name):
+    logger = loggers.get(name)
+    if logger is None:
+        logger = loggers[name] = Logger(name)
+    return logger
+
+
+def setLevel(newLevel):
+    global level
+    level = LEVELS[newLevel] if isinstance(newLevel, str) else newLevel
+    for logger in loggers.values():
+        logger._apply()
+
+
+#Environment configuration, eg. CONDUCTOR_INSTRUMENT=trace:run1.json CONDUCTOR_LOG=debug python ux.py
+_envMode, _, _envPath = os.environ.get('CONDUCTOR_INSTRUMENT', OFF).partition(':')
+configure(_envMode.lower(), path=_envPath or 'trace.json')
+setLevel(os.environ.get('CONDUCTOR_LOG', 'info').lower())
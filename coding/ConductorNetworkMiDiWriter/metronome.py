@@ -9,7 +9,8 @@ Class and Methods:
         - startFlag: Flag indicating the start state of the metronome (default: False).
         - BPM_millis: Time in milliseconds per beat for the metronome (default: 0).
         - doneFlag: Flag indicating the completion of a time interval (default: 0).
-    - timer_function(): Thread function to simulate a metronome ticking at specified intervals.
+    - clock: midiClock.MidiClock shared by every control - absolute beat deadlines and the tick counter. Setting bpm changes its tempo.
+    - timer_function(): Thread function that sets doneFlag on every beat of the clock (absolute deadlines, so it does not drift).
     - startMetro(): Starts or stops the metronome based on the offONState parameter.
     - getTimeTick(): Calculates the time slice for MIDI events based on the BPM and MIDI array length.
     - getSubdivisionCount(): Determines the subdivision count based on note values.
@@ -27,20 +28,34 @@ Note: The script does not include an __init__ block for execution as it is desig
 import time
 import threading
 import buildMidi
+from midiClock import MidiClock
 
 
 class Metronome:
     def __init__(self, bpm=60, startFlag=False, BPM_millis=0, doneFlag = 0):
+        self.clock = MidiClock(bpm)
         self.bpm = bpm
         self.startFlag = startFlag
         self.stopFlag = False
         self.BPM_millis = BPM_millis
         self.doneFlag = doneFlag
 
+    @property
+    def bpm(self):
+        return self._bpm
+
+    @bpm.setter
+    def bpm(self, bpm):
+        #The UX sets metro.bpm directly - keep the clock's tempo in step
+        self._bpm = bpm
+        self.clock.setBpm(bpm)
+
     def timer_function(self, interval):
+        #interval is kept for callers - the beat length comes from the clock's tempo
+        self.clock.start()
+        beat = None
         while not self.stopFlag:
-            print(f"Timer: {interval} seconds")
-            time.sleep(interval)
+            beat, deadlineNs = self.clock.waitBeat(None if beat is None else beat + 1)
             self.doneFlag = 1
 
     def startMetro(self, offONState):
@@ -56,15 +71,13 @@ class Metronome:
 
     def getTimeTick(self, midiArray = []):
   
-        if midiArray == None:
+        if midiArray is None:
             timeSlice = (60 / self.bpm) * 1000
         else:
             midiCount = len(midiArray)
             self.BPM_millis = (60 / self.bpm) * 1000
-            if(midiCount == 1):
-                timeSlice = self.BPM_millis/((midiCount))
-            else:
-                timeSlice = self.BPM_millis/((midiCount-1))
+            #midiCount messages, each followed by one slice, fill exactly one beat (midiCount - 1 made every beat one slice too long)
+            timeSlice = self.BPM_millis/max(midiCount, 1)
         return timeSlice
 
     @staticmethod
@@ -8,6 +8,7 @@ Class and Methods:
         - midiIn_port_index: MIDI input port index (default: 3).
         - octave: Octave value for note manipulation (default: 2).
         - order: Order of note arrangement (default: 0 for ascending).
+        - midi_in: An already opened MIDI input to use instead of opening midiIn_port_index (default: None).
     - process_messages(): Processes incoming MIDI messages continuously when the arpeggiator is running.
     - _handle_midi_message(): Handles MIDI messages, adding or discarding notes based on note-on/off events.
     - start_processing_thread(): Starts a thread for processing MIDI messages.
@@ -31,9 +32,11 @@ import time
 import random
 
 class MidiArp:
-    def __init__(self, midiIn_port_index=3, octave=2, order=0):
-        self.midi_in = rtmidi.MidiIn()
-        self.midi_in.open_port(midiIn_port_index)
+    def __init__(self, midiIn_port_index=3, octave=2, order=0, midi_in=None):
+        if midi_in is None:
+            midi_in = rtmidi.MidiIn()
+            midi_in.open_port(midiIn_port_index)
+        self.midi_in = midi_in
         self.held_notes = set()
         self.lock = threading.Lock()
         self.is_running = False
@@ -0,0 +1,138 @@
+"""
+Description:
+This Python script defines the clock that schedules MIDI playback. Metronome.timer_function used to time.sleep(interval) between beats and
+MidiPlayer.play_beat time.sleep()s after every message, so each sleep's overshoot and every bit of work in between (building MIDI,
+starting threads) was added to the next beat and the tempo drifted further behind the longer it played, more so under load.
+
+MidiClock works in absolute deadlines instead: beat n of a session is due at origin + n * beat length on time.perf_counter_ns, and
+message i of a beat at beat start + i * time slice. A late beat or message never moves the ones after it. Each wait sleeps until
+spinNs before the deadline and then spins (yielding the GIL) for the rest, so messages go out within a few microseconds of their
+deadline instead of the 0.05-1 ms (15 ms on older Windows Pythons) that time.sleep() overshoots by.
+
+One clock is shared by every control (Metronome.clock), so all controls count the same ticks (ticksPerBeat per beat, 24 like MIDI clock)
+and start their beats together. Changing the tempo keeps the current tick position and continues from there at the new tempo.
+
+Classes and Methods:
+- MidiClock: Shared tick counter and deadline scheduler.
+    - __init__(): Initializes the clock with parameters:
+        - bpm: Beats per minute.
+        - ticksPerBeat: Resolution of the tick counter (24 per quarter note, like MIDI clock).
+        - spinNs: How long before a deadline waitUntil() stops sleeping and spins. More is more accurate and uses more CPU.
+    - start(): Starts counting ticks from now (does nothing if the clock is already running, so every user shares one origin).
+    - stop(): Stops the clock. The next start() begins again at tick 0.
+    - setBpm(): Changes the tempo from the current tick position on.
+    - tickPosition(): Ticks since start (float) at a perf_counter_ns time, now by default. tick is the whole number of ticks.
+    - tickDeadline(): perf_counter_ns time of a tick. beatDeadline() does the same for a beat.
+    - waitUntil(): Sleeps then spins until a perf_counter_ns deadline, records how late it returned and returns that lateness (ns).
+    - nextBeat(): (beat, deadline) of a beat (the next one by default) without waiting. A beat already more than a beat late is skipped.
+        onTick=True starts on the next tick instead of the next beat (beat is then a fraction - the following beats are beat + 1, ...).
+    - waitBeat(): nextBeat(), then waitUntil() its deadline.
+    - stats(): Lateness (jitter) percentiles, missed beats and the tempo.
+
+Note: Lateness is also recorded in instrument.py as 'midiClock.lateness' when instrumentation is on.
+"""
+
+import threading
+import time
+
+import instrument
+
+
+class MidiClock:
+
+    def __init__(self, bpm=60, *, ticksPerBeat=24, spinNs=500_000):
+        self.bpm = float(bpm)
+        self.ticksPerBeat = ticksPerBeat
+        self.spinNs = spinNs
+        self.running = False
+        self.originNs = 0          #perf_counter_ns time of originTick - moved on every tempo change
+        self.originTick = 0.0
+        self.lateness = instrument.Histogram()    #How late waitUntil() returned, in ns
+        self.waitCount = 0
+        self.missedBeats = 0       #Beats waitBeat() skipped because it was called more than a beat late
+        self.lock = threading.Lock()
+
+    def beatNs(self):
+        return 60e9 / self.bpm
+
+    def tickNs(self):
+        return self.beatNs() / self.ticksPerBeat
+
+    def start(self, startNs=None):
+        with self.lock:
+            if self.running:
+                return
+            self.originNs = startNs if startNs is not None else time.perf_counter_ns()
+            self.originTick = 0.0
+            self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def setBpm(self, bpm):
+        with self.lock:
+            if self.running:
+                #Rebase so the tick position is continuous across the tempo change
+                nowNs = time.perf_counter_ns()
+                self.originTick = self.tickPosition(nowNs)
+                self.originNs = nowNs
+            self.bpm = float(bpm)
+
+    def tickPosition(self, ns=None):
+        if not self.running:
+            return 0.0
+        if ns is None:
+            ns = time.perf_counter_ns()
+        return self.originTick + (ns - self.originNs) / self.tickNs()
+
+    @property
+    def tick(self):
+        #The shared tick counter
+        return int(self.tickPosition())
+
+    def tickDeadline(self, tick):
+        return self.originNs + round((tick - self.originTick) * self.tickNs())
+
+    def beatDeadline(self, beat):
+        return self.tickDeadline(beat * self.ticksPerBeat)
+
+    def waitUntil(self, deadlineNs):
+        remainingNs = deadlineNs - time.perf_counter_ns()
+        if remainingNs > self.spinNs:
+            time.sleep((remainingNs - self.spinNs) / 1e9)
+        while time.perf_counter_ns() < deadlineNs:
+            time.sleep(0)    #Spin, but let the other threads (acquisition, inference) run
+        latenessNs = time.perf_counter_ns() - deadlineNs
+        with self.lock:
+            self.lateness.add(latenessNs)
+            self.waitCount += 1
+        instrument.record('midiClock.lateness', deadlineNs)
+        return latenessNs
+
+    def nextBeat(self, beat=None, *, onTick=False):
+        #beat=None is the next beat (or tick) boundary. Returns (beat, deadline) - play the beat's messages at deadline + i * time slice
+        if not self.running:
+            self.start()
+        nowNs = time.perf_counter_ns()
+        if beat is None and onTick:
+            beat = (int(self.tickPosition(nowNs)) + 1) / self.ticksPerBeat
+        elif beat is None:
+            beat = int(self.tickPosition(nowNs) // self.ticksPerBeat) + 1
+        else:
+            behind = int((nowNs - self.beatDeadline(beat)) // self.beatNs())
+            if behind >= 1:
+                #More than a beat late (eg. the loop was blocked) - skip ahead instead of rushing the missed beats out
+                self.missedBeats += behind
+                beat += behind
+        return beat, self.beatDeadline(beat)
+
+    def waitBeat(self, beat=None, *, onTick=False):
+        beat, deadlineNs = self.nextBeat(beat, onTick=onTick)
+        self.waitUntil(deadlineNs)
+        return beat, deadlineNs
+
+    def stats(self):
+        with self.lock:
+            summary = self.lateness.summary()
+        summary.update({'bpm': self.bpm, 'missedBeats': self.missedBeats, 'tick': self.tick})
+        return summary
@@ -0,0 +1,178 @@
+"""
+Description:
+This Python script defines the dispatcher that sends every control's MIDI messages. MiDiWriter.play_loop used to start one
+threading.Thread per control on every beat, each running MidiPlayer.play_beat with its own waits, and then join them all. Creating
+the threads, the threads fighting over the GIL at the same deadlines and the join barrier all added jitter, and the cost grew with the
+number of controls.
+
+MidiDispatcher merges the messages of every control into one heap ordered by deadline (perf_counter_ns on the shared
+midiClock.MidiClock) and sends them from a single long-lived thread. Nothing is created per beat: play_loop schedules the beat's
+messages and waits for the dispatcher to go idle, and messages due at the same time go out back to back in the order they were scheduled.
+
+How it works: the thread sleeps on a threading.Condition until spinNs before the earliest deadline (schedule() wakes it when an earlier
+message arrives), then hands the last stretch to MidiClock.waitUntil, which spins and records the lateness.
+
+Classes and Methods:
+- MidiDispatcher: Single-thread, deadline-ordered MIDI sender.
+    - __init__(): Initializes the dispatcher with parameters:
+        - midiOut: Opened MIDI output (rtmidi.MidiOut or anything with send_message()).
+        - clock: midiClock.MidiClock the deadlines are on (a new one when not given).
+    - start(): Starts the dispatch thread (does nothing if it is running).
+    - stop(): Stops the thread. Messages not sent yet are dropped.
+    - schedule(): Queues one message for a deadline.
+    - scheduleBeat(): Queues a beat of MIDI data (what MidiPlayer.play_beat used to send) - message i at startNs + i * timeSlice ms,
+        or at startNs + offsetsNs[i] when the message times are given.
+    - waitIdle(): Blocks until every queued message has been sent. Returns False if the dispatch thread is gone.
+    - pending(): Number of messages still queued.
+
+Functions:
+- beatOffsets(): Read-only int64 array of message i's time from the start of the beat (ns) - the timestamps that go with a
+    buildMidi message array, worked out once per player instead of on every beat.
+
+Note: Send times are recorded in instrument.py as 'midiDispatcher.send_message' and the messages counted as 'midiDispatcher.messages'
+when instrumentation is on. A message send_message() raises for (eg. the port was closed) is logged, counted as
+'midiDispatcher.sendError' and skipped - the thread keeps going.
+"""
+
+import heapq
+import itertools
+import threading
+
+import numpy as np
+
+from midiClock import MidiClock
+import instrument
+
+log = instrument.getLogger(__name__)
+
+
+def beatOffsets(count, timeSlice):
+    offsetsNs = np.round(np.arange(count) * (timeSlice * 1e6)).astype(np.int64)
+    offsetsNs.flags.writeable = False
+    return offsetsNs
+
+
+class MidiDispatcher:
+
+    def __init__(self, midiOut, clock=None):
+        self.midiOut = midiOut
+        self.clock = clock if clock is not None else MidiClock()
+        self.queue = []                     #Heap of (deadlineNs, sequence, message)
+        self.sequence = itertools.count()   #Keeps messages with the same deadline in the order they were scheduled
+        self.sending = 0                    #Messages popped from the queue but not sent yet
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.clock.start()
+        self.thread = threading.Thread(target=self.run, name='MidiDispatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.queue.clear()
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def schedule(self, deadlineNs, message):
+        with self.condition:
+            wakeUp = not self.queue or deadlineNs < self.queue[0][0]
+            heapq.heappush(self.queue, (deadlineNs, next(self.sequence), message))
+            if wakeUp:
+                self.condition.notify_all()
+
+    def scheduleBeat(self, midi_data, timeSlice, startNs, on_flag=1, offsetsNs=None):
+        #Same messages as MidiPlayer.play_beat: nothing when the control is off or has no data, one message, or a sequence
+        #(a buildMidi (N, 3) uint8 array, or a list with -1 velocity placeholders that are skipped). Returns how many messages were queued
+        if not on_flag or midi_data is None or len(midi_data) == 0:
+            return 0
+        if isinstance(midi_data[0], (int, np.integer)):
+            self.schedule(startNs, [int(byte) for byte in midi_data])
+            return 1
+        if offsetsNs is None or len(offsetsNs) != len(midi_data):
+            offsetsNs = beatOffsets(len(midi_data), timeSlice)
+        #One C-level conversion per beat - rtmidi and the heap get plain ints
+        deadlines = (offsetsNs + startNs).tolist()
+        messages = midi_data.tolist() if isinstance(midi_data, np.ndarray) else midi_data
+        queued = 0
+        with self.condition:
+            wakeUp = not self.queue or startNs < self.queue[0][0]
+            for deadlineNs, msg in zip(deadlines, messages):
+                if msg[2] == -1:
+                    continue
+                heapq.heappush(self.queue, (deadlineNs, next(self.sequence), msg))
+                queued += 1
+            if wakeUp and queued:
+                self.condition.notify_all()
+        return queued
+
+    def pending(self):
+        with self.condition:
+            return len(self.queue) + self.sending
+
+    def alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def waitIdle(self, timeout=None):
+        #True once everything queued has been sent. False on timeout, or once the dispatch thread is gone (stopped or died) -
+        #nothing would ever send what is left
+        with self.condition:
+            idle = self.condition.wait_for(lambda: not self.running or not (self.queue or self.sending), timeout)
+            return idle and self.running and self.alive()
+
+    def run(self):
+        try:
+            self._run()
+        finally:
+            #However the thread ends, mark the dispatcher stopped (start() can start it again) and wake waitIdle()
+            with self.condition:
+                self.running = False
+                self.sending = 0
+                self.condition.notify_all()
+
+    def _run(self):
+        clock = self.clock
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                deadlineNs = self.queue[0][0]
+                remainingNs = deadlineNs - instrument.now()
+                if remainingNs > clock.spinNs:
+                    #Sleep until spinNs before the deadline - schedule() wakes us early if an earlier message arrives
+                    self.condition.wait((remainingNs - clock.spinNs) / 1e9)
+                    continue
+            clock.waitUntil(deadlineNs)
+            with self.condition:
+                #Everything due by now goes out together, oldest deadline first
+                due = []
+                nowNs = instrument.now()
+                while self.queue and self.queue[0][0] <= nowNs:
+                    due.append(heapq.heappop(self.queue)[2])
+                self.sending = len(due)
+            try:
+                for msg in due:
+                    log.debug("Playing MIDI: %s", msg)
+                    startNs = instrument.now()
+                    try:
+                        self.midiOut.send_message(msg)
+                    except Exception as err:
+                        log.error("MIDI send error: %r (message %s)", err, msg)
+                        instrument.count('midiDispatcher.sendError')
+                        continue
+                    instrument.record('midiDispatcher.send_message', startNs)
+                instrument.count('midiDispatcher.messages', len(due))
+            finally:
+                with self.condition:
+                    self.sending = 0
+                    self.condition.notify_all()
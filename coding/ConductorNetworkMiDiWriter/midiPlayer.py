@@ -7,14 +7,21 @@ Classes and Methods:
     - __init__(): Initializes the MidiPlayer instance with parameters:
         - midi_out: MIDI output instance.
         - time_slice: Time duration for MIDI events (default: 0).
-        - midi_data: MIDI data to be played (default: None).
+        - midi_data: MIDI data to be played - a buildMidi (N, 3) uint8 message array or a list of messages (default: None).
         - on_flag: Flag indicating MIDI playback (default: 0).
-    - play_beat(): Plays MIDI data either as a single message or as a sequence.
-    - play_beat_threaded(): Plays MIDI data in multiple threads for simultaneous playback.
+        - clock: midiClock.MidiClock to schedule the messages on (default: None - sleep time_slice after each message).
+        - dispatcher: midiDispatcher.MidiDispatcher to queue the messages on instead of sending them from this thread (default: None).
+    - play_beat(): Plays MIDI data either as a single message or as a sequence. Given start_ns (the beat's deadline on the clock),
+        message i is sent at start_ns + i * time_slice, so late messages do not delay the ones after them.
+    - wait_slice(): Waits for message i's deadline on the clock (or sleeps time_slice without one).
+    - finish_beat(): Sleeps out the last slice when there is no clock.
+    - schedule_beat(): Queues the beat's messages on the dispatcher at their deadlines and returns without waiting. The messages'
+        offsets from the beat start (midiDispatcher.beatOffsets) are worked out once, when the player is created.
+    - play_beat_threaded(): Plays MIDI data for simultaneous playback - through the dispatcher when there is one, otherwise one thread per control.
     - (other methods if present remain unchanged)
 
 - initialize_midi_player(): Function to initialize the MIDI output.
-- main_loop(): Function that orchestrates MIDI playback based on the Metronome's timing.
+- main_loop(): Function that orchestrates MIDI playback based on the Metronome's timing, sending every player's beat through one MidiDispatcher.
 
 Functionality:
 - The MidiPlayer class facilitates MIDI playback by sending MIDI messages through a MIDI output interface.
@@ -30,53 +37,90 @@ import time
 import rtmidi
 import threading
 from metronome import Metronome
+from midiDispatcher import MidiDispatcher, beatOffsets
 import buildMidi
 import numpy as np
+import instrument
+
+log = instrument.getLogger(__name__)
 
 
 
 class MidiPlayer:
-    def __init__(self, midi_out, time_slice=0, midi_data=None, on_flag=0):
+    def __init__(self, midi_out, time_slice=0, midi_data=None, on_flag=0, clock=None, dispatcher=None):
         self.timeSlice = time_slice
-        self.midiData = midi_data or []
+        self.midiData = midi_data if midi_data is not None else []
         self.midiOut = midi_out
         self.onFlag = on_flag
-
-    def play_beat(self, midi_data=None, on_flag=0):
+        self.clock = clock
+        self.dispatcher = dispatcher
+        self.offsetsNs = beatOffsets(len(self.midiData), time_slice)    #Timestamps of midiData's messages within the beat
+
+    def wait_slice(self, start_ns, index):
+        #Absolute deadline on the clock when there is one, otherwise the old relative sleep
+        if self.clock is not None and start_ns is not None:
+            self.clock.waitUntil(start_ns + round(index * self.timeSlice * 1e6))
+        elif index > 0:
+            time.sleep(self.timeSlice / 1000)
+
+    def finish_beat(self, start_ns):
+        #Without a clock the last slice is slept out so the beat lasts a beat; with one the next beat's deadline takes care of it
+        if self.clock is None or start_ns is None:
+            time.sleep(self.timeSlice / 1000)
+
+    def play_beat(self, midi_data=None, on_flag=0, start_ns=None):
         # on_flag = 1
         # on_flag = 1
-        a = np.asarray(midi_data)
-        
-        if a.size == 0 or midi_data == None:
-            print("Midi array is empty")
+        if midi_data is None or len(midi_data) == 0:
+            log.debug("Midi array is empty")
         else:
             
             
             if on_flag:
-                if isinstance(midi_data[0], int):
-                    self.midiOut.send_message(midi_data)
-                    time.sleep(self.timeSlice / 1000)
+                if isinstance(midi_data[0], (int, np.integer)):
+                    self.wait_slice(start_ns, 0)
+                    self.midiOut.send_message([int(byte) for byte in midi_data])
+                    instrument.count('midiPlayer.messages')
+                    self.finish_beat(start_ns)
                 else:
-                    for msg in midi_data:
+                    if isinstance(midi_data, np.ndarray):
+                        midi_data = midi_data.tolist()    #rtmidi gets plain ints
+                    for i, msg in enumerate(midi_data):
+                        self.wait_slice(start_ns, i)
                         if msg[2] == -1:
-                            print("Midi array is empty")
+                            log.debug("Midi array is empty")
                         else:
-                            print(f"Playing MIDI from control: {msg}")
-                            print(self.midiOut.get_ports())
+                            log.debug("Playing MIDI from control: %s", msg)
+                            startNs = instrument.now()
                             self.midiOut.send_message(msg)
-                        time.sleep(self.timeSlice / 1000)
+                            instrument.record('midiPlayer.send_message', startNs)
+                    self.finish_beat(start_ns)
+
+    def schedule_beat(self, midi_data=None, on_flag=0, start_ns=None):
+        #The dispatcher's thread sends the messages - nothing is created or slept on per beat
+        if start_ns is None:
+            start_ns = instrument.now()
+        return self.dispatcher.scheduleBeat(midi_data, self.timeSlice, start_ns, on_flag, self.offsetsNs)
 
     def play_beat_threaded(self):
+        if self.dispatcher is not None:
+            #Every control's messages merged on one deadline-ordered queue
+            self.dispatcher.start()
+            start_ns = self.dispatcher.clock.nextBeat(onTick=True)[1]
+            for control in self.midiData:
+                self.schedule_beat(control, 1, start_ns)
+            self.dispatcher.waitIdle()
+            return
         threads = []
         for i, control in enumerate(self.midiData):
             thread = threading.Thread(target=self.play_beat, args=(control,))
             threads.append(thread)
             thread.start()
-            print(f"Thread {i + 1} started.")
+            log.debug("Thread %d started.", i + 1)
 
         for thread in threads:
             thread.join()
-        print("All threads finished.")
+        log.debug("All threads finished.")
 
     # ... (other methods remain unchanged)
 
@@ -98,17 +142,15 @@ def initialize_midi_player():
     return midi_out
 
 def main_loop(midi_players):
+    dispatcher = MidiDispatcher(midi_out, metronome.clock)
+    dispatcher.start()
+    beat = None
     while metronome.startFlag:
         if metronome.doneFlag == 1:
-            threads = []
+            beat, beat_start_ns = metronome.clock.nextBeat(None if beat is None else beat + 1)
             for midi_player, midi_data in zip(midi_players, midi_data_list):
-                threads.append(threading.Thread(target=midi_player.play_beat, args=(midi_data,)))
-
-            for thread in threads:
-                thread.start()
-
-            for thread in threads:
-                thread.join()
+                dispatcher.scheduleBeat(midi_data, midi_player.timeSlice, beat_start_ns, midi_player.onFlag)
+            dispatcher.waitIdle()
 
 if __name__ == "__main__":
     metronome = Metronome(bpm=60)
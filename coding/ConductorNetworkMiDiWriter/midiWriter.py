@@ -8,10 +8,12 @@ Classes and Methods:
     - generate_midi_data(): Generates new MIDI data based on control parameters.
     - start_play_loop(): Starts the play loop for MIDI event generation.
     - update_playControl(): Updates the control flags for MIDI playback.
-    - play_loop(): Manages the continuous loop for MIDI playback based on metronome timing and control flags.
-    - refreshMidi(): Refreshes MIDI data based on updated control attributes.
+    - play_loop(): Manages the continuous loop for MIDI playback based on metronome timing and control flags. Each beat's messages
+        go out through one midiDispatcher.MidiDispatcher thread rather than a thread per control. The loop sleeps until the next beat
+        is due, or while nothing plays until conductor() turns a control on (wakeUp), instead of spinning.
+    - refreshMidi(): Refreshes MIDI data based on updated control attributes. A control's MIDI is only rebuilt when what it is built from
+        changed (controls whose MIDI changes on every build - ToF deltas, random arpeggio order - are always rebuilt). Returns whether anything changed.
     - reorder_held_notes(): Reorders held notes based on the specified order.
-    - garbageMan(): Cleans up prediction data based on a specified memory size.
     - getPredictions(): Collects gesture predictions from the neural network for MIDI interpretation.
     - conductor(): Orchestrates the process of gathering and sending MIDI data based on control parameters and neural network predictions.
 
@@ -44,13 +46,17 @@ import random
 # Import third-party modules
 import numpy as np
 import rtmidi
-from scipy import signal
 
 # Import local modules
 from metronome import Metronome
 import buildMidi
 from midiPlayer import MidiPlayer
+from midiDispatcher import MidiDispatcher
 from midiArp import MidiArp
+from gestureWindow import GestureWindow
+import instrument
+
+log = instrument.getLogger(__name__)
 
 ### Almost there! 
 ### This module takes the gestures classes predicted by the neural network and associates them with OSC channeles and data.
@@ -58,27 +64,36 @@ from midiArp import MidiArp
 
 class MiDiWriter:
 
-    def __init__(self, *, predictions=[], port_name=1, channel=0, cc_num=75, bpm=60, rate='w', ToFByte=-1, playControl = []):
-        self.midiOut = rtmidi.MidiOut()
-        self.midiIn = rtmidi.MidiIn()
+    def __init__(self, *, predictions=None, port_name=1, channel=0, cc_num=75, bpm=60, rate='w', ToFByte=-1, playControl = None, midiOut=None, midiIn=None):
+        #midiOut / midiIn: already opened ports to use instead of new rtmidi ones (eg. a capturing MidiOut in benchmarks.py)
+        self.midiOut = midiOut if midiOut is not None else rtmidi.MidiOut()
+        self.midiIn = midiIn if midiIn is not None else rtmidi.MidiIn()
         self.midiPortOut = port_name
         self.bpm = bpm
-        self.predictions = predictions
         self.ToFEnable = 1
-        self.memorySize = 1000 #How many samples to save before purging
-        self.memorySizeMin = 100 #How many predictions to keep on purge
+        self.memorySize = 1000 #How many predictions to keep
+        #The prediction history: running gesture counts shared by every control's condition checks
+        #predictions - a GestureWindow to share with another writer, or earlier predictions to start from (oldest first)
+        self.gestureWindow = predictions if isinstance(predictions, GestureWindow) else GestureWindow(self.memorySize)
+        if predictions is not None and not isinstance(predictions, GestureWindow):
+            for prediction in predictions:
+                self.gestureWindow.append(prediction)
         self.ToFByte = ToFByte
         self.available_MiDiPortsOut = self.midiOut.get_ports()
         self.controlList = []
         self.available_MiDiPortsIn = self.midiIn.get_ports()
         self.metro = Metronome(bpm)
+        self.dispatcher = MidiDispatcher(self.midiOut, self.metro.clock)    #Sends every control's messages from one thread
+        self.wakeUp = threading.Event()    #Set by conductor() when a control turns on or off - play_loop waits on it while idle
+        self.midi_players = []
+        self.midiPlayersBpm = None         #Tempo the players' time slices were worked out for
         self.play_loop_started = False
-        self.playControl = playControl
+        self.playControl = playControl if playControl is not None else []
         self.writerON = 0
         self.writerRate = rate
         self.midi_data_list = []
         self.busy = 0
-        self.midiArp = MidiArp(midiIn_port_index = 2) #Need to add this to GUI
+        self.midiArp = MidiArp(midiIn_port_index = 2, midi_in = midiIn) #Need to add this to GUI
 
     def generate_midi_data(self):
         # Logic to generate new MIDI data
@@ -104,28 +119,50 @@ class MiDiWriter:
        # #print(self.playControl)
 
     def play_loop(self):
-     
+        #Beats start on absolute deadlines of the shared clock (midiClock.py), so time spent refreshing MIDI never adds up to drift
+        #The loop only runs once per beat while playing and sleeps on wakeUp while idle - it never spins
+        self.metro.clock.start()
+        self.dispatcher.start()
+        beat = None
         while self.metro.startFlag:
+            self.wakeUp.clear()    #Before reading the controls, so a change made from here on wakes the next wait
+            refreshStartNs = instrument.now()
             self.refreshMidi()
+            instrument.record('midiWriter.refreshMidi', refreshStartNs)
             # #print("Indices where elements are not zero:", non_zero_indices)
             self.metro.startFlag = self.writerON
             if self.writerON:
                 self.update_playControl()
-                if self.metro.doneFlag == 1:
-                    threads = []
-                    for i, (midi_player, midi_data) in enumerate(zip(self.midi_players, self.midi_data_list)):
-                        threads.append(threading.Thread(target=midi_player.play_beat, args=(midi_data, self.playControl[i])))
-                    for thread in threads:
-                        thread.start()
-                    for thread in threads:
-                        thread.join()
+                if not any(self.playControl):
+                    beat = None    #Nothing playing - the next control to turn on starts on the next tick
+                    #conductor() sets wakeUp when a control turns on. The timeout picks up writerON / tempo changes made by the UX
+                    self.wakeUp.wait(self.metro.clock.beatNs() / 1e9)
+                elif self.metro.doneFlag == 1:
+                    #Every control plays the same beat - all their messages are queued on the dispatcher at their deadlines
+                    #Starting on the next tick (1/24 beat) rather than the next beat keeps a new control from waiting up to a beat
+                    beat, beatStartNs = self.metro.clock.nextBeat(None if beat is None else beat + 1, onTick=True)
+                    for i, midi_player in enumerate(self.midi_players):
+                        midi_player.schedule_beat(self.midi_data_list[i], self.playControl[i], beatStartNs)
+                    if not self.dispatcher.waitIdle():
+                        #The dispatch thread died - the rest of this beat is lost, start a new one for the next beat
+                        log.error('MIDI dispatcher stopped unexpectedly - restarting it')
+                        self.dispatcher.start()
+                    #Sleep out the rest of the beat (a control with no messages this beat returns straight away), waking a tick
+                    #before the next beat is due to refresh and queue it
+                    self.wait_until(self.metro.clock.beatDeadline(beat + 1) - round(self.metro.clock.tickNs()))
+        self.dispatcher.stop()
+
+    def wait_until(self, deadlineNs):
+        #Sleeps until deadlineNs unless conductor() turns a control on or off first
+        remainingNs = deadlineNs - instrument.now()
+        if remainingNs > 0:
+            self.wakeUp.wait(remainingNs / 1e9)
 
 
     def refreshMidi(self):
         self.midiArp.update_Midi()  # Update MIDI information from midiArp just once for all controls
-        
-        time.sleep(0.03)
-        self.midiArp.update_Midi()
+        #The arpeggiator's own thread keeps held_notes current, so there is no need to sleep for it here
+        changed = self.midiPlayersBpm != self.metro.bpm or len(self.midi_players) != len(self.controlList)
     
         for control in self.controlList:
             if control.startFlag == 1:
@@ -134,7 +171,12 @@ class MiDiWriter:
             arpNote = self.midiArp.update_Midi()  # Update MIDI information from midiArp just once for all controls
 
             control.changeRate(self.writerRate)
-            control.midiBuilder.rate = control.beatLenStr
+            #Everything build_midi() reads - an unchanged key means the last build is still right
+            midiKey = (control.beatLenStr, control.waveform, control.controlValue, tuple(self.midiArp.current_Midi))
+            if midiKey == control.midiKey and not control.rebuildEveryBeat(self.midiArp.order):
+                continue
+            control.midiKey = midiKey
+            changed = True
             control.midiBuilder.rate = control.beatLenStr
             control.midiBuilder.shape = control.waveform
             control.midiBuilder.newTof = control.controlValue
@@ -147,8 +189,11 @@ class MiDiWriter:
 
             control.midiResults = control.midiBuilder.build_midi()
     
-        self.midi_data_list = [control.midiResults for control in self.controlList]
-        self.midi_players = [MidiPlayer(self.midiOut, self.metro.getTimeTick(midi_data), midi_data) for control, midi_data in zip(self.controlList, self.midi_data_list)]
+        if changed:
+            self.midi_data_list = [control.midiResults for control in self.controlList]
+            self.midi_players = [MidiPlayer(self.midiOut, self.metro.getTimeTick(midi_data), midi_data, clock=self.metro.clock, dispatcher=self.dispatcher) for control, midi_data in zip(self.controlList, self.midi_data_list)]
+            self.midiPlayersBpm = self.metro.bpm
+        return changed
         
 
     def reorder_held_notes(self, order):
@@ -162,27 +207,21 @@ class MiDiWriter:
             # Shuffle notes randomly
             self.midiArp.held_notes = set(random.sample(self.midiArp.held_notes, len(self.midiArp.held_notes)))
         else:
-            print(f"Could not find {self.direction} in available ports. Opening the first port.")
+            log.warning("Could not find %s in available ports. Opening the first port.", self.direction)
             #self.midiOut.open_port(1)
                   
-    def garbageMan(self):
-        length = len(self.predictions)
-        if length > self.memorySize:
-            self.predictions = [self.predictions[i] for i in range(length - self.memorySizeMin, length)]
-
     def getPredictions(self, prediction):
         #print()
-        print('getPredictions()')
+        startNs = instrument.now()
         # Called in socketClient after prediction has been made 
         # Hands prediction data to the OSCWriter
-        self.predictions.append(prediction)
+        self.gestureWindow.append(prediction)
         self.conductor()
-        self.garbageMan()      #Reset predictions when it goes above "self.memorySize"
+        instrument.record('midiWriter.getPredictions', startNs)
 
 
     def conductor(self):
-        print()
-        print('conductor()')
+        log.debug('conductor()')
   
         if not self.play_loop_started:  # Check if the play_loop has not started yet
             if self.writerON == True:
@@ -205,9 +244,12 @@ class MiDiWriter:
             # midi_player = MidiPlayer(self.midiOut, time_slice=self.metro.getTimeTick(control.midiResults), midi_data = control.midiResults)
             
             #2 Check conditions
-            print(f'threadToggle: {control.threadToggle}')
-            control.predictions = self.predictions     
+            log.debug('threadToggle: %s', control.threadToggle)
+            control.gestureWindow = self.gestureWindow
+            wasOn = control.startFlag
             control.checkConditions()
+            if control.startFlag != wasOn:
+                self.wakeUp.set()    #play_loop starts (or stops) the control without waiting for its timeout
             control.controlValue = self.ToFByte 
             #print(f'control enabled?: {control.updateFlag}')
             self.ToFEnable = 1 
@@ -224,7 +266,6 @@ class MiDiWriter:
                 #     if self.ToFByte > 0 and self.ToFByte < 128:   #Make sure we have a valid ToF value
                 #         control.controlValue = self.ToFByte    #ToF supplies the control value 
                 #         # control.midiBuilder.newTof = control.controlValue
-        self.garbageMan()
       
 
 
@@ -232,7 +273,7 @@ class MiDiWriter:
     # ###           MidiControl
     # ############################################################################################################    
     class MidiControl:
-        def __init__(self, *, controlLabel='', midiOut=None, ToFEnable=1, updateFlag=0, predictions=[], conditionType=0, conditionData=[[0,3], [1,3]], channel=None, controlNum=None, midiLoopCount = 0, rate=None, waveform=None, minimum=None, maximum=None, direction=None, controlType = 0, bpm=0, midiMessage=60, startFlag=0, octave=0, midiInput=[]):
+        def __init__(self, *, controlLabel='', midiOut=None, ToFEnable=1, updateFlag=0, conditionType=0, conditionData=[[0,3], [1,3]], channel=None, controlNum=None, midiLoopCount = 0, rate=None, waveform=None, minimum=None, maximum=None, direction=None, controlType = 0, bpm=0, midiMessage=60, startFlag=0, octave=0, midiInput=None, gestureWindow=None):
             #Removed attributes:  value=-1, 
             
             self.midiLoopCount = midiLoopCount #Precious value fed in each time the loop runs
@@ -259,7 +300,7 @@ class MiDiWriter:
             self.conditionType = conditionType 
             self.conditionData = conditionData   ##
             #self.value = value
-            self.predictions = predictions
+            self.gestureWindow = gestureWindow if gestureWindow is not None else GestureWindow()   #MiDiWriter.conductor hands every control its shared window
             self.ToFEnable = ToFEnable #IF 1 TOF sensor is enabled when control conditions are met
             self.beatLenStr = 'w'
             self.beatMillis = self.getBeatMillis()
@@ -280,12 +321,13 @@ class MiDiWriter:
             #self.max_duration = max_duration
             self.midiBuilder = buildMidi.MidiBuilder(dataType=self.controlType, midiMessage=self.midiMessage, ch=self.channel, velocity=self.velocity, rate=self.beatLenStr)
             self.midiResults = self.midiBuilder.build_midi()
+            self.midiKey = None    #What midiResults was built from (see MiDiWriter.refreshMidi)
             self.startFlag = startFlag
             
             #midiArp Attributes
             self.octave = octave
             #self.order = order
-            self.midiInput = midiInput
+            self.midiInput = midiInput if midiInput is not None else []
               
         def changeRate(self, rate):  
             newRate = self.controlValue
@@ -310,6 +352,10 @@ class MiDiWriter:
                
             #print(self.beatLenStr)
                 
+        def rebuildEveryBeat(self, order):
+            #ToF builds send the change since the last build, and a random arpeggio is shuffled on every build
+            return self.controlType in (2, '2') or order in (2, 'Random')
+
         def getBeatMillis(self):
         #beatMillis is 1000 * (noteFactor * bps) 
         # bps = 60 / self.bpm  
@@ -341,8 +387,7 @@ class MiDiWriter:
         def checkConditions(self):
             ## Checks the updated predictions list for conditions on each control
             ## Called once for each control in OSCWriter.conductor
-            print()
-            print('checkConditions(self)')
+            log.debug('checkConditions(self)')
             match int(self.conditionType):
                 case 0:
                      ## ConditionType 0: Hold
@@ -381,8 +426,9 @@ class MiDiWriter:
                     if self.onNotOff == 1: #if on check if we need to turn it off
                         self.startFlag = 1
                         #gestureTransition(self, gesture1, threshold1, gesture2, threshold2, startIdx):
+                        #gesture1 is checked on the newest predictions and gesture2 on the ones before it, so END goes first
                         #When Control is ON it uses the second list in conditionData to set gesture and threshold
-                        if self.gestureThreshold(self.conditionData[1][0][0], self.conditionData[1][0][0], self.conditionData[1][1][0], self.conditionData[1][1][0], 0) == 0:
+                        if self.gestureTransition(self.conditionData[1][1][0], self.conditionData[1][1][1], self.conditionData[1][0][0], self.conditionData[1][0][1], 0) == 0:
                             
                         #self.controlValue = self.conditionData[2]
                             self.updateFlag = 1
@@ -393,7 +439,7 @@ class MiDiWriter:
                     else:
                         self.startFlag = 0
                          #When Control is OFF it uses the first list in conditionData to set gesture and threshold
-                        if self.gestureThreshold(self.conditionData[0][0][0], self.conditionData[0][0][0], self.conditionData[0][1][0], self.conditionData[0][1][0], 0) == 0:
+                        if self.gestureTransition(self.conditionData[0][1][0], self.conditionData[0][1][1], self.conditionData[0][0][0], self.conditionData[0][0][1], 0) == 0:
                         #self.controlValue = self.conditionData[2]
                             self.updateFlag = 1
                             self.startFlag = 1
@@ -434,7 +480,7 @@ class MiDiWriter:
 ##################################################################################### 
 
         def gestureThreshold(self, gesture, threshold, startIdx):
-            print("gestureThreshold")
+            log.debug("gestureThreshold")
             #startIdx counts back from the last element in the list
             # print(f"gesture: {gesture}")
             # print(f"Value: {threshold}")
@@ -444,24 +490,11 @@ class MiDiWriter:
             #       held for a threshold (conditionData[1])
             #       writes conditionData[3] to self.value
             
-            #Get index of starting point
-            lenPred = len(self.predictions)
-            #print(f"Predictions Length: {lenPred}")
-            if lenPred < threshold:
-                #startIdx = startIdx
+            #Counted in O(1) from the shared GestureWindow instead of rescanning the last threshold predictions
+            #Checks the threshold predictions ending startIdx before the newest - the old scan took the last startIdx + threshold
+            #Same noise budget as before: one in ten (int(threshold/10)) for 90% neural network accuracy
+            if not self.gestureWindow.held(gesture, threshold, startIdx):
                 return -1
-            else:
-                loopIdx =  lenPred-(startIdx + threshold)
-
-            #limit noise
-            noisebudget = int(threshold/10) #All one in ten errors (for 90% neural network accuracy)
-            noiseCount = 0
-            for i in range(loopIdx,lenPred):
-                #print(f"self.predictions[i]: {self.predictions[i]}")
-                if self.predictions[i] != gesture:
-                    noiseCount += 1
-                    if noiseCount >= noisebudget:
-                        return -1
             self.ToFEnable = 1    
             return 0
         
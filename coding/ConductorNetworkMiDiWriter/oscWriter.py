@@ -1,14 +1,12 @@
-import socketClient
-import NeuralNetwork
 import numpy as np
 import pythonosc
 import os.path
-import dill
 import socket
 import struct
 import time
 import threading
 from threading import Thread
+from predictionRing import PredictionRing
 
 
 ### Almost there! 
@@ -17,16 +15,16 @@ from threading import Thread
 
 class OSCWriter:
 
-    def __init__(self, *, host="127.0.0.1", port="4000",predictions=[]):
+    def __init__(self, *, host="127.0.0.1", port="4000",predictions=None):
         self.host = host
         self.port = port
-        self.predictions = predictions
         self.ToFEnable = 0
-        self.memorySize = 10000 #How many samples to save before purging
-        self.memorySizeMin = 100 #How many predictions to keep on purge
+        self.memorySize = 10000 #How many predictions to keep
+        #One prediction history shared with every address (pass a PredictionRing to share it with another writer too)
+        self.predictions = predictions if isinstance(predictions, PredictionRing) else PredictionRing(self.memorySize, predictions)
 
     class Address:
-        def __init__(self, *, address="/", ToFEnable=0, updateFlag=0, predictions=[], conditionType=0, conditionData=[], value=-1):
+        def __init__(self, *, address="/", ToFEnable=0, updateFlag=0, predictions=None, conditionType=0, conditionData=None, value=-1):
             self.address = address
             self.updateFlag = updateFlag
             self.conditionType = conditionType 
@@ -34,9 +32,9 @@ class OSCWriter:
             #       checks for a gesture (conditionData[0]) 
             #       held for a threshold (conditionData[1])
             #       writes conditionData[3] to self.value
-            self.conditionData = conditionData   ##
+            self.conditionData = conditionData if conditionData is not None else []   ##
             self.value = value
-            self.predictions = predictions
+            self.predictions = predictions if predictions is not None else PredictionRing()
             self.ToFEnable = ToFEnable #IF 1 TOF sensor is enabled when address conditions are met
 
         
@@ -65,26 +63,17 @@ class OSCWriter:
             if self.value == self.conditionData[2]:
                 #No need to update if the value is already set
                 return - 1
-            lenPred = len(self.predictions)
-            #print(f"Predictions Length: {lenPred}")
-            if lenPred < threshold:
-                startIdx = 0
-            else:
-                startIdx = lenPred-threshold
-
-            for i in range(startIdx,lenPred):
-                #print(f"self.predictions[i]: {self.predictions[i]}")
-                if self.predictions[i] != gesture:
-                    return -1
+            #Zero-copy view of the last threshold predictions (all of them while there are fewer)
+            if np.count_nonzero(self.predictions.window(threshold) != gesture):
+                return -1
             self.ToFEnable = 1    
             return 0
 
     def getPredictions(self, prediction):
         # Called in socketClient after prediction has been made 
         # Hands prediction data to the OSCWriter
-        self.predictions.append(prediction)
+        self.predictions.append(prediction)    #The ring overwrites the oldest prediction once memorySize are kept
         self.conductor()
-        self.garbageMan()      #Reset predictions when it goes above "self.memorySize"
 
     def sendOSC(self, value, address):
         print("sendOSC")
@@ -107,15 +96,6 @@ class OSCWriter:
        
         # OSCsock.close()
 
-    def garbageMan(self):
-        length = len(self.predictions)
-        if length > self.memorySize:
-            newPredict = []
-            for i in range(length - self.memorySizeMin, length):
-                newPredict[i] = self.predictions[i]
-            
-            self.predictions = newPredict
-
     ##TODO create makeAddress method
 
     def conductor(self):
@@ -0,0 +1,372 @@
+"""
+Description:
+This Python script defines a three stage real-time pipeline: acquisition -> inference -> MIDI dispatch. Each stage runs in its own thread and
+hands its output to the next stage through a bounded queue, so receiving the next sample from The Conductor overlaps with predicting the
+last one and with sending MIDI for the one before that. Before this, socketClient.GetData.socketLoop and ux.UX.predictSample received,
+decoded, predicted and called writer.getPredictions strictly one after another.
+
+Queue policies (what a full queue does when the stage after it falls behind):
+- BLOCK: The stage putting into the queue waits for room (backpressure). Nothing is lost, acquisition slows down to the pace of inference.
+- DROP_OLDEST: The oldest queued item is dropped to make room. The newest sample always gets through - use this when playing live.
+
+Classes and Methods:
+- StageQueue: Bounded, thread safe FIFO with one of the policies above.
+    - put(): Queues an item. Returns False if it could not be queued (BLOCK timed out or the queue is closed).
+    - get(): Returns the oldest item, or None on timeout or once the queue is closed and empty.
+    - close(): Wakes every waiting thread. Later puts are refused.
+- LatencyStats: Latency counters for one stage: count, mean and max, plus p50/p95/p99 over the most recent samples.
+    - add(): Records one latency in ns.
+    - summary(): Returns the counters as a dict (ms).
+- Pipeline: Runs the three stages.
+    - __init__(): Initializes the pipeline with parameters:
+        - source: Callable returning one raw sample frame (bytes / memoryview), or -1 / None / empty when nothing arrived.
+        - predict: Callable taking the (1, packetSize * numSensors * 3) model input and returning the predicted hand position.
+        - dispatch: Callable taking (prediction, ToFByte), eg. MiDiWriter.getPredictions.
+        - numSensors / packetSize: Shape of the model input. The oldest sample comes first, like the rolled packetData in socketClient.
+        - queueSize: Capacity of the acquisition -> inference and inference -> dispatch queues.
+        - policy: BLOCK or DROP_OLDEST.
+        - setToF: Callable switching the source between the 0xFF and 0x0F prompts, or None if it cannot. Only the acquisition thread
+            calls it, between two frames, so a prompt and the length read for it always agree.
+        - ToFEnable: Whether the source starts with the ToF byte (None - work it out from each frame's size).
+        - reconnect: Callable the acquisition thread runs when source() returns nothing, returning True once the connection is back
+            (None - just wait retryDelay and try again).
+    - start(): Starts the three stage threads.
+    - stop(): Stops the stages and waits for them to finish.
+    - requestToF(): Asks for the ToF byte on (or off) from the next sample on - safe to call from any stage.
+    - waitPrediction(): Blocks until a new prediction has been dispatched and returns (prediction, ToFByte).
+    - pollPrediction(): Returns ((prediction, ToFByte), isNew) straight away - for callers that must not block, eg. the GUI event loop.
+    - stats(): Returns per stage latency summaries and the queue counters.
+    - printStats(): Prints stats() as a table.
+
+Functions:
+- fromDataStream(): Builds a Pipeline around a socketClient / socketClientUx GetData object and a MiDiWriter / OSCWriter.
+
+Latency counters (stats()):
+- receive: Time spent in source() - waiting for the sample from The Conductor (or the SensorStream ring buffer).
+- decode: Decoding the frame and shifting it into the model input window.
+- inferenceQueue / dispatchQueue: Time an item waited in the queue in front of the stage.
+- inference / dispatch: Time spent in predict() / dispatch().
+- endToEnd: Sample received -> dispatch() returned (sample-to-MIDI latency).
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+import instrument
+import sensorStream
+
+log = instrument.getLogger(__name__)
+
+
+BLOCK = 'block'
+DROP_OLDEST = 'dropOldest'
+
+
+class StageQueue:
+
+    def __init__(self, capacity=4, policy=DROP_OLDEST):
+        if policy not in (BLOCK, DROP_OLDEST):
+            raise ValueError(f'Unknown queue policy {policy!r} - use pipeline.BLOCK or pipeline.DROP_OLDEST')
+        self.capacity = capacity
+        self.policy = policy
+        self.items = collections.deque()
+        self.lock = threading.Lock()
+        self.notEmpty = threading.Condition(self.lock)
+        self.notFull = threading.Condition(self.lock)
+        self.closed = False
+        self.putCount = 0       #Items queued
+        self.dropCount = 0      #Items dropped to make room (DROP_OLDEST)
+        self.blockCount = 0     #Puts that had to wait for room (BLOCK)
+        self.highWater = 0      #Most items queued at once
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item, timeout=None):
+        with self.lock:
+            if self.closed:
+                return False
+            if len(self.items) >= self.capacity:
+                if self.policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.dropCount += 1
+                else:
+                    self.blockCount += 1
+                    if not self.notFull.wait_for(lambda: self.closed or len(self.items) < self.capacity, timeout) or self.closed:
+                        return False
+            self.items.append(item)
+            self.putCount += 1
+            self.highWater = max(self.highWater, len(self.items))
+            self.notEmpty.notify()
+            return True
+
+    def get(self, timeout=None):
+        with self.lock:
+            if not self.notEmpty.wait_for(lambda: self.closed or self.items, timeout) or not self.items:
+                return None
+            item = self.items.popleft()
+            self.notFull.notify()
+            return item
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.notEmpty.notify_all()
+            self.notFull.notify_all()
+
+    def counters(self):
+        return {'policy': self.policy, 'capacity': self.capacity, 'queued': self.putCount, 'dropped': self.dropCount,
+                'blocked': self.blockCount, 'highWater': self.highWater}
+
+
+class LatencyStats:
+
+    def __init__(self, window=4096):
+        self.samples = np.zeros(window, dtype=np.int64)    #Ring of the most recent latencies (ns) for the percentiles
+        self.count = 0
+        self.totalNs = 0
+        self.maxNs = 0
+
+    def add(self, ns):
+        self.samples[self.count % self.samples.shape[0]] = ns
+        self.count += 1
+        self.totalNs += ns
+        if ns > self.maxNs:
+            self.maxNs = ns
+
+    def summary(self):
+        if self.count == 0:
+            return {'count': 0}
+        recent = self.samples[:min(self.count, self.samples.shape[0])]
+        p50, p95, p99 = np.percentile(recent, (50, 95, 99)) / 1e6
+        return {'count': self.count, 'meanMs': self.totalNs / self.count / 1e6, 'p50Ms': p50, 'p95Ms': p95, 'p99Ms': p99,
+                'maxMs': self.maxNs / 1e6}
+
+
+class Pipeline:
+
+    STAGES = ('receive', 'decode', 'inferenceQueue', 'inference', 'dispatchQueue', 'dispatch', 'endToEnd')
+
+    def __init__(self, source, predict, dispatch, *, numSensors=4, packetSize=1, queueSize=4, policy=DROP_OLDEST, retryDelay=0.05,
+                 setToF=None, ToFEnable=None, reconnect=None):
+        self.source = source
+        self.predict = predict
+        self.dispatch = dispatch
+        self.setToF = setToF
+        self.reconnect = reconnect
+        self.ToFEnable = ToFEnable       #Setting the source is using - only the acquisition thread changes it
+        self.requestedToF = ToFEnable    #Setting asked for by requestToF(), applied between frames
+        self.numSensors = numSensors
+        self.packetSize = packetSize
+        self.retryDelay = retryDelay     #Wait after source() returns nothing so a dead connection doesn't spin
+        self.inferenceQueue = StageQueue(queueSize, policy)
+        self.dispatchQueue = StageQueue(queueSize, policy)
+        self.latency = {stage: LatencyStats() for stage in self.STAGES}
+        self.threads = []
+        self.running = False
+        self.sampleCount = 0     #Samples received
+        self.emptyCount = 0      #source() calls that returned nothing
+        self.errorCount = 0      #Exceptions caught in source() / decoding, predict() and dispatch()
+        self.lastPrediction = None
+        self.dispatchCount = 0
+        self.readCount = 0       #dispatchCount when waitPrediction() last returned
+        self.dispatched = threading.Condition()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.threads = [threading.Thread(target=target, name=name, daemon=True) for name, target in (
+            ('pipelineAcquire', self._acquireLoop), ('pipelineInference', self._inferenceLoop), ('pipelineDispatch', self._dispatchLoop))]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        self.inferenceQueue.close()
+        self.dispatchQueue.close()
+        with self.dispatched:
+            self.dispatched.notify_all()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)    #The acquisition thread may be blocked in source() until its socket times out
+        self.threads = []
+
+    def requestToF(self, ToFEnable):
+        #One attribute write - the acquisition thread picks it up before its next source() call
+        self.requestedToF = bool(ToFEnable)
+
+    def waitPrediction(self, timeout=None):
+        #Returns the newest (prediction, ToFByte) dispatched since the last call, or the last one again on timeout (None before the first)
+        with self.dispatched:
+            self.dispatched.wait_for(lambda: not self.running or self.dispatchCount > self.readCount, timeout)
+            self.readCount = self.dispatchCount
+            return self.lastPrediction
+
+    def pollPrediction(self):
+        #Non-blocking waitPrediction(): isNew is False when nothing was dispatched since the last call (the prediction is stale)
+        with self.dispatched:
+            isNew = self.dispatchCount > self.readCount
+            self.readCount = self.dispatchCount
+            return self.lastPrediction, isNew
+
+    def _acquireLoop(self):
+        window = np.zeros([1, self.packetSize * self.numSensors * 3])
+        sampleSize = self.numSensors * 3
+        filled = 0
+        while self.running:
+            #Read the requested ToF setting once per sample and apply it before prompting, never in the middle of a frame
+            ToFEnable = self.requestedToF
+            if ToFEnable is not None and ToFEnable != self.ToFEnable:
+                if self.setToF is not None:
+                    self.setToF(ToFEnable)
+                self.ToFEnable = ToFEnable
+            startNs = time.perf_counter_ns()
+            try:
+                frame = self.source()
+                receivedNs = time.perf_counter_ns()
+                if frame is None or isinstance(frame, int) or len(frame) == 0:
+                    self.emptyCount += 1
+                    self._waitForSource()
+                    continue
+                acc, ToF = sensorStream.decodeFrames(frame, self.numSensors, ToFEnable=self.ToFEnable)
+            except Exception as err:
+                #eg. a refused connect or a socket.timeout in a GetData source, or a frame of the wrong size
+                self.errorCount += 1
+                log.error('Pipeline acquisition error: %r', err)
+                instrument.count('pipeline.acquireError')
+                self._waitForSource()
+                continue
+            self.latency['receive'].add(receivedNs - startNs)
+            self.sampleCount += 1
+
+            #Shift the new sample in at the end of the window (oldest sample first)
+            window[0, :-sampleSize] = window[0, sampleSize:]
+            window[0, -sampleSize:] = acc.reshape(-1)
+            filled = min(filled + 1, self.packetSize)
+            if filled < self.packetSize:
+                continue    #Wait for a full packet before the first prediction
+
+            decodedNs = time.perf_counter_ns()
+            self.latency['decode'].add(decodedNs - receivedNs)
+            self.inferenceQueue.put((receivedNs, decodedNs, window.copy(), int(ToF[0])))    #Copy - the window keeps shifting
+
+    def _waitForSource(self):
+        #After an empty read or a source error: reconnect when the source can, otherwise wait retryDelay so a dead connection doesn't spin
+        try:
+            if self.reconnect is not None and self.reconnect():
+                return
+        except Exception as err:
+            log.error('Pipeline reconnect error: %r', err)
+            instrument.count('pipeline.reconnectError')
+        time.sleep(self.retryDelay)
+
+    def _inferenceLoop(self):
+        while self.running:
+            item = self.inferenceQueue.get()
+            if item is None:
+                continue
+            receivedNs, queuedNs, NNInput, ToFByte = item
+            startNs = time.perf_counter_ns()
+            self.latency['inferenceQueue'].add(startNs - queuedNs)
+            try:
+                prediction = self.predict(NNInput)
+            except Exception as err:
+                self.errorCount += 1
+                log.error('Pipeline inference error: %r', err)
+                instrument.count('pipeline.inferenceError')
+                continue
+            predictedNs = time.perf_counter_ns()
+            self.latency['inference'].add(predictedNs - startNs)
+            self.dispatchQueue.put((receivedNs, predictedNs, prediction, ToFByte))
+
+    def _dispatchLoop(self):
+        while self.running:
+            item = self.dispatchQueue.get()
+            if item is None:
+                continue
+            receivedNs, queuedNs, prediction, ToFByte = item
+            startNs = time.perf_counter_ns()
+            self.latency['dispatchQueue'].add(startNs - queuedNs)
+            try:
+                self.dispatch(prediction, ToFByte)
+            except Exception as err:
+                self.errorCount += 1
+                log.error('Pipeline dispatch error: %r', err)
+                instrument.count('pipeline.dispatchError')
+                continue
+            doneNs = time.perf_counter_ns()
+            self.latency['dispatch'].add(doneNs - startNs)
+            self.latency['endToEnd'].add(doneNs - receivedNs)
+            with self.dispatched:
+                self.lastPrediction = (prediction, ToFByte)
+                self.dispatchCount += 1
+                self.dispatched.notify_all()
+
+    def stats(self):
+        return {
+            'samples': self.sampleCount,
+            'dispatched': self.dispatchCount,
+            'empty': self.emptyCount,
+            'errors': self.errorCount,
+            'inferenceQueue': self.inferenceQueue.counters(),
+            'dispatchQueue': self.dispatchQueue.counters(),
+            'latency': {stage: stats.summary() for stage, stats in self.latency.items()},
+        }
+
+    def printStats(self):
+        stats = self.stats()
+        print(f"Pipeline: {stats['samples']} samples, {stats['dispatched']} dispatched, {stats['errors']} errors, "
+              f"dropped {stats['inferenceQueue']['dropped']} before inference / {stats['dispatchQueue']['dropped']} before dispatch")
+        for stage, summary in stats['latency'].items():
+            if summary['count']:
+                print(f"{stage:>16}: p50 {summary['p50Ms']:7.3f} ms, p95 {summary['p95Ms']:7.3f} ms, "
+                      f"p99 {summary['p99Ms']:7.3f} ms, max {summary['maxMs']:7.3f} ms")
+
+
+def fromDataStream(dataStream, writer, *, queueSize=2, policy=DROP_OLDEST):
+    #Wires a GetData object (socketClient or socketClientUx) to a writer: receiveBytes -> realTimePrediction -> writer.getPredictions
+    #Short queues by default - when the writer falls behind, a deep DROP_OLDEST queue still adds queueSize predictions of latency
+    import NeuralNetwork
+
+    def predict(NNInput):
+        return NeuralNetwork.realTimePrediction(NNInput, dataStream.pathPreface)[0]
+
+    def dispatch(prediction, ToFByte):
+        dataStream.ToFByte = ToFByte
+        if writer.ToFEnable and 0 < ToFByte < 128:    #Valid ToF data
+            writer.ToFByte = ToFByte
+        writer.getPredictions(prediction)
+        #The writer decides whether the next samples carry the ToF byte (0x0F prompt) or not (0xFF)
+        #Only posted here - receiveBytes sends dataTx and then reads extraRxByte more bytes, so they are changed between frames
+        pipe.requestToF(writer.ToFEnable)
+
+    def setToF(ToFEnable):
+        #Called by the acquisition thread between two receiveBytes calls
+        dataStream.extraRxByte = 1 if ToFEnable else 0
+        dataStream.dataTx = bytes([sensorStream.PROMPT_ACC_TOF if ToFEnable else sensorStream.PROMPT_ACC])
+
+    def reconnect(attempts=4):
+        #What socketClientUx.GetData.getSample did after an empty read: reopen the socket, a second between failed attempts
+        log.warning('No data received - resetting the socket connection')
+        instrument.count('pipeline.reconnect')
+        for attempt in range(attempts):
+            if not pipe.running:
+                return False
+            dataStream.sock.close()
+            if dataStream.makeSockConnection(dataStream.host, dataStream.port) == 1:
+                log.info('Reconnected to The Conductor!')
+                return True
+            time.sleep(1)
+        log.error('Could not reconnect to The Conductor after %d attempts', attempts)
+        instrument.count('pipeline.reconnectFailed')
+        return False
+
+    #socketClient.GetData opens a new socket for every sample, only socketClientUx keeps one open that has to be reset
+    pipe = Pipeline(dataStream.receiveBytes, predict, dispatch, numSensors=dataStream.numSensors, packetSize=dataStream.packetSize,
+                    queueSize=queueSize, policy=policy, setToF=setToF, ToFEnable=bool(dataStream.extraRxByte),
+                    reconnect=reconnect if hasattr(dataStream, 'makeSockConnection') else None)
+    return pipe
@@ -0,0 +1,174 @@
+"""
+Description:
+This Python script defines an append-only binary log for real-time predictions. It replaces loading, appending to and re-saving the whole
+confidences.npy / predictions.npy files on every prediction (O(n) disk I/O per prediction and O(n^2) over a session).
+
+File layout:
+- Header (16 bytes): magic b'CNDPRED1', uint32 record layout version, uint32 numClasses
+- Records (fixed size, little endian, packed):
+    - timeNs: int64 time.time_ns() when the prediction was logged
+    - prediction: int32 final prediction (after the confidence threshold)
+    - confidences: float32[numClasses] softmax output of the model
+
+Classes and Methods:
+- PredictionLog: Appends records from a background writer thread.
+    - __init__(): Initializes the log with parameters:
+        - path: Log file (created if missing, appended to if it exists with the same numClasses).
+        - numClasses: Number of model outputs.
+        - batchSize: Records buffered before a write.
+        - flushInterval: Longest time in seconds a record waits before it is written.
+    - append(): Queues one prediction. Never blocks on disk.
+    - flush(): Waits until everything queued so far is on disk.
+    - close(): Flushes and stops the writer thread.
+
+Functions:
+- recordDtype(): The NumPy structured dtype of one record.
+- readPredictionLog(): Memory-maps a log back into NumPy arrays (timeNs, predictions, confidences) without copying it.
+"""
+
+import atexit
+import os.path
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+MAGIC = b'CNDPRED1'
+VERSION = 1
+HEADER = struct.Struct('<8sII')
+
+
+def recordDtype(numClasses):
+    return np.dtype([('timeNs', '<i8'), ('prediction', '<i4'), ('confidences', '<f4', (numClasses,))])
+
+
+def readHeader(path):
+    with open(path, 'rb') as f:
+        magic, version, numClasses = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not a prediction log (version {VERSION})')
+    return numClasses
+
+
+class PredictionLog:
+
+    def __init__(self, path, numClasses, *, batchSize=64, flushInterval=0.5):
+        self.path = path
+        self.numClasses = numClasses
+        self.dtype = recordDtype(numClasses)
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.batch = np.zeros(batchSize, dtype=self.dtype)   #Reused for every write
+        self.queue = queue.Queue()
+        self.recordCount = 0    #Records written by this instance
+        self.writeCount = 0     #Batched writes made
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            try:
+                fileClasses = readHeader(path)
+            except ValueError:
+                fileClasses = -1
+            if fileClasses != numClasses:
+                #Model changed shape (or not a log) - keep the old file and start a new one
+                print(f'Prediction log {path} does not match {numClasses} classes. Moving it to {path}.old')
+                os.replace(path, path + '.old')
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            self.file = open(path, 'ab')
+            #Drop a partly written record from an interrupted session
+            extra = (os.path.getsize(path) - HEADER.size) % self.dtype.itemsize
+            if extra:
+                self.file.truncate(os.path.getsize(path) - extra)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(HEADER.pack(MAGIC, VERSION, numClasses))
+            self.file.flush()
+
+        self.thread = threading.Thread(target=self._writerLoop, daemon=True)
+        self.thread.start()
+
+    def append(self, confidences, prediction, timeNs=None):
+        if timeNs is None:
+            timeNs = time.time_ns()
+        self.queue.put((timeNs, prediction, np.array(confidences, dtype=np.float32)))   #Copy - the caller may reuse its array
+
+    def flush(self):
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.file.close()
+
+    def _writeBatch(self, count):
+        if count:
+            self.file.write(self.batch[:count].data)
+            self.file.flush()
+            self.recordCount += count
+            self.writeCount += 1
+
+    def _writerLoop(self):
+        count = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = 'timeout'
+
+            if item == 'timeout' or item is None or isinstance(item, threading.Event):
+                self._writeBatch(count)
+                count = 0
+                deadline = None
+                if item is None:
+                    return
+                if isinstance(item, threading.Event):
+                    item.set()
+                continue
+
+            record = self.batch[count]
+            record['timeNs'], record['prediction'] = item[0], item[1]
+            record['confidences'] = item[2]
+            count += 1
+            if deadline is None:
+                deadline = time.monotonic() + self.flushInterval
+            if count == self.batchSize:
+                self._writeBatch(count)
+                count = 0
+                deadline = None
+
+
+def readPredictionLog(path):
+    #Returns (timeNs, predictions, confidences) as read-only views of a memory-mapped log
+    numClasses = readHeader(path)
+    dtype = recordDtype(numClasses)
+    records = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+    if records == 0:
+        return np.zeros(0, dtype='<i8'), np.zeros(0, dtype='<i4'), np.zeros((0, numClasses), dtype='<f4')
+    log = np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(records,))
+    return log['timeNs'], log['prediction'], log['confidences']
+
+
+openLogs = {}   #One PredictionLog per path, closed at exit so queued records are written
+
+def getPredictionLog(path, numClasses):
+    log = openLogs.get(path)
+    if log is None or log.numClasses != numClasses:
+        if log is not None:
+            log.close()
+        log = openLogs[path] = PredictionLog(path, numClasses)
+    return log
+
+@atexit.register
+def closeAll():
+    for log in openLogs.values():
+        log.close()
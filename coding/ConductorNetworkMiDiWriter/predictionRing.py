@@ -0,0 +1,83 @@
+"""
+Description:
+This Python script defines the prediction history OSCWriter shares with its addresses. The writers used to append every prediction
+to a Python list and rebuild the list in garbageMan() once it grew past memorySize (OSCWriter's garbageMan indexed into an empty list
+and crashed), and the predictions=[] default argument was one list shared by every writer created without one. MiDiWriter's controls
+only need running counts, so its history is its gestureWindow.GestureWindow instead.
+
+PredictionRing is a fixed-capacity NumPy ring buffer: append is O(1), memory stays at two arrays of capacity integers whatever the
+run length, and window() returns the last n predictions as a read-only view of the buffer (no copy, no list slicing).
+
+How it works: every prediction is written twice, at slot i and at slot i + capacity of a buffer twice the capacity. Any run of up to
+capacity consecutive predictions is then one contiguous slice of the buffer, so a window never has to be stitched together across the
+wrap-around.
+
+Classes and Methods:
+- PredictionRing: Fixed-capacity history of predictions.
+    - __init__(): Initializes the ring with parameters:
+        - capacity: Most predictions kept (the writer's memorySize). Older predictions are overwritten.
+        - predictions: Optional predictions to start with (oldest first).
+        - dtype: NumPy integer type of the buffer.
+    - append(): Adds the newest prediction.
+    - extend(): Appends several predictions, oldest first.
+    - window(): Read-only view of the last n predictions (oldest first), ending startIdx predictions before the newest.
+    - tolist(): The kept predictions as a list (a copy, oldest first).
+    - clear(): Forgets every prediction.
+    - len(ring), ring[-1], ring[i]: Like a list of the kept predictions.
+"""
+
+import numpy as np
+
+
+class PredictionRing:
+
+    def __init__(self, capacity=1000, predictions=None, *, dtype=np.int32):
+        if capacity < 1:
+            raise ValueError('PredictionRing capacity must be at least 1')
+        self.capacity = capacity
+        self.buffer = np.zeros(2 * capacity, dtype=dtype)
+        self.readOnly = self.buffer.view()     #window() slices this view so callers cannot write into the history
+        self.readOnly.flags.writeable = False
+        self.total = 0    #Predictions appended since the ring was created / cleared
+        if predictions is not None:
+            self.extend(predictions)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, prediction):
+        slot = self.total % self.capacity
+        self.buffer[slot] = prediction
+        self.buffer[slot + self.capacity] = prediction
+        self.total += 1
+
+    def extend(self, predictions):
+        for prediction in predictions:
+            self.append(prediction)
+
+    def window(self, n=None, startIdx=0):
+        #startIdx counts back from the newest prediction (0 = the window ends with the newest one)
+        #Asking for more than is kept returns what there is
+        kept = len(self) - startIdx
+        if kept <= 0:
+            return self.readOnly[:0]
+        n = kept if n is None else max(min(n, kept), 0)
+        end = (self.total - startIdx - 1) % self.capacity + self.capacity + 1    #Just past the copy of the window's newest prediction in the upper half
+        return self.readOnly[end - n:end]
+
+    def __getitem__(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('PredictionRing index out of range')
+        return int(self.buffer[(self.total - length + index) % self.capacity])
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return self.window().tolist()
+
+    def clear(self):
+        self.total = 0
@@ -0,0 +1,284 @@
+"""
+Description:
+This Python script defines a SensorStream class that keeps one long lived TCP connection open to The Conductor's ESP32 and streams samples
+into a bounded ring buffer. The ESP32 (ConductorTinyS3/src/main.cpp) answers every prompt byte on an open connection, so instead of opening
+a new socket for every sample (one TCP handshake per 12-13 bytes) the stream thread keeps prompting on the same socket and the prediction
+loop reads finished samples out of the ring buffer.
+
+Functions:
+- decodeFrames(): Decodes one frame or a batch of N frames in a single NumPy call into an (N, numSensors, 3) accelerometer array
+    (scaled to +-1 for prediction or raw for training) and an (N,) array of ToF bytes (-1 when the frames carry no ToF byte).
+    Raises ValueError when the frame size cannot be worked out - pass ToFEnable for flat buffers whose length fits both sizes.
+
+Classes and Methods:
+- FrameReader: Reads whole sample frames with recv_into on one preallocated buffer instead of one sock.recv(1) per byte.
+    - readFrame(): Receives exactly one frame (handling short reads) and returns a memoryview of it. The view is only valid until the next call.
+- SampleRing: Fixed size, thread safe ring buffer of raw sample frames. When it is full the oldest sample is dropped.
+    - push(): Adds one raw frame (numSensors * 3 bytes, plus the ToF byte when present).
+    - get(): Blocks until a sample is available and returns the oldest unread one.
+    - latest(): Returns the newest sample and discards anything older (lowest latency for real-time prediction).
+    - clear(): Empties the buffer.
+- SensorStream: Owns the socket and the stream thread.
+    - __init__(): Initializes the stream with parameters:
+        - host / port: Address of The Conductor.
+        - numSensors: Number of accelerometers (3 bytes each).
+        - bufferSize: Number of samples held in the ring buffer.
+        - ToFEnable: Ask for the time of flight byte (0x0F prompt) instead of accelerometers only (0xFF prompt).
+        - backoffStart / backoffMax: Reconnect backoff in seconds, doubled after each failed attempt.
+    - start(): Starts the stream thread.
+    - stop(): Stops the stream thread and closes the socket.
+    - setToF(): Switches between the 0xFF and 0x0F prompts without dropping the connection.
+    - getSample(): Returns the next sample as bytes.
+
+Note: The ESP32 only sends data when prompted, so "streaming" means prompting continuously on one connection rather than the device pushing data.
+"""
+
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+import instrument
+
+log = instrument.getLogger(__name__)
+
+
+PROMPT_ACC = 0xFF      #Accelerometers only
+PROMPT_ACC_TOF = 0x0F  #Accelerometers plus the ToF byte
+PROMPT_TEXT = 0x22     #Client is going to send text (network credentials)
+
+
+def decodeFrames(frames, numSensors, *, ToFEnable=None, scale=True):
+    #frames is bytes / bytearray / memoryview of N back to back frames, or a uint8/int8 array of shape (N, frameSize)
+    #If ToFEnable is None the frame size is worked out from the data: the row length of a 2D array, or for a flat buffer the one
+    #frame size (numSensors * 3 or numSensors * 3 + 1) its length is a multiple of
+    if isinstance(frames, np.ndarray):
+        raw = frames.view(np.int8)
+    else:
+        raw = np.frombuffer(frames, dtype=np.int8)
+
+    accSize = numSensors * 3
+    if ToFEnable is None:
+        if raw.ndim == 2:
+            ToFEnable = raw.shape[1] == accSize + 1
+        else:
+            withToF = raw.size % (accSize + 1) == 0
+            withoutToF = raw.size % accSize == 0
+            if withToF == withoutToF:
+                #eg. 156 bytes is 12 frames with ToF or 13 without
+                raise ValueError(f'Cannot tell the frame size of {raw.size} bytes for {numSensors} sensors - pass ToFEnable')
+            ToFEnable = withToF
+    raw = raw.reshape(-1, accSize + (1 if ToFEnable else 0))
+
+    acc = raw[:, :accSize].reshape(-1, numSensors, 3)
+    if scale:
+        acc = acc / 127     #Scale to +-1 for the neural network
+    else:
+        acc = acc.astype(np.float64)
+
+    if ToFEnable:
+        ToF = raw[:, accSize].astype(np.int16)    #ToF is read as a signed byte like the rest of the sample
+    else:
+        ToF = np.full(raw.shape[0], -1, dtype=np.int16)
+
+    return acc, ToF
+
+
+class FrameReader:
+
+    def __init__(self, numSensors=4):
+        self.buffer = bytearray(numSensors * 3 + 1)    #Big enough for a sample with the ToF byte
+        self.view = memoryview(self.buffer)
+        self.frameViews = {}  #One cached view per frame size so reading a sample allocates nothing
+        self.recvCalls = 0    #recv_into calls made - one per frame unless the network splits it
+
+    def readFrame(self, sock, size):
+        #Receives exactly size bytes from sock into the preallocated buffer
+        #Returns a zero-copy view that is overwritten by the next readFrame() call
+        if size > len(self.buffer):
+            #numSensors changed after the reader was made
+            self.frameViews = {}
+            self.view.release()
+            self.buffer = bytearray(size)
+            self.view = memoryview(self.buffer)
+
+        got = sock.recv_into(self.buffer, size)
+        self.recvCalls += 1
+        while got < size:
+            #Short read - the frame was split, keep filling from where we stopped
+            if got == 0:
+                raise ConnectionError("Connection closed by The Conductor")
+            n = sock.recv_into(self.view[got:size], size - got)
+            self.recvCalls += 1
+            if n == 0:
+                raise ConnectionError("Connection closed by The Conductor")
+            got += n
+
+        frameView = self.frameViews.get(size)
+        if frameView is None:
+            frameView = self.frameViews[size] = self.view[:size]
+        return frameView
+
+
+class SampleRing:
+
+    def __init__(self, capacity=64, frameSize=12):
+        self.capacity = capacity
+        self.frameSize = frameSize    #Largest frame stored (numSensors * 3 + 1 ToF byte)
+        self.frames = np.zeros([capacity, frameSize], dtype=np.uint8)
+        self.lengths = np.zeros([capacity,], dtype=np.int16)
+        self.head = 0      #Next slot to write
+        self.count = 0     #Number of unread samples
+        self.dropped = 0   #Samples overwritten before they were read
+        self.lock = threading.Lock()
+        self.notEmpty = threading.Condition(self.lock)
+
+    def __len__(self):
+        return self.count
+
+    def push(self, frame):
+        with self.lock:
+            frameLen = len(frame)
+            self.frames[self.head, :frameLen] = np.frombuffer(frame, dtype=np.uint8)
+            self.lengths[self.head] = frameLen
+            self.head = (self.head + 1) % self.capacity
+            if self.count == self.capacity:
+                self.dropped += 1   #Overwrote the oldest sample
+            else:
+                self.count += 1
+            self.notEmpty.notify()
+
+    def _readSlot(self, slot):
+        return self.frames[slot, :self.lengths[slot]].tobytes()
+
+    def get(self, timeout=None):
+        #Returns the oldest unread frame or None on timeout
+        with self.lock:
+            if not self.notEmpty.wait_for(lambda: self.count > 0, timeout):
+                return None
+            slot = (self.head - self.count) % self.capacity
+            self.count -= 1
+            return self._readSlot(slot)
+
+    def latest(self, timeout=None):
+        #Returns the newest frame and marks everything older as read
+        with self.lock:
+            if not self.notEmpty.wait_for(lambda: self.count > 0, timeout):
+                return None
+            self.count = 0
+            return self._readSlot((self.head - 1) % self.capacity)
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+
+
+class SensorStream:
+
+    def __init__(self, *, host="192.168.4.1", port=80, numSensors=4, bufferSize=64, ToFEnable=False, connectTimeout=2.0, backoffStart=0.1, backoffMax=5.0):
+        self.host = host
+        self.port = port
+        self.numSensors = numSensors
+        self.ToFEnable = ToFEnable
+        self.connectTimeout = connectTimeout
+        self.backoffStart = backoffStart
+        self.backoffMax = backoffMax
+        self.ring = SampleRing(bufferSize, numSensors * 3 + 1)
+        self.reader = FrameReader(numSensors)
+        self.sock = None
+        self.thread = None
+        self.running = False
+        self.connected = threading.Event()
+        self.sampleCount = 0     #Samples received since start()
+        self.reconnectCount = 0  #Connections made after the first one
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._streamLoop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._closeSocket()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def setToF(self, enable):
+        #Takes effect on the next prompt
+        self.ToFEnable = bool(enable)
+
+    def frameSize(self, ToFEnable=None):
+        if ToFEnable is None:
+            ToFEnable = self.ToFEnable
+        return self.numSensors * 3 + (1 if ToFEnable else 0)
+
+    def getSample(self, timeout=None, newest=False):
+        #Returns one sample as bytes, or -1 if nothing arrived before the timeout
+        if newest:
+            frame = self.ring.latest(timeout)
+        else:
+            frame = self.ring.get(timeout)
+        if frame is None:
+            return -1
+        return frame
+
+    def _closeSocket(self):
+        sock = self.sock
+        self.sock = None
+        self.connected.clear()
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _connect(self):
+        #Keeps trying to connect with exponential backoff until it works or stop() is called
+        backoff = self.backoffStart
+        while self.running:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=self.connectTimeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)   #Prompts are one byte, don't let Nagle hold them back
+                sock.settimeout(self.connectTimeout)
+                self.sock = sock
+                self.connected.set()
+                return True
+            except OSError as err:
+                log.warning("TCP/IP Socket Error: %s. Retrying in %.2fs", err, backoff)
+                instrument.count('sensorStream.connectError')
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.backoffMax)
+        return False
+
+    def _streamLoop(self):
+        firstConnect = True
+        while self.running:
+            if not self._connect():
+                break
+            if not firstConnect:
+                self.reconnectCount += 1
+            firstConnect = False
+
+            #stop() sets self.sock to None and closes the socket - using it through this local then raises OSError, caught below
+            sock = self.sock
+            if sock is None:
+                continue
+            try:
+                while self.running:
+                    ToFEnable = self.ToFEnable   #Read once so the prompt and the frame size agree
+                    prompt = PROMPT_ACC_TOF if ToFEnable else PROMPT_ACC
+                    sock.sendall(struct.pack("=B", prompt))
+                    self.ring.push(self.reader.readFrame(sock, self.frameSize(ToFEnable)))
+                    self.sampleCount += 1
+            except OSError as err:
+                #ConnectionError (closed by The Conductor) and socket.timeout are OSErrors too
+                if self.running:
+                    log.warning("TCP/IP Socket RX Error: %s. Reconnecting...", err)
+                    instrument.count('sensorStream.rxError')
+            self._closeSocket()
@@ -15,15 +15,18 @@ import struct
 import time
 import threading
 from threading import Thread
-import matplotlib.pyplot as plt 
 import os.path 
 import NeuralNetwork
-import dill  
-import oscWriter       
+import sensorStream
+import captureStore
+import pipeline
+import instrument
+
+log = instrument.getLogger(__name__)
 
 class GetData:
     
-    def __init__(self, *, host="192.168.100.144", port=80, packetSize=5, numSensors=4, pathPreface='data/data', labelPath="Test", label=0, getTraining=True, packetLimit=100, modelFileName="model.model", writer=oscWriter.OSCWriter()):
+    def __init__(self, *, host="192.168.100.144", port=80, packetSize=5, numSensors=4, pathPreface='data/data', labelPath="Test", label=0, getTraining=True, packetLimit=100, modelFileName="model.model", writer=None, streaming=False, bufferSize=64):
         self.host = host
         self.port = port
         self.packetSize = packetSize
@@ -46,115 +49,36 @@ class GetData:
         self.y = []
         self.dataGot = 0   #data received flag
         self.modelFileName = modelFileName
+        if writer is None:
+            import oscWriter    #Only needed when no writer is passed in
+            writer = oscWriter.OSCWriter()
         self.writer = writer
+        self.reader = sensorStream.FrameReader(self.numSensors)   #Receives a whole sample into one preallocated buffer
+        self.pipeline = None   #pipeline.Pipeline while predicting (predictLoop)
+        self.stream = None     #sensorStream.SensorStream when streaming - one long lived connection instead of connect-per-sample
+        if streaming:
+            self.stream = sensorStream.SensorStream(host=self.host, port=self.port, numSensors=self.numSensors, bufferSize=bufferSize)
+            self.stream.start()
 
     def processData(self, binaryData, recvCount):
         #print(f'processData()')
-        print(f'binaryData: {binaryData}')
-
-        #packetStartMS = int(time() * 1000)
-        #global processCount
-
-        def formatData(binaryData, sensorIndex):
-            print(f'sensor: {sensorIndex}')
-            #print()
-            #print(f'binaryData: {binaryData}')
-            #Parse binary data and recombine into ints
-            #X Axis
-
-            # print(f'sensor: {sensorIndex}')
-            # print(f'XIndex: {0 + (sensorIndex * 3 * self.numSensors)}')
-
-            XAccTuple = struct.unpack("=b", binaryData[0 + (sensorIndex * 3)])  ##MSB is second byte in axis RX; Just a nibble
-            XAcc = XAccTuple[0]
-            #XAcc = float(int(binaryData[0 + (sensorIndex * 3 * self.numSensors)]),0)
-            print(f'XAcc Raw: {XAcc}')
-            if self.getTraining is False:
-                self.packetData[0,(self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = XAcc / 127
-            else:
-                self.packetData[0,(self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = XAcc
-
-            #Y Axis
-            YAccTuple = struct.unpack("=b", binaryData[1 + (sensorIndex * 3)])
-            YAcc = YAccTuple[0]
-            print(f'YAcc Raw: {YAcc}')
-            if self.getTraining is False:
-                self.packetData[0, 1 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = YAcc / 127
-            else:       
-                self.packetData[0, 1 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = YAcc
-
-            #Z Axis
-            ZAccTuple = struct.unpack("=b", binaryData[2 + (sensorIndex * 3)])
-            ZAcc = ZAccTuple[0]
-            print(f'ZAcc Raw: {ZAcc}')
-            if self.getTraining is False:
-                self.packetData[0, 2 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = ZAcc / 127
-            else:
-                self.packetData[0, 2 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = ZAcc
-
-            #print(f"self.dataTx: {self.dataTx}")
-            # TOF sensor
-            if self.dataTx[0] == 0x0F and sensorIndex == self.numSensors - 1:  #If ToF is enabled and we are on the last sensor - get the ToF byte
-                ToFTuple = struct.unpack("=b", binaryData[(self.numSensors * 3)])   #ToF data is the last byte
-                self.ToFByte = ToFTuple[0]
-                print(f"self.ToFByte: {self.ToFByte}")
+        #print(f'binaryData: {bytes(binaryData)}')
+        startNs = instrument.now()
+
+        if recvCount < self.packetSize:
+            #Decode the whole sample in one go: (1, numSensors, 3) accelerometer array and the ToF byte (-1 if not sent)
+            #Scaled to +-1 for prediction; training data is scaled in prepTraining()
+            acc, ToF = sensorStream.decodeFrames(binaryData, self.numSensors, scale=self.getTraining is False)
+            sampleStart = self.numSensors * 3 * recvCount
+            self.packetData[0, sampleStart:sampleStart + (self.numSensors * 3)] = acc.reshape(-1)
+
+            if self.dataTx[0] == 0x0F:  #If ToF is enabled get the ToF byte (streamed samples prompted before the switch have none)
+                self.ToFByte = int(ToF[0])
+                #print(f"self.ToFByte: {self.ToFByte}")
             else:
                 #reset ToFByte
                 self.ToFByte = -1
-
-            # XAcc = struct.unpack("=b", binaryData[1 + (sensorIndex * 3 * self.numSensors)])  ##MSB is second byte in axis RX; Just a nibble
-            # #print(f'XAcc Raw: {XAcc}')
-            # XAcc = XAcc[0] << 8
-            # #print(f'XAcc Shift: {XAcc}')
-            # XAcc1 = struct.unpack("=B", binaryData[0 + (sensorIndex * 3 * self.numSensors)])  ##LSB is first byte in axis RX; full byte
-            # if self.getTraining is False:
-            #     self.packetData[0,(self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = (XAcc + XAcc1[0]) / 2048
-            # else:
-            #     self.packetData[0,(self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = XAcc + XAcc1[0]
-            # #print(f'XAcc Final: {XAcc + XAcc1[0]}')
-
-            # #Y Axis
-            # YAcc = struct.unpack("=b", binaryData[3 + (sensorIndex * 3 * self.numSensors)])
-            # #print(f'XAcc Raw: {XAcc}')
-            # YAcc = YAcc[0] << 8
-            # #print(f'YAcc Shift: {YAcc}')
-            # YAcc1 = struct.unpack("=B", binaryData[2 + (sensorIndex * 3 * self.numSensors)])
-            # if self.getTraining is False:
-            #     self.packetData[0, 1 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = (YAcc + YAcc1[0])/2048
-            # else:       
-            #     self.packetData[0, 1 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = YAcc + YAcc1[0]
-            # #print(f'YAcc Final: {YAcc + YAcc1[0]}')
-
-            # #Z Axis
-            # ZAcc = struct.unpack("=b", binaryData[5 + (sensorIndex * 3 * self.numSensors)])
-            # #print(f'sensor: {sensorIndex}')
-            # #print(f'ZAcc Raw: {ZAcc}')
-            # ZAcc = ZAcc[0] << 8
-            # #print(f'ZAcc Shift: {ZAcc}')
-            # ZAcc1 = struct.unpack("=B", binaryData[4 + (sensorIndex * 3 * self.numSensors)])
-            # ZAcc2 = struct.unpack("=B", binaryData[4])
-            # #print(f'ZAcc1 Raw: {ZAcc1}')
-            # #print(f'ZAcc1[0]: {ZAcc1[0]}')
-            # #print(f'ZAcc2[0]: {ZAcc2[0]}')
-            # if self.getTraining is False:
-            #     self.packetData[0, 2 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = (ZAcc + ZAcc1[0]) /2048
-            # else:
-            #     self.packetData[0, 2 + (self.numSensors * 3 * recvCount) + (3 * sensorIndex)] = ZAcc + ZAcc1[0]
-            # #print(f'ZAcc final: {ZAcc + ZAcc1[0]}')
-            # #print(f'ZAcc Final: {ZAcc}')
-        
-        if recvCount < self.packetSize:
-            for i in range(self.numSensors):
-                formatData(binaryData, i)
-
-        #print(f'packet after fresh data insertion: {self.packetData}')
-
-        # if self.getTraining is False:
-        #     #scale the data to +-1
-        #     for i in range(self.packetData.shape[1]):
-        #         print(f'packetData[0, {i}] (before): {self.packetData[0,i]}') 
-        #         self.packetData[0,i] = self.packetData[0,i] / 2048
-        #         print(f'packetData[0, {i}] (scaled): {self.packetData[0,i]}')
+        instrument.record('socketClient.processData', startNs)
 
     # def receiveSample(self):
     #     #Signals the server and then receives a whole sample of data in one transmission (number of sensors * number of bytes/sensor)
@@ -193,57 +117,59 @@ class GetData:
     def receiveBytes(self):
         #print(f'receiveBytes(self)')
         #Signals the server then receives a byte from the sample
+        startNs = instrument.now()
+
+        if self.stream is not None:
+            #Streaming mode - take the newest sample from the ring buffer
+            self.stream.setToF(self.extraRxByte)
+            self.y = self.stream.getSample(timeout=2, newest=not self.getTraining)
+            if self.y == -1:
+                log.warning('No sample from stream: Waiting for The Conductor')
+                self.y = []
+                return -1
+            self.dataGot = 1
+            instrument.record('socketClient.receiveBytes', startNs)
+            return self.y
         
-        sock = socket.socket()
-        sock.connect((self.host, self.port))
-        print()
-        print("Connected to server")
-        try:
-            sock.send(self.dataTx)
-            #print("Sent Data")
-        except:
-           sock.connect((self.host, self.port))
-           #print("Socket Reconnected")
-           sock.send(self.dataTx)
         # print(f'sockname: {sock.getsockname()}')
         # print(f'sockpeer: {sock.getpeername()}')
         #y = []
         #time.sleep(0.01)
         #y = sock.recv(18)
-        a = 0
         errorCount = 0
-        sampleRxStartMS = int(time.time() * 1000)
-        while a < ((self.numSensors * 3) + self.extraRxByte):                #iterate through the number of sensors * the number of bytes per sample
-            #print(f'while loop a')
+        while True:
+            #Connect, prompt and read on a fresh socket - refused connections and timeouts are OSErrors as well as dropped ones
+            sock = socket.socket()
             try:
-                self.y.append(sock.recv(1))
-                #print(f'Received 1')
-            except ConnectionError:
-                print(f"Unable to reach client with socket: Retrying")
-                #Close and reopen the connection
-                if errorCount < 10:      #If you get ten connection errors in a row close and reopen the socket
-                    #Close and reopen the connection
-                    sock.close()
-                    sock = socket.socket()
-                    sock.connect((self.host, self.port))
-                    a -= 1     #Ask for a resend (decrement data index)
-                    errorCount += 1
-                    sock.send(self.dataTx)
-                else:
-                    print(f'Fatal Error: SocketBroken')
+                sock.connect((self.host, self.port))
+                log.debug("Connected to server")
+                sock.send(self.dataTx)
+                self.y = self.reader.readFrame(sock, (self.numSensors * 3) + self.extraRxByte)   #Whole sample in one recv_into (zero-copy view)
+                break
+            except OSError as e:
+                sock.close()
+                errorCount += 1
+                instrument.count('socketClient.retry')
+                if errorCount >= 10:      #Give up after ten socket errors in a row - same failure value as the streaming path
+                    log.error('Fatal Error: SocketBroken (%r)', e)
+                    self.y = []
                     return -1
-            a += 1 
+                log.warning("Unable to reach client with socket: Retrying (%r)", e)
         sock.close()
         self.dataGot = 1
         #print(f"self.y: {self.y}")
+        instrument.record('socketClient.receiveBytes', startNs)
         return self.y
     
     #print(f'Sample Received - One byte')
 
-    def socketLoop(self, recvCount): #recvCount counts samples in a packet in training mode; in prediction mode it is the index for the circular buffer
+    def socketLoop(self, recvCount): #recvCount counts samples in a packet in training mode
+
+        if self.getTraining is False:
+            #Prediction mode - receive, predict and write MIDI / OSC in overlapping pipeline stages (pipeline.py)
+            return self.predictLoop()
 
-        packetStartMS = 0
-        firstFive = 0 #flip to one after first five sample are in to start predictions
+        packetStartNs = 0
 
         while self.packetCount < self.packetLimit:                   #keep getting packets until the packetLimit is reaches   
             if recvCount == 0:
@@ -280,23 +206,13 @@ class GetData:
                     
                     #print(f'Start packet time: {packetStartMS}')
             
-            packetStartMS = int(time.time() * 1000)  
+            packetStartNs = instrument.now()
 
             #Sends one byte from dataPacket and asks for more
             while recvCount < self.packetSize:
-                sampleRxStartMS = int(time.time() * 1000)
-                dataThread = Thread(target=self.receiveBytes)
-                dataThread.start()
-                #y = self.receiveBytes()
-                #print(f'Receive Bytes')
-
-                while threading.active_count() > 1:
-                    #print(f'threading.active_count(): {threading.active_count()}')
-                    dataThread.join()
-
-                sampleRxStopMS = int(time.time() * 1000)
-                sampleRxTimeMS = sampleRxStopMS - sampleRxStartMS
-                print(f'Sample receive time in ms: {sampleRxTimeMS}')
+                #Called directly - starting a thread and joining it straight away overlapped nothing, and waiting for
+                #threading.active_count() to drop to 1 never finished while the stream or prediction log threads were running
+                self.receiveBytes()
 
                 #print(f'self.y loop: {self.y}')
                 
@@ -306,77 +222,16 @@ class GetData:
                 #         print(f'threading.active_count(): {threading.active_count()}')
                 #         pass
                 
+                if len(self.y) == 0:
+                    continue     #Nothing received (stream still reconnecting) - ask again
+
                 self.processData(self.y, recvCount)
                 self.y = []  #Reset y so that it doesn't get too full...
 
                 # dataThread = Thread(target=self.processData, args=(y, recvCount,))
                 # dataThread.start()
 
-                if self.getTraining:
-                    recvCount += 1   #Increment index of samples received prep training once all packets have arrived
-
-                #Prediction mode
-                else:       
-                    if firstFive:   #wait for full packet before doing prediction
-
-                        #dataThread.join()    #wait for the data to be proccessed in the other thread
-                        
-                        #predictionStartMs = int(time.time() * 1000)
-                        
-                        #scale the data to +-1
-                        # for i in range(self.packetData.shape[1]):
-                        #     print(f'packetData[0, {i}] (before): {self.packetData[0,i]}') 
-                        #     self.packetData[0,i] = self.packetData[0,i] / 2048
-                        #     print(f'packetData[0, {i}] (scaled): {self.packetData[0,i]}')
-
-
-                        NNINput = np.roll(self.packetData, (3 * self.numSensors)*(self.packetSize - recvCount - 1))  #roll the packetData circular array to put them in the right order
-                        # try:
-                        #     predictThread.join()   #Ensure last prediction is done before proceeding
-                        # except:
-                        #     print("predictThread doesn't exist yet")
-
-                        # #Make a plot every 5 seconds
-                        # plotTimerCheck = int(time.time() * 1000)
-                        # if (plotTimerCheck - self.plotTimer) > 5000 and self.plotCounter < 20:  
-                        #     self.plotCounter += 1     
-                        #     self.plotAcc()   #take the packet now hot off the press
-                        #     self.plotTimer = int(time.time() * 1000)   #reset plotTimer
-
-                        #print(f'Input to NN (rolled): {NNINput}')
-                        print(f'Making Prediction...') 
-                        prediction = NeuralNetwork.realTimePrediction(NNINput, self.pathPreface)
-                        #print(f'prediction: {prediction}')
-
-                        print(f'Converting gesture to OSC...') 
-                        #writer = oscWriter.OSCWriter()   //writer is passed during GetData.__init__()
-                        self.writer.getPredictions(prediction[0])
-                        if self.writer.ToFEnable:
-                            print(f'Enable Time of Flight Sensor...') 
-                            self.dataTx = 0 #Reset dataTx
-                            self.dataTx = struct.pack("=B", 15)   #Enable ToF sensor
-                            self.extraRxByte = 1
-                        else:
-                           print(f'Disable Time of Flight Sensor...') 
-                           self.dataTx = 0 #Reset dataTx
-                           self.dataTx = struct.pack("=B", 255)   #Disable ToF sensor 
-                           self.extraRxByte = 0
-                        self.dataGot = 0   #Reset the dataGot flag for the next sample
-
-                        # predictThread = Thread(target=NeuralNetwork.realTimePrediction, args=(NNINput, self.pathPreface))
-                        # predictThread.start()
-                        #self.predictions = NeuralNetwork.realTimePrediction(NnInput) 
-
-                        # predictionStopMS = int(time.time() * 1000)
-                        # predictionTimeMS = predictionStopMS - predictionStartMs
-                        #print(f'It\'s {self.predictions}') 
-                        # print(f'Time to predict: {predictionTimeMS}')
-                        
-                    if recvCount == self.packetSize - 1:    #reset recvCount to 0 if a full packet is received
-                        firstFive = 1                       #Enable first five so a prediction will be made on next pass
-                        recvCount = 0     
-                    else: 
-                        recvCount += 1                      #Advance recvCount
+                recvCount += 1   #Increment index of samples received prep training once all packets have arrived
     
                 #print(f'Completed Rx of sample: {recvCount}' )
                 #socketLoop(recvCount)
@@ -387,13 +242,8 @@ class GetData:
                 #     #print(f'threading.active_count(): {threading.active_count()}')
                 #     dataThread.join()
                 
-                print(f'Packet Done')
-                packetStopMS = int(time.time() * 1000)
-                packetTimeMS = packetStopMS - packetStartMS
-                #print(f'packetStart: {packetStartMS}')
-                #print(f'packetStopMS: {packetStopMS}')
-                print(f'packet processing time in ms: {packetTimeMS}')
-                print()
+                log.info('Packet Done')
+                instrument.record('socketClient.packet', packetStartNs)
                 # for thread in threading.enumerate(): 
                 #     print(thread.name)
                 #print()
@@ -405,26 +255,44 @@ class GetData:
                 # 0 Not movinng - Environmental movements
                 # 1 Alternate up and down
                 # 2 Out and in alternately
-                metaDataTimeStartMs = int(time.time() * 1000)
+                metaDataStartNs = instrument.now()
                 #Append the data to the packet array
                 self.prepTraining()
                 #self.plotAcc()
                 self.packetCount += 1
                 recvCount = 0    #Reset recvCount to get the next packet
-                metaDataTimeStopMs = int(time.time() * 1000)
-                print(f'metaData Time Save to files and image [ms]: {metaDataTimeStopMs - metaDataTimeStartMs}')
+                instrument.record('socketClient.saveMetaData', metaDataStartNs)
 
         self.packetCount = 0            
         return 0
 
+    def predictLoop(self, *, queueSize=2, policy=pipeline.DROP_OLDEST, statsInterval=10.0):
+        #Runs the acquisition -> inference -> writer pipeline until interrupted (Ctrl+C), printing the stage latencies every statsInterval seconds
+        self.pipeline = pipeline.fromDataStream(self, self.writer, queueSize=queueSize, policy=policy)
+        self.pipeline.start()
+        try:
+            while self.pipeline.running:
+                time.sleep(statsInterval)
+                self.pipeline.printStats()
+        except KeyboardInterrupt:
+            print('Prediction stopped')
+        finally:
+            self.pipeline.stop()
+            self.pipeline.printStats()
+        return 0
+
+    def stopStream(self):
+        #Closes the streaming connection (streaming mode only)
+        if self.stream is not None:
+            self.stream.stop()
+
     def prepTraining(self):    #Prep the packet for training
 
         #print(f'self.packetData: {self.packetData}') 
 
         #scale the data to +-1
-        for i in range(self.packetData.shape[1]):
-            self.packetData[0,i] = self.packetData[0,i] / 127
-        print(f'self.packetData.shape: {self.packetData.shape}')
+        self.packetData /= 127
+        log.debug('self.packetData.shape: %s', self.packetData.shape)
         #Get ground truth labels
         packetTruth = np.zeros([1,], dtype=int)
         #print(f'packetTruth.shape: {packetTruth.shape}')
@@ -432,77 +300,22 @@ class GetData:
         #print(f'packetTruth: {packetTruth}')
 
         #Write to files
-        self.writetoBinary(self.packetData, packetTruth)
-        self.writetoCSV(self.packetData, packetTruth)
+        self.writetoBinary(self.packetData, packetTruth)    #CSV is exported on demand with writetoCSV()
 
     def writetoBinary(self,trainingData, packetTruth):
         #print(f'trainingData for write: {trainingData}')
-        #Write data to .npy file (binary) -- faster
-        dataPath = self.pathPreface + self.labelPath + '.npy'
-        truthPath = self.pathPreface + self.labelPath + '_truth.npy'
-
-        #Data
-        if os.path.exists(dataPath):
-            tmpArr = np.load(dataPath,allow_pickle=False)
-            #print(f'tmpArr from file: {tmpArr}')
-            tmpArr = np.append(tmpArr,trainingData, axis=0)
-            np.save(dataPath, tmpArr, allow_pickle=False)
-            # print(f'dataPacket shape (Binary): {tmpArr.shape}')
-            # print(f'dataPacket saved (Binary): {tmpArr}')
-            
-        else: 
-            np.save(dataPath, trainingData, allow_pickle=False)
-            # print(f'dataPacket shape (Binary): {trainingData.shape}')
-            # print(f'dataPacket saved (Binary): {trainingData}')
-
-        #Truth
-        if os.path.exists(truthPath):
-            tmpArr = np.load(truthPath,allow_pickle=False)
-            #print(f'Binary truths from file: {tmpArr}')
-            tmpArr = np.append(tmpArr,packetTruth)
-            np.save(truthPath, tmpArr, allow_pickle=False)
-            #print(f'packetTruth appended and saved (Binary): {tmpArr}')
-        else: 
-            np.save(truthPath, packetTruth, allow_pickle=False)
-            # print(f'packetTruth saved (Binary): {packetTruth}')
-
-    def writetoCSV(self, trainingData, packetTruth):
-        #Write data to .csv file (text) - human readable
-        #print(f'CSV write training data')
-        dataPath = self.pathPreface + self.labelPath + '.csv'
-        truthPath = self.pathPreface + self.labelPath + '_truth.csv'
-        
-        #Data - 2D array axis 0 (rows) are gestures, axis 1 (cols) are features within a gesture
-        if os.path.exists(dataPath):
-            tmpArr = np.loadtxt(dataPath,dtype=float, delimiter=',', ndmin=2)       
-            #print(f'tmpArr.shape 1: {tmpArr.shape}')
-            #print(f'tmpArr: {tmpArr}')          
-            
-            tmpArr = np.append(tmpArr,trainingData, axis=0)                  #Append trainingData to tmpArr
-            #print(f'tmpArr.shape 2 (CSV): {tmpArr.shape}')
-            #print(f'tmpArr (CSV): {tmpArr}')
-
-            np.savetxt(dataPath, tmpArr, fmt="%f", delimiter=",") 
-            # print(f'dataPacket appended and saved (CSV): {tmpArr}')
-        else: 
-            #tmpArr = np.reshape(trainingData, (trainingData.shape[0] * 4, 4))   #Reshape to a 2-D array
-            np.savetxt(dataPath, trainingData, fmt="%f", delimiter=",")
-            # print(f'dataPacket appended and saved (CSV): {trainingData}')
-            # print(f'dataPacket shape: {trainingData.shape}')
-        
-        #Truth - 1D Array of same length as data
-        if os.path.exists(truthPath):
-            tmpArr = np.loadtxt(truthPath,dtype=int, delimiter=',')
-            tmpArr = np.append(tmpArr,packetTruth) 
-            np.savetxt(truthPath, tmpArr, fmt="%d", delimiter=",")
-            #print(f'packetTruth appended and saved (CSV): {tmpArr}')
-            #print(f'packetTruth shape: {tmpArr.shape}')
-        else: 
-             np.savetxt(truthPath, packetTruth, fmt="%d", delimiter=",")
-             #print(f'packetTruth appended and saved (CSV): {packetTruth}')
-             #print(f'dataPacket shape: {packetTruth.shape}')
+        #Append to the label's capture store (captureStore.py) - one record written in place, the file is never reloaded
+        store = captureStore.getCaptureStore(self.pathPreface + self.labelPath, trainingData.shape[1])
+        store.append(trainingData, packetTruth)
+        #print(f'samples in {store.path}: {store.count}')
+
+    def writetoCSV(self):
+        #Export the label's capture store to .csv (text) - human readable
+        #On demand only - not called while capturing
+        captureStore.getCaptureStore(self.pathPreface + self.labelPath).exportCSV()
 
     def plotAcc(self):
+        import matplotlib.pyplot as plt     #Plotting is only used here - don't load it for real-time prediction
 
         _,axs = plt.subplots(self.numSensors,3, figsize=(12,8))
         
@@ -548,9 +361,11 @@ class GetData:
         #plt.show()   
         plt.close         
 
-def createTrainingData(*, pathPreface='data/data', labelPath="test", label=0, packetLimit=1, packetSize=10, numSensors=4):
+def createTrainingData(*, pathPreface='data/data', labelPath="test", label=0, packetLimit=1, packetSize=10, numSensors=4, exportCSV=False):
     trgData = GetData(packetSize=packetSize, pathPreface=pathPreface, labelPath=labelPath, label=label, getTraining=True, packetLimit=packetLimit, numSensors=numSensors)
     trgData.socketLoop(0)
+    if exportCSV:
+        trgData.writetoCSV()    #Once per capture session, after the last sample
 
 # def main():
     
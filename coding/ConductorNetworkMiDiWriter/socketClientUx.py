@@ -15,12 +15,12 @@ import struct
 import time
 import threading
 from threading import Thread
-import matplotlib.pyplot as plt 
 import os.path 
 import NeuralNetwork
-import dill   
 import subprocess
 import csv      
+import sensorStream
+import captureStore
 
 class GetData:
     
@@ -51,6 +51,7 @@ class GetData:
         self.sockRecursionCount = 0
         self.sock = socket.socket()
         self.sockConnection = 0
+        self.reader = sensorStream.FrameReader(self.numSensors)   #Receives a whole sample into one preallocated buffer
 
         #On dataStream init try to connect to The Conductor on AP network, if not carry on
         connectTries = 0
@@ -246,61 +247,19 @@ class GetData:
     def processData(self, binaryData):
         print()
         print(f'processData()')
-        print(f'binaryData: {binaryData}')
-
-        #packetStartMS = int(time() * 1000)
-        #global processCount
-
-        def formatData(binaryData, sensorIndex):
-            print(f'sensor: {sensorIndex}')
-            print()
-            #print(f'binaryData: {binaryData}')
-            #Parse binary data and recombine into ints
-            #X Axis
-
-            print(f'sensor: {sensorIndex}')
-            print(f'XIndex: {0 + (sensorIndex * 3 * self.numSensors)}')
-            print(f'self.sock.getpeername(): {self.sock.getpeername()}')
-
-            XAccTuple = struct.unpack("=b", binaryData[0 + (sensorIndex * 3)])  ##MSB is second byte in axis RX; Just a nibble
-            XAcc = XAccTuple[0]
-            #XAcc = float(int(binaryData[0 + (sensorIndex * 3 * self.numSensors)]),0)
-            print(f'XAcc Raw: {XAcc}')
-            if self.getTraining is False:
-                self.packetData[0, (3 * sensorIndex)] = XAcc / 127   #Scale to 0-127 for prediction
-            else:
-                self.packetData[0, (3 * sensorIndex)] = XAcc         #Will scale values while compiling data for training
-
-            #Y Axis
-            YAccTuple = struct.unpack("=b", binaryData[1 + (sensorIndex * 3)])
-            YAcc = YAccTuple[0]
-            print(f'YAcc Raw: {YAcc}')
-            if self.getTraining is False:
-                self.packetData[0, 1 + (3 * sensorIndex)] = YAcc / 127
-            else:       
-                self.packetData[0, 1 + (3 * sensorIndex)] = YAcc
-
-            #Z Axis
-            ZAccTuple = struct.unpack("=b", binaryData[2 + (sensorIndex * 3)])
-            ZAcc = ZAccTuple[0]
-            print(f'ZAcc Raw: {ZAcc}')
-            if self.getTraining is False:
-                self.packetData[0, 2 + (3 * sensorIndex)] = ZAcc / 127
-            else:
-                self.packetData[0, 2 + (3 * sensorIndex)] = ZAcc
-
-            #print(f"self.dataTx: {self.dataTx}")
-            # TOF sensor
-            if self.dataTx[0] == 0x0F and sensorIndex == self.numSensors - 1:  #If ToF is enabled and we are on the last sensor - get the ToF byte
-                ToFTuple = struct.unpack("=b", binaryData[(self.numSensors * 3)])   #ToF data is the last byte
-                self.ToFByte = ToFTuple[0]
-                print(f"self.ToFByte: {self.ToFByte}")
-            else:
-                #reset ToFByte
-                self.ToFByte = -1
-        
-        for i in range(self.numSensors):
-            formatData(binaryData, i)
+        print(f'binaryData: {bytes(binaryData)}')
+
+        #Decode the whole sample in one go: (1, numSensors, 3) accelerometer array and the ToF byte (-1 if not sent)
+        #Scaled to +-1 for prediction; training data is scaled while compiling data for training (prepTraining)
+        acc, ToF = sensorStream.decodeFrames(binaryData, self.numSensors, scale=self.getTraining is False)
+        self.packetData[0, :self.numSensors * 3] = acc.reshape(-1)
+
+        if self.dataTx[0] == 0x0F:  #If ToF is enabled get the ToF byte
+            self.ToFByte = int(ToF[0])
+            print(f"self.ToFByte: {self.ToFByte}")
+        else:
+            #reset ToFByte
+            self.ToFByte = -1
     
     def receiveBytes(self):
         #Checks the connection to the servers, sends the prompt and then receives numSensors * 3 bytes
@@ -322,37 +281,25 @@ class GetData:
         #y = self.sock.recv(numSensors * 3)
         #print(f'y at the start: {self.y}')
         self.y = [] #Reset y
-        a = 0
         errorCount = 0
         #sampleRxStartMS = int(time.time() * 1000)
-        while a < ((self.numSensors * 3 + self.extraRxByte)):                #iterate through the number of sensors * the number of bytes per sample
-            #print(f'while loop a')
+        while True:
             try:
-                self.y.append(self.sock.recv(1))
-                #print(f'Received 1')
-            except socket.error as err:
+                self.y = self.reader.readFrame(self.sock, self.numSensors * 3 + self.extraRxByte)   #Whole sample in one recv_into (zero-copy view)
+                break
+            except (socket.error, ConnectionError) as err:
                 print(f"TCP/IP Socket RX Error: {err}")
-                #print(f"Failed transmission: {self.dataTx}, length: {len(self.dataTx)}")
                 print(f"Unable to reach client with socket: Retrying...")
-                #Close and reopen the connection
-    
-                # while errorCount < 2:      #If you get ten connection errors in a row close and reopen the socket
-                #     #Close and reopen the connection
-                #     # self.sock.close()
-                #     # self.sock.connect((self.host, self.port))
-                #     a -= 1     #Ask for a resend (decrement data index)
-                #     errorCount += 1
-                if self.promptServer(self.dataTx, self.host, self.port, 0) == -1:
+                errorCount += 1
+                #Prompt again and receive the whole sample again
+                if errorCount > 5 or self.promptServer(self.dataTx, self.host, self.port, 0) == -1:
                     print(f'Fatal Error: SocketBroken')
-                    #a -= 1
-                    #print(f"TCP/IP Socket Error: {err}")
                     print(f"Failed transmission: {self.dataTx}, length: {len(self.dataTx)}")
+                    self.y = []
                     return -1
-            a += 1 
         
         #sock.close()
         self.dataGot = 1
-        print(f"self.y returned: {self.y}")
         return self.y
     
     def socketSendStr(self, message):
@@ -369,10 +316,8 @@ class GetData:
         print(f'response0[0]: {response0[0]}')
         print(f'response0[1]: {response0[1]}')
 
-        first = struct.unpack("=B", response0[0]) 
-        second = struct.unpack("=B", response0[1]) 
-        first = first[0]
-        second = second[0]
+        first = response0[0]     #Indexing the received frame gives the unsigned byte value
+        second = response0[1]
 
         if first == 0xFF and second == 0x0F:
             print(f'Server is ready sending length of the message to server: {len(message)}')
@@ -490,8 +435,7 @@ class GetData:
         #print(f'self.packetData: {self.packetData}') 
 
         #scale the data to +-1
-        for i in range(self.packetData.shape[1]):
-            self.packetData[0,i] = self.packetData[0,i] / 127
+        self.packetData /= 127
         print(f'self.packetData.shape: {self.packetData.shape}')
         #Get ground truth labels
         packetTruth = np.zeros([1,], dtype=int)
@@ -500,81 +444,21 @@ class GetData:
         #print(f'packetTruth: {packetTruth}')
 
         #Write to files
-        self.writetoBinary(self.packetData, packetTruth)
-        self.writetoCSV(self.packetData, packetTruth)
+        self.writetoBinary(self.packetData, packetTruth)    #CSV is exported on demand with writetoCSV()
 
     def writetoBinary(self,trainingData, packetTruth):
         print()
         print('writetoBinary()')
         print(f'trainingData for write: {trainingData}')
-        #Write data to .npy file (binary) -- faster
-        dataPath = self.pathPreface + '/' + self.labelPath + '.npy'
-        truthPath = self.pathPreface + '/' + self.labelPath + '_truth.npy'
-
-        #Data
-        if os.path.exists(dataPath):
-            tmpArr = np.load(dataPath,allow_pickle=False)
-            #print(f'tmpArr from file: {tmpArr}')
-            tmpArr = np.append(tmpArr,trainingData, axis=0)
-            np.save(dataPath, tmpArr, allow_pickle=False)
-            # print(f'dataPacket shape (Binary): {tmpArr.shape}')
-            # print(f'dataPacket saved (Binary): {tmpArr}')
-            
-        else: 
-            np.save(dataPath, trainingData, allow_pickle=False)
-            # print(f'dataPacket shape (Binary): {trainingData.shape}')
-            # print(f'dataPacket saved (Binary): {trainingData}')
-
-        #Truth
-        print(f'truth path: {truthPath}')
-        if os.path.exists(truthPath):
-            tmpArr = np.load(truthPath,allow_pickle=False)
-            print(f'Binary truths from file: {tmpArr}')
-            tmpArr = np.append(tmpArr,packetTruth)
-            np.save(truthPath, tmpArr, allow_pickle=False)
-            print(f'packetTruth appended and saved (Binary): {tmpArr}')
-        else: 
-            np.save(truthPath, packetTruth, allow_pickle=False)
-            print(f'packetTruth saved (Binary): {packetTruth}')
-
-    def writetoCSV(self, trainingData, packetTruth):
-        print()
-        print('writetoCSV()')
-        print(f'trainingData for write: {trainingData}')
-        #Write data to .csv file (text) - human readable
-        #print(f'CSV write training data')
-        dataPath = self.pathPreface + '/' + self.labelPath + '.csv'
-        truthPath = self.pathPreface + '/' + self.labelPath + '_truth.csv'
-        
-        #Data - 2D array axis 0 (rows) are handPositions, axis 1 (cols) are features within a handPosition
-        if os.path.exists(dataPath):
-            tmpArr = np.loadtxt(dataPath,dtype=float, delimiter=',', ndmin=2)       
-            #print(f'tmpArr.shape 1: {tmpArr.shape}')
-            #print(f'tmpArr: {tmpArr}')          
-            
-            tmpArr = np.append(tmpArr,trainingData, axis=0)                  #Append trainingData to tmpArr
-            #print(f'tmpArr.shape 2 (CSV): {tmpArr.shape}')
-            #print(f'tmpArr (CSV): {tmpArr}')
-
-            np.savetxt(dataPath, tmpArr, fmt="%f", delimiter=",") 
-            # print(f'dataPacket appended and saved (CSV): {tmpArr}')
-        else: 
-            #tmpArr = np.reshape(trainingData, (trainingData.shape[0] * 4, 4))   #Reshape to a 2-D array
-            np.savetxt(dataPath, trainingData, fmt="%f", delimiter=",")
-            # print(f'dataPacket appended and saved (CSV): {trainingData}')
-            # print(f'dataPacket shape: {trainingData.shape}')
-        
-        #Truth - 1D Array of same length as data
-        if os.path.exists(truthPath):
-            tmpArr = np.loadtxt(truthPath,dtype=int, delimiter=',')
-            tmpArr = np.append(tmpArr,packetTruth) 
-            np.savetxt(truthPath, tmpArr, fmt="%d", delimiter=",")
-            #print(f'packetTruth appended and saved (CSV): {tmpArr}')
-            #print(f'packetTruth shape: {tmpArr.shape}')
-        else: 
-             np.savetxt(truthPath, packetTruth, fmt="%d", delimiter=",")
-             #print(f'packetTruth appended and saved (CSV): {packetTruth}')
-             #print(f'dataPacket shape: {packetTruth.shape}')
+        #Append to the label's capture store (captureStore.py) - one record written in place, the file is never reloaded
+        store = captureStore.getCaptureStore(self.pathPreface + '/' + self.labelPath, trainingData.shape[1])
+        store.append(trainingData, packetTruth)
+        #print(f'samples in {store.path}: {store.count}')
+
+    def writetoCSV(self):
+        #Export the label's capture store to .csv (text) - human readable
+        #On demand only - not called while capturing
+        captureStore.getCaptureStore(self.pathPreface + '/' + self.labelPath).exportCSV()
 
 
 #Useful matplot function for when packet size is above 1 
@@ -0,0 +1,5 @@
+#The modules live flat in ConductorNetworkMiDiWriter and import each other by name - put that folder on the path for the tests
+import os.path
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
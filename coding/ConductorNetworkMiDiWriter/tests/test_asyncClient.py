@@ -0,0 +1,96 @@
+#asyncClient.Device / ConductorClient against several local fakeConductor.FakeConductor servers
+import asyncio
+import collections
+import threading
+
+import numpy as np
+import pytest
+
+import asyncClient
+import fakeConductor
+
+NUM_SENSORS = 4
+NUM_DEVICES = 3
+
+
+@pytest.fixture
+def servers():
+    #Glove i always sends the same frame, every byte i + 1, so a prediction can be traced back to the glove it came from
+    servers = []
+    for i in range(NUM_DEVICES):
+        frames = np.full((1, NUM_SENSORS * 3), i + 1, dtype=np.int8)
+        server = fakeConductor.FakeConductor(numSensors=NUM_SENSORS, seed=i, frames=frames, rate=500)
+        server.start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def gloveOf(batch):
+    #Stand-in model: undo the +-1 scaling of the first byte
+    return np.rint(batch[:, 0] * 127).astype(int) - 1
+
+
+def runClient(devices, seconds, dispatch):
+    client = asyncClient.ConductorClient(devices, gloveOf, dispatch, tickInterval=0.01)
+    asyncio.run(client.run(duration=seconds))
+    return client
+
+
+def test_everyGloveIsPredictedInSharedBatches(servers):
+    devices = [asyncClient.Device(server.host, server.port, name=f'glove{i}', numSensors=NUM_SENSORS) for i, server in enumerate(servers)]
+    received = collections.defaultdict(list)
+    client = runClient(devices, 0.5, lambda device, prediction, ToFByte: received[device.name].append((prediction, ToFByte)))
+
+    stats = client.stats()
+    for i, device in enumerate(devices):
+        assert stats['devices'][device.name]['samples'] > 0
+        assert received[device.name]
+        assert {prediction for prediction, ToFByte in received[device.name]} == {i}    #Each glove got its own predictions
+        assert {ToFByte for prediction, ToFByte in received[device.name]} == {-1}      #0xFF prompt - no ToF byte
+    assert max(stats['batchSizes']) > 1    #Gloves with new samples in the same tick share one model call
+    assert all(server.connectionCount == 1 for server in servers)
+
+
+def test_deviceAsksForToFWhenEnabled(servers):
+    devices = [asyncClient.Device(servers[0].host, servers[0].port, numSensors=NUM_SENSORS, ToFEnable=True)]
+    ToFBytes = []
+    runClient(devices, 0.3, lambda device, prediction, ToFByte: ToFBytes.append(ToFByte))
+
+    assert ToFBytes
+    assert all(0 <= ToFByte < 126 for ToFByte in ToFBytes)
+
+
+def test_deviceReconnectsWhileTheOthersKeepStreaming(servers):
+    devices = [asyncClient.Device(server.host, server.port, name=f'glove{i}', numSensors=NUM_SENSORS, backoffStart=0.01)
+               for i, server in enumerate(servers)]
+    received = collections.Counter()
+    afterDrop = collections.Counter()
+    dropped = threading.Event()
+
+    def dispatch(device, prediction, ToFByte):
+        received[device.name] += 1
+        if dropped.is_set():
+            afterDrop[device.name] += 1
+
+    def dropFirstGlove():
+        servers[0].dropClients()
+        dropped.set()
+
+    timer = threading.Timer(0.3, dropFirstGlove)
+    timer.start()
+    try:
+        client = runClient(devices, 1.0, dispatch)
+    finally:
+        timer.cancel()
+
+    assert client.stats()['devices']['glove0']['reconnects'] >= 1
+    assert servers[0].connectionCount >= 2
+    assert all(afterDrop[device.name] > 0 for device in devices)    #glove0 came back and the others never stopped
+
+
+def test_devicesMustShareTheModelShape():
+    devices = [asyncClient.Device('127.0.0.1', 1, numSensors=4), asyncClient.Device('127.0.0.1', 2, numSensors=5)]
+    with pytest.raises(ValueError):
+        asyncClient.ConductorClient(devices, gloveOf)
@@ -0,0 +1,79 @@
+#Gradient checks for Activation_Softmax.backward - central differences against the analytic backward pass
+import numpy as np
+import pytest
+
+import NeuralNetwork
+
+SAMPLES = 32
+NUM_GESTURES = 5
+EPSILON = 1e-6
+
+
+@pytest.fixture
+def batch():
+    rng = np.random.default_rng(0)
+    inputs = rng.normal(size=(SAMPLES, NUM_GESTURES))
+    labels = rng.integers(0, NUM_GESTURES, size=SAMPLES)
+    return inputs, labels, np.eye(NUM_GESTURES)[labels]
+
+
+def numericGradient(lossValue, inputs):
+    numeric = np.empty_like(inputs)
+    shifted = inputs.copy()
+    for index in np.ndindex(inputs.shape):
+        shifted[index] = inputs[index] + EPSILON
+        lossUp = lossValue(shifted)
+        shifted[index] = inputs[index] - EPSILON
+        lossDown = lossValue(shifted)
+        shifted[index] = inputs[index]
+        numeric[index] = (lossUp - lossDown) / (2 * EPSILON)
+    return numeric
+
+
+@pytest.mark.parametrize('lossName, oneHot', [
+    ('Loss_MeanSquaredError', True),
+    ('Loss_BinaryCrossentropy', True),
+    ('Loss_CategoricalCrossEntropy', False),
+    ('Loss_CategoricalCrossEntropy', True),
+])
+def test_softmaxBackwardMatchesNumericGradient(batch, lossName, oneHot):
+    inputs, labels, oneHotLabels = batch
+    y = oneHotLabels if oneHot else labels
+    softmax = NeuralNetwork.Activation_Softmax()
+    loss = getattr(NeuralNetwork, lossName)()
+
+    def lossValue(logits):
+        softmax.forward(logits, training=False)
+        return np.mean(loss.forward(softmax.output, y))
+
+    softmax.forward(inputs, training=True)
+    loss.backward(softmax.output, y)
+    softmax.backward(loss.dinputs)
+
+    np.testing.assert_allclose(softmax.dinputs, numericGradient(lossValue, inputs), atol=1e-7)
+
+
+def test_softmaxBackwardMatchesJacobian(batch):
+    inputs, labels, oneHotLabels = batch
+    dvalues = np.random.default_rng(1).normal(size=inputs.shape)
+    softmax = NeuralNetwork.Activation_Softmax()
+    softmax.forward(inputs, training=True)
+    softmax.backward(dvalues)
+
+    #The per-sample Jacobian J = diag(s) - s s^T the vectorized pass replaced
+    expected = np.array([(np.diagflat(s) - np.outer(s, s)) @ d for s, d in zip(softmax.output, dvalues)])
+    np.testing.assert_allclose(softmax.dinputs, expected, atol=1e-12)
+
+
+def test_unfusedPathMatchesFusedSoftmaxCrossEntropy(batch):
+    inputs, labels, oneHotLabels = batch
+    softmax = NeuralNetwork.Activation_Softmax()
+    loss = NeuralNetwork.Loss_CategoricalCrossEntropy()
+    softmax.forward(inputs, training=True)
+    loss.backward(softmax.output, labels)
+    softmax.backward(loss.dinputs)
+
+    fused = NeuralNetwork.Activation_Softmax_Loss_CategoricalCrossEntropy()
+    fused.backward(softmax.output, labels)
+
+    np.testing.assert_allclose(softmax.dinputs, fused.dinputs, atol=1e-10)
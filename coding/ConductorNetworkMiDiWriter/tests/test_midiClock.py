@@ -0,0 +1,76 @@
+#midiClock.MidiClock: beats on absolute deadlines, so late work never adds up to tempo drift
+import time
+
+import pytest
+
+import midiClock
+
+MS = 1_000_000
+
+
+def test_beatsDoNotDriftUnderLoad():
+    #600 BPM = 100 ms beats, with 30 ms of work after every beat - a sleep(interval) loop would fall 30 ms further behind each beat
+    clock = midiClock.MidiClock(600)
+    clock.start()
+    beats = 20
+    lateness = []
+    for i in range(beats):
+        beat, deadlineNs = clock.waitBeat(i + 1)
+        lateness.append(time.perf_counter_ns() - deadlineNs)
+        time.sleep(0.03)
+
+    assert beat == beats
+    assert deadlineNs == clock.originNs + beats * 100 * MS    #Still on the grid after every beat
+    assert max(lateness) < 20 * MS                             #No beat inherited the work done after the one before
+    assert clock.missedBeats == 0
+    assert clock.stats()['count'] == beats
+
+
+def test_messagesKeepTheirDeadlinesWithinABeat():
+    clock = midiClock.MidiClock(120, spinNs=2 * MS)
+    clock.start()
+    beat, startNs = clock.nextBeat()
+    latenessNs = sorted(clock.waitUntil(startNs + i * 5 * MS) for i in range(20))
+
+    #Never early, typically within the spin window; the bound on the worst one leaves room for a busy machine
+    assert latenessNs[0] >= 0
+    assert latenessNs[len(latenessNs) // 2] < 2 * MS
+    assert latenessNs[-1] < 20 * MS
+
+
+def test_aBeatMoreThanABeatLateIsSkipped():
+    clock = midiClock.MidiClock(600)
+    clock.start(time.perf_counter_ns() - 350 * MS)    #Started 3.5 beats ago
+    beat, deadlineNs = clock.nextBeat(1)
+
+    assert beat == 3    #Beats 1 and 2 are skipped, beat 3 is less than a beat late
+    assert clock.missedBeats == 2
+    assert deadlineNs == clock.beatDeadline(3)
+
+
+def test_tempoChangeKeepsTheTickPosition():
+    clock = midiClock.MidiClock(60, ticksPerBeat=24)
+    clock.start(time.perf_counter_ns() - 2_500 * MS)    #2.5 beats in at 60 BPM
+    before = clock.tickPosition()
+    clock.setBpm(120)
+    after = clock.tickPosition()
+
+    assert after == pytest.approx(before, abs=1.0)
+    assert clock.beatNs() == pytest.approx(500 * MS)
+    #The next beat is now due half as far away as it would have been
+    beat, deadlineNs = clock.nextBeat()
+    assert beat == 3
+    assert deadlineNs - time.perf_counter_ns() < 300 * MS
+
+
+def test_startIsSharedUntilStopped():
+    clock = midiClock.MidiClock(120)
+    clock.start()
+    originNs = clock.originNs
+    clock.start()
+    assert clock.originNs == originNs    #A second user joins the same grid
+
+    clock.stop()
+    assert clock.tickPosition() == 0.0
+    clock.start()
+    assert clock.originNs != originNs
@@ -0,0 +1,57 @@
+#Model.save / Model.load: the weight-only format keeps the optimizer state, so training resumes where it stopped
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+import NeuralNetwork
+
+
+@pytest.fixture
+def trained():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 12))
+    y = (X[:, 0] > 0).astype(int)
+    model = NeuralNetwork.createOrientationModel(12, 2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(X, y, epochs=3, batch_size=16, seed=0)
+    return model, X, y
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_loadKeepsTheOptimizerState(trained, tmp_path, mmap):
+    model, X, y = trained
+    path = str(tmp_path / 'model.model')
+    model.save(path)
+    loaded = NeuralNetwork.Model.load(path, mmap=mmap)
+
+    assert loaded.optimizer.iterations == model.optimizer.iterations > 0
+    assert loaded.optimizer.current_learning_rate == model.optimizer.current_learning_rate
+    for loadedLayer, layer in zip(loaded.trainable_layers, model.trainable_layers):
+        for property in ['weights', 'biases', 'weight_momentums', 'bias_momentums', 'weight_cache', 'bias_cache']:
+            np.testing.assert_array_equal(getattr(loadedLayer, property), getattr(layer, property))
+
+
+def test_resumedTrainingMatchesUninterruptedTraining(trained, tmp_path):
+    model, X, y = trained
+    path = str(tmp_path / 'model.model')
+    model.save(path)
+    loaded = NeuralNetwork.Model.load(path)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for resumed in (loaded, model):
+            np.random.seed(1)    #Same dropout masks for both
+            resumed.train(X, y, epochs=1, batch_size=16, shuffle=False)
+
+    for loadedLayer, layer in zip(loaded.trainable_layers, model.trainable_layers):
+        np.testing.assert_allclose(loadedLayer.weights, layer.weights)
+
+
+def test_untrainedModelStartsTheOptimizerFresh(tmp_path):
+    path = str(tmp_path / 'model.model')
+    NeuralNetwork.createOrientationModel(12, 2).save(path)
+    loaded = NeuralNetwork.Model.load(path)
+
+    assert loaded.optimizer.iterations == 0
+    assert not hasattr(loaded.trainable_layers[0], 'weight_momentums')
@@ -0,0 +1,134 @@
+#SensorStream / FrameReader / GetData streaming mode against a local fakeConductor.FakeConductor
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import fakeConductor
+import sensorStream
+import socketClient
+
+NUM_SENSORS = 4
+
+
+@pytest.fixture
+def replayed():
+    #Replays known frames, paced so the ring buffer does not drop any before the test reads them
+    frames, labels = fakeConductor.syntheticFrames(200, numSensors=NUM_SENSORS, seed=1, hold=1)
+    server = fakeConductor.FakeConductor(numSensors=NUM_SENSORS, seed=1, frames=frames, labels=labels, rate=500)
+    server.start()
+    yield server, frames
+    server.stop()
+
+
+def waitFor(condition, timeout=5.0):
+    giveUpAt = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > giveUpAt:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_streamReceivesFramesInOrderOnOneConnection(replayed):
+    server, frames = replayed
+    stream = sensorStream.SensorStream(host=server.host, port=server.port, numSensors=NUM_SENSORS, bufferSize=64)
+    stream.start()
+    try:
+        samples = [stream.getSample(timeout=2) for i in range(20)]
+    finally:
+        stream.stop()
+
+    assert all(sample != -1 for sample in samples)
+    assert [bytes(sample) for sample in samples] == [frames[i].tobytes() for i in range(20)]
+    assert server.connectionCount == 1    #Every prompt went over the same socket
+
+
+def test_streamSwitchesToTheToFPrompt(replayed):
+    server, frames = replayed
+    stream = sensorStream.SensorStream(host=server.host, port=server.port, numSensors=NUM_SENSORS)
+    stream.start()
+    try:
+        assert len(stream.getSample(timeout=2)) == NUM_SENSORS * 3
+        stream.setToF(True)
+        stream.ring.clear()
+        #Frames already prompted for before the switch may still arrive - the next ones carry the ToF byte
+        assert waitFor(lambda: len(stream.getSample(timeout=2)) == NUM_SENSORS * 3 + 1)
+        acc, ToF = sensorStream.decodeFrames(stream.getSample(timeout=2), NUM_SENSORS, ToFEnable=True)
+    finally:
+        stream.stop()
+
+    assert acc.shape == (1, NUM_SENSORS, 3)
+    assert 0 <= ToF[0] < 126
+
+
+def test_streamReconnectsAfterTheConnectionDrops(replayed):
+    server, frames = replayed
+    stream = sensorStream.SensorStream(host=server.host, port=server.port, numSensors=NUM_SENSORS, backoffStart=0.01)
+    stream.start()
+    try:
+        assert stream.getSample(timeout=2) != -1
+        server.dropClients()
+        assert waitFor(lambda: stream.reconnectCount >= 1)
+        stream.ring.clear()
+        assert stream.getSample(timeout=2) != -1
+    finally:
+        stream.stop()
+
+    assert server.connectionCount >= 2
+
+
+def test_getSampleTimesOutWithoutAServer():
+    stream = sensorStream.SensorStream(host="127.0.0.1", port=1, numSensors=NUM_SENSORS, backoffStart=0.01, backoffMax=0.05)
+    stream.start()
+    try:
+        assert stream.getSample(timeout=0.2) == -1
+    finally:
+        stream.stop()
+
+
+def test_frameReaderJoinsShortReads():
+    reader = sensorStream.FrameReader(NUM_SENSORS)
+    left, right = socket.socketpair()
+    frame = bytes(range(NUM_SENSORS * 3 + 1))
+    try:
+        #Send the frame in two pieces with a gap so the first recv_into returns a short read
+        sender = threading.Thread(target=lambda: (left.sendall(frame[:5]), time.sleep(0.05), left.sendall(frame[5:])))
+        sender.start()
+        received = reader.readFrame(right, len(frame))
+        sender.join()
+        assert bytes(received) == frame
+        assert reader.recvCalls >= 2
+
+        left.close()
+        with pytest.raises(ConnectionError):
+            reader.readFrame(right, len(frame))
+    finally:
+        left.close()
+        right.close()
+
+
+def test_getDataReceivesFromTheStream(replayed):
+    server, frames = replayed
+    data = socketClient.GetData(host=server.host, port=server.port, numSensors=NUM_SENSORS, packetSize=1, getTraining=True,
+                                writer=object(), streaming=True)
+    try:
+        first = data.receiveBytes()
+        second = data.receiveBytes()
+    finally:
+        data.stopStream()
+
+    #Training mode reads the ring oldest first, so nothing is skipped
+    assert bytes(first) == frames[0].tobytes()
+    assert bytes(second) == frames[1].tobytes()
+    assert server.connectionCount == 1
+
+
+def test_getDataGivesUpWithoutAServer():
+    #Refused connections are retried ten times, then reported with the same -1 the streaming path returns
+    data = socketClient.GetData(host="127.0.0.1", port=1, numSensors=NUM_SENSORS, packetSize=1, getTraining=True, writer=object())
+
+    assert data.receiveBytes() == -1
+    assert len(data.y) == 0
@@ -1,5 +1,6 @@
 import socketClient
 import NeuralNetwork
+import captureStore
 import numpy as np
 
 ## Receives data from 2 sensors and does NN training and logging on the data in real time.
@@ -23,11 +24,12 @@ def main():
   socketClient.createTrainingData(pathPreface=basePath, labelPath=labelPath0, packetLimit=20, label=0, packetSize=1, numSensors=2)
 
   #Train network with test data
-  dataArr = np.load(basePath + "test.npy",allow_pickle=False)
+  store = captureStore.getCaptureStore(basePath + labelPath0)
+  dataArr = store.data
   print(f'shape of data at basePath shape: {dataArr.shape}')
   print(f'data at basePath: {dataArr}')
 
-  truthArr = np.load(basePath + "test_truth.npy",allow_pickle=False)
+  truthArr = store.truth
   print(f'shape of data at basePath shape: {truthArr.shape}')
   print(f'data at basePath: {truthArr}')
 
@@ -2,17 +2,16 @@ import PySimpleGUI as sg
 import socketClientUx
 import NeuralNetwork
 import midiWriter
+import pipeline
 import os.path
 import time
 import struct
 import csv
-import NeuralNetwork
 # import socket
 # import subprocess
 # import shutil
 #import sys
 import window
-import dill
 
 
 # UX.py use this file for developing data bindings to the GUI. Window difinitions are defined in this file.
@@ -71,6 +70,9 @@ class UX:
         self.windowSizeX = 900
         self.windowSizeY = 500
         self.stopPredict = 0
+        self.predictPipeline = None   #pipeline.Pipeline while predicting - receives, predicts and writes MIDI in its own threads
+        self.predictPollMS = 20       #How often the GUI checks the pipeline for a new prediction
+        self.predictPollId = None     #Tk after() id of the next -GOBTN- poll
         self.dataStream = socketClientUx.GetData() # default values: host="192.168.4.1", port=80, packetSize=1, numSensors=4, pathPreface='data/test', labelPath="Test", label=0, getTraining=True
         self.IPAddress = ''
         self.SSIDList = []
@@ -163,24 +165,24 @@ class UX:
     def predictSample(self):
         print()
         print('predictSample()')
-        #writer = oscWriter.OSCWriter()
-        self.dataStream.getSample()
-        predictionList = self.dataStream.predictSample()
-        print(f'Converting handPosition to midi...') 
-        self.writer.getPredictions(predictionList[0])
-        if self.writer.ToFEnable:
-            #print(f'Enable Time of Flight Sensor...') 
-            self.dataStream.dataTx = 0 #Reset dataTx
-            self.dataStream.dataTx = struct.pack("=B", 15)   #Enable ToF sensor
-            self.dataStream.extraRxByte = 1
-        else:
-            #print(f'Disable Time of Flight Sensor...') 
-            self.dataStream.dataTx = 0 #Reset dataTx
-            self.dataStream.dataTx = struct.pack("=B", 255)   #Disable ToF sensor 
-            self.dataStream.extraRxByte = 0
-        self.dataStream.dataGot = 0   #Reset the dataGot flag for the next sample
-
-        return predictionList[0]
+        #Receive -> predict -> midiWriter run in pipeline.py threads so they overlap; the GUI only shows the newest prediction
+        #The dispatch stage hands each prediction to self.writer.getPredictions and sets the ToF prompt from self.writer.ToFEnable
+        if self.predictPipeline is None:
+            self.predictPipeline = pipeline.fromDataStream(self.dataStream, self.writer)
+            self.predictPipeline.start()
+        #Never blocks the GUI event loop - returns the newest prediction and whether it is new since the last poll (False - stale)
+        latest, isNew = self.predictPipeline.pollPrediction()
+        if latest is None:
+            return -1, False   #No prediction yet (waiting for The Conductor or a full packet)
+
+        return latest[0], isNew
+
+    def stopPredicting(self):
+        #Stops the prediction pipeline and prints its stage latencies
+        if self.predictPipeline is not None:
+            self.predictPipeline.stop()
+            self.predictPipeline.printStats()
+            self.predictPipeline = None
         
 
     def makeModelFileMessage(self, modelPath):
@@ -239,7 +241,7 @@ class UX:
                 textHeight = textHeight + 5 
 
                 if controlLogData[i][6] == '0' or controlLogData[i][6] == 0:    #Control is Modulate
-                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], waveform=self.controlInitData[i][6], minimum=self.controlInitData[i][7], maximum=self.controlInitData[i][8]))
+                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], waveform=self.controlInitData[i][6], minimum=self.controlInitData[i][7], maximum=self.controlInitData[i][8]))
                     #self.writer.controlList.append(newControl)
                     controlListStr = controlListStr + "Control Type:  Modulate\n" 
                     controlListStr = controlListStr + "Channel:  " + str(controlLogData[i][7]) + "\n"
@@ -250,7 +252,7 @@ class UX:
                     textHeight = textHeight + 6
 
                 elif controlLogData[i][6] == '1' or controlLogData[i][6] == 1:    #Control is Arpegio
-                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], direction=self.controlInitData[i][6]))  
+                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], direction=self.controlInitData[i][6]))  
                     controlListStr = controlListStr + "Control Type:  Arpeggio\n" 
                     controlListStr = controlListStr + "Channel:  " + str(controlLogData[i][7]) + "\n"
                     controlListStr = controlListStr + "Rate:  " + str(controlLogData[i][8]) + "\n"
@@ -271,7 +273,7 @@ class UX:
                 textHeight = textHeight + 9
 
                 if controlLogData[i][10] == '0' or controlLogData[i][10] == 0:    #Control is Modulate
-                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], waveform=self.controlInitData[i][6], minimum=self.controlInitData[i][7], maximum=self.controlInitData[i][8]))
+                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], waveform=self.controlInitData[i][6], minimum=self.controlInitData[i][7], maximum=self.controlInitData[i][8]))
                     #self.writer.controlList.append(newControl)
                     controlListStr = controlListStr + "Control Type:  Modulate\n" 
                     controlListStr = controlListStr + "Channel:  " + str(controlLogData[i][11]) + "\n"
@@ -282,7 +284,7 @@ class UX:
                     textHeight = textHeight + 6
                 
                 elif controlLogData[i][10] == '1' or controlLogData[i][10] == 1:    #Control is Arpegio
-                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], direction=self.controlInitData[i][6]))  
+                    #self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][4], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], conditionData=self.controlInitData[i][2], bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][5], direction=self.controlInitData[i][6]))  
                     controlListStr = controlListStr + "Control Type:  Arpeggio\n" 
                     controlListStr = controlListStr + "Channel:  " + str(controlLogData[i][11]) + "\n"
                     controlListStr = controlListStr + "Rate:  " + str(controlLogData[i][12]) + "\n"
@@ -1658,7 +1660,7 @@ class UX:
                     
                         if int(self.controlInitData[i][6]) == 0:    #Control is Modulate
 
-                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=str(int(self.controlInitData[i][7])+4), predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][8], waveform=self.controlInitData[i][9], minimum=self.controlInitData[i][10], maximum=self.controlInitData[i][11]))
+                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=str(int(self.controlInitData[i][7])+4), gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][8], waveform=self.controlInitData[i][9], minimum=self.controlInitData[i][10], maximum=self.controlInitData[i][11]))
                             #self.writer.controlList.append(newControl)   
                             # print(f'self.writer.controlList: {self.writer.controlList}')
                             # print(f'self.writer.controlList[i+1].controlLabel: {self.writer.controlList[i].controlLabel}')
@@ -1666,14 +1668,14 @@ class UX:
                             # print(f'self.writer.controlList[1].controlLabel: {self.writer.controlList[1].controlLabel}')
                         
                         elif int(self.controlInitData[i][6]) == 1:    #Control is Arpegio
-                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][7], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][8], direction=self.controlInitData[i][9], octave=self.controlInitData[i][10]))
+                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][7], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][8], direction=self.controlInitData[i][9], octave=self.controlInitData[i][10]))
                         #self.writer.controlList.append(newControl)   
                             # print(f'self.writer.controlList: {self.writer.controlList}')
                             # print(f'self.writer.controlList[i+1].controlLabel: {self.writer.controlList[i].controlLabel}')
                             # print(f'self.writer.controlList[0].controlLabel: {self.writer.controlList[0].controlLabel}')
                             # print(f'self.writer.controlList[1].controlLabel: {self.writer.controlList[1].controlLabel}')
                         elif int(self.controlInitData[i][6]) == 2:    #Control is Tof Midi Control (need to add control type 2 to GUI input)
-                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][7], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i))
+                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][7], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i))
 
                     elif int(self.controlInitData[i][1]) == 1:  #Condition type = Transition
                         conditionDataList = [
@@ -1682,14 +1684,14 @@ class UX:
                         ]
 
                         if int(self.controlInitData[i][10]) == 0:    #Control is Modulate
-                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][11], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][10], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][12], waveform=self.controlInitData[i][13], minimum=self.controlInitData[i][14], maximum=self.controlInitData[i][15]))
+                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][11], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][10], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][12], waveform=self.controlInitData[i][13], minimum=self.controlInitData[i][14], maximum=self.controlInitData[i][15]))
                             #self.writer.controlList.append(newControl)   
                             # print(f'self.writer.controlList: {self.writer.controlList}')
                             # print(f'self.writer.controlList[i+1].controlLabel: {self.writer.controlList[i].controlLabel}')
                             # print(f'self.writer.controlList[0].controlLabel: {self.writer.controlList[0].controlLabel}')
                             # print(f'self.writer.controlList[1].controlLabel: {self.writer.controlList[1].controlLabel}')
                         elif int(self.controlInitData[i][10]) == 1:    #Control is Arpegio
-                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][11], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][10], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][12], direction=self.controlInitData[i][13], octave=self.controlInitData[i][14]))
+                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][11], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][10], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i, rate=self.controlInitData[i][12], direction=self.controlInitData[i][13], octave=self.controlInitData[i][14]))
                         #self.writer.controlList.append(newControl)   
                             # print(f'self.writer.controlList: {self.writer.controlList}')
                             # print(f'self.writer.controlList[i+1].controlLabel: {self.writer.controlList[i].controlLabel}')
@@ -1697,10 +1699,10 @@ class UX:
                             # print(f'self.writer.controlList[1].controlLabel: {self.writer.controlList[1].controlLabel}')
 
                         elif int(self.controlInitData[i][6]) == 2:    #Control is ToF data
-                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][7], predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i))
+                            self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=self.controlInitData[i][7], gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], controlType=self.controlInitData[i][6], conditionData=conditionDataList, bpm = self.writer.bpm, controlNum=i))
                     
                     elif int(self.controlInitData[i][1]) == 2:  #Condition type = No Action
-                        self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=1, predictions=self.writer.predictions, conditionType=self.controlInitData[i][1], bpm = self.writer.bpm, controlNum=i, controlType=3))
+                        self.writer.controlList.append(self.writer.MidiControl(controlLabel=self.controlInitData[i][0], midiOut=self.writer.midiPortOut, channel=1, gestureWindow=self.writer.gestureWindow, conditionType=self.controlInitData[i][1], bpm = self.writer.bpm, controlNum=i, controlType=3))
 
             if event == '-ANOTHERBTN-':
                 print()
@@ -1861,7 +1863,7 @@ class UX:
                     print("-GOBTN-")
                     #print(f'Collected sample {sampleCount + 1} of {self.packetLimit} samples for hand position {self.handPositionCount + 1} of {self.numHandPositions} hand positions')
                     #if stopPredict < 10:
-                    prediction = self.predictSample()
+                    prediction, isNew = self.predictSample()
                      #   stopPredict += 1
                     #else:
                      #   stopPredict = 0
@@ -1881,13 +1883,16 @@ class UX:
                         PredictMessage = "ToF Data: " + str(self.writer.ToFByte) + ". Detected Gesture " + str(prediction)
                     
                     #self.writer.getPredictions(prediction)
+                    if not isNew:
+                        PredictMessage += " (no new prediction - waiting for The Conductor)"
 
                     window['-GESTURE-'].update(PredictMessage)
                     window['-STOPBTN-'].update(visible=True)
                     window['-GOBTN-'].update(visible=False)
                     window.refresh()
                     if self.stopPredict == 0:
-                        window.write_event_value("-GOBTN-", '') 
+                        #Poll again from the Tk loop instead of re-posting straight away, so other events get handled in between
+                        self.predictPollId = window.TKroot.after(self.predictPollMS, window.write_event_value, "-GOBTN-", '')
                     else:
                         window['-STOPBTN-'].update(visible=False)
                         window['-GOBTN-'].update(visible=True)
@@ -1908,6 +1913,10 @@ class UX:
                     window.refresh()
                     #window.write_event_value("-STOPBTN-", '')
                     self.stopPredict = 1
+                    if self.predictPollId is not None:
+                        window.TKroot.after_cancel(self.predictPollId)   #Don't let a queued poll restart the pipeline
+                        self.predictPollId = None
+                    self.stopPredicting()
                     self.writer.writerON = 0
                     self.writer.play_loop_started = False
                     self.writer.metro.startFlag = 0